@@ -1,5 +1,7 @@
 from django.contrib import admin
-from .models import License, Category, Tag, EmbroideryScheme, SchemeFile, SchemeImage
+from django.utils import timezone
+
+from .models import License, Category, Tag, EmbroideryScheme, SchemeFile, SchemeImage, Job
 
 
 @admin.register(License)
@@ -73,3 +75,18 @@ class EmbroiderySchemeAdmin(admin.ModelAdmin):
     #         'fields': ('views_count',),  # 'downloads_count'
     #     }),
     # )
+
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = ('name', 'args', 'scheme', 'status', 'attempts', 'run_after', 'finished_at')
+    list_filter = ('status', 'name')
+    raw_id_fields = ('scheme',)
+    readonly_fields = ('attempts', 'last_error', 'created_at', 'started_at', 'finished_at')
+    actions = ['retry']
+
+    @admin.action(description='Повторить выбранные задачи')
+    def retry(self, request, queryset):
+        queryset.exclude(status=Job.Status.RUNNING).update(
+            status=Job.Status.QUEUED, attempts=0, run_after=timezone.now()
+        )
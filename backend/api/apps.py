@@ -4,3 +4,8 @@ from django.apps import AppConfig
 class ApiConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "api"
+
+    def ready(self):
+        import api.signals  # регистрируем обработчики сигналов (поисковый индекс и т.д.)
+        import api.db  # PRAGMA для соединений SQLite
+        import api.tasks  # регистрируем фоновые задачи (api/jobs.py)
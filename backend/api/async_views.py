@@ -0,0 +1,150 @@
+# backend/api/async_views.py
+"""
+Асинхронные (ASGI) версии основных эндпоинтов чтения:
+
+    GET /api/v1/async/schemes/
+    GET /api/v1/async/schemes/{id}/
+    GET /api/v1/async/schemes/{id}/comments/
+    GET /api/v1/async/users/{username}/
+
+Списки, детальная страница и комментарии собираются тем же ViewSet'ом, что и обычные
+эндпоинты (build_view): его выборка, фильтры, видимость, ETag, кэш каталога, пагинация
+(в том числе ?pagination=cursor, ?ordering=, ?user_fields=0) и сериализатор. Асинхронно
+читаются только сами строки (acount, aget, aiterator — см. apaginate_queryset в api/pagination.py),
+поэтому под ASGI-сервером (uvicorn, daphne) ожидание этих запросов не занимает поток.
+Короткие обращения к кэшу и проверка фильтров выполняются в потоке через sync_to_async.
+Под WSGI эти view тоже работают, но выигрыша не дают.
+
+Все данные для сериализаторов загружаются заранее (select_related, prefetch_related,
+with_list_stats), так что сериализация — чистый Python без обращений к базе.
+Сравнение WSGI и ASGI: команда benchmark_reads.
+"""
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import AnonymousUser
+from django.http import Http404, JsonResponse
+from rest_framework.exceptions import APIException, AuthenticationFailed
+from rest_framework.request import Request
+from rest_framework.views import exception_handler
+from rest_framework_simplejwt.authentication import JWTAuthentication
+
+from users.models import User
+from users.serializers import UserProfileSerializer
+from users.views import UserViewSet
+from .cache import get_cache
+from .models import EmbroideryScheme
+from .pagination import afetch
+from .serializers import EmbroiderySchemeListSerializer
+from .views import CommentViewSet, EmbroiderySchemeViewSet
+
+
+async def authenticate(request):
+    """JWT-аутентификация как в DRF; проверка токена и загрузка пользователя — в потоке."""
+    try:
+        result = await sync_to_async(JWTAuthentication().authenticate)(request)
+    except AuthenticationFailed:
+        result = None
+    request.user = result[0] if result else AnonymousUser()
+    return request.user
+
+
+async def build_view(viewset_class, request, action, **kwargs):
+    """Экземпляр обычного ViewSet'а для `action` с DRF-запросом аутентифицированного пользователя."""
+    user = await authenticate(request)
+    view = viewset_class(action=action, args=(), kwargs=kwargs, format_kwarg=None, headers={})
+    view.request = Request(request)
+    view.request.user = user
+    return view
+
+
+def error_response(view, exc):
+    """Ошибка в том же виде, что и у DRF (404, 400 неверного фильтра или курсора)."""
+    response = exception_handler(exc, {'view': view, 'request': view.request})
+    if response is None:
+        raise exc
+    return JsonResponse(response.data, status=response.status_code)
+
+
+async def page_data(view):
+    # Проверка фильтров может обратиться к базе (категория, лицензия), поэтому — в потоке
+    queryset = await sync_to_async(view.filter_queryset)(view.get_queryset())
+    page = await view.paginator.apaginate_queryset(queryset, view.request, view=view)
+    return view.paginator.get_paginated_response(view.get_serializer(page, many=True).data).data
+
+
+async def list_response(view):
+    """Как ConditionalGetMixin.list + CatalogCacheMixin.list, но страница читается асинхронно."""
+    request = view.request
+    try:
+        response = await sync_to_async(view.check_not_modified)(request)
+        if response is None:
+            key = await sync_to_async(view.get_list_cache_key)(request)
+            data = await get_cache().aget(key) if key else None
+            cached = data is not None
+            if not cached:
+                data = await page_data(view)
+                if key:
+                    await sync_to_async(view.cache_list_data)(key, data)
+            data = await sync_to_async(view.personalize_list_data)(request, data, cached)
+            response = JsonResponse(data)
+    except (APIException, Http404) as exc:
+        return error_response(view, exc)
+    return view.set_etag_headers(response)
+
+
+async def scheme_list(request):
+    return await list_response(await build_view(EmbroiderySchemeViewSet, request, 'list'))
+
+
+async def scheme_detail(request, pk):
+    """Как EmbroiderySchemeViewSet.retrieve: ETag, видимость и счетчик просмотров."""
+    view = await build_view(EmbroiderySchemeViewSet, request, 'retrieve', pk=pk)
+    try:
+        response = await sync_to_async(view.check_not_modified)(view.request)
+        if response is not None:
+            await sync_to_async(view.count_view)()
+        else:
+            try:
+                scheme = await view.get_queryset().aget(pk=pk)
+            except EmbroideryScheme.DoesNotExist:
+                raise Http404
+            if not view.is_visible(scheme):
+                raise Http404
+            await sync_to_async(view.count_view)(scheme)
+            response = JsonResponse(view.get_serializer(scheme).data)
+    except (APIException, Http404) as exc:
+        return error_response(view, exc)
+    return view.set_etag_headers(response)
+
+
+async def scheme_comments(request, scheme_pk):
+    return await list_response(await build_view(CommentViewSet, request, 'list', scheme_pk=scheme_pk))
+
+
+async def user_profile(request, username):
+    """
+    Как UserViewSet.retrieve (ETag, сводка по схемам); встроенный список публичных схем
+    (если не ?schemes=0) читается асинхронно одним запросом.
+    """
+    view = await build_view(UserViewSet, request, 'retrieve', username=username)
+    try:
+        response = await sync_to_async(view.check_not_modified)(view.request)
+        if response is None:
+            try:
+                author = await view.get_queryset().aget(username=username)
+            except User.DoesNotExist:
+                raise Http404
+            # Сводку уже посчитал get_etag(); схемы сериализатор читал бы синхронно — добавляем сами
+            context = {**view.get_serializer_context(), 'include_schemes': False}
+            if context['stats'] is None:
+                context['stats'] = await sync_to_async(EmbroideryScheme.objects.filter(
+                    author=author, visibility=EmbroideryScheme.Visibility.PUBLIC
+                ).summary)()
+            data = UserProfileSerializer(author, context=context).data
+            if view.include_schemes():
+                schemes = UserProfileSerializer.public_schemes(author, view.request.user)
+                rows = await afetch(schemes, 100)
+                data['schemes'] = EmbroiderySchemeListSerializer(rows, many=True, context=context).data
+            response = JsonResponse(data)
+    except (APIException, Http404) as exc:
+        return error_response(view, exc)
+    return view.set_etag_headers(response)
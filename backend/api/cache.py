@@ -0,0 +1,175 @@
+# backend/api/cache.py
+"""
+Кэш ответов каталога (списки схем, категорий, тегов, лицензий).
+
+Ключ строится из пространства имен, его текущей версии, пути, нормализованной
+строки запроса и заголовка Accept. Инвалидация — увеличение версии пространства
+имен (bump_version) из обработчиков сигналов в api/signals.py: старые ключи
+просто перестают читаться и вытесняются по TTL.
+
+Для авторизованных пользователей из кэша берется общий ответ, а персональные
+поля (is_liked, is_favorited) подставляются отдельно (см. api/relations.py).
+С параметром ?user_fields=0 персональные поля не отдаются вовсе, и все
+пользователи получают один и тот же закэшированный ответ.
+
+Настройки (settings.CATALOG_CACHE):
+    ENABLED      включить/выключить кэш
+    CACHE_ALIAS  алиас кэша Django
+    TIMEOUT      время жизни записи, секунд
+"""
+import copy
+import hashlib
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework.response import Response
+
+from .relations import merge_user_fields, omit_user_fields, strip_user_fields
+
+DEFAULTS = {
+    'ENABLED': True,
+    'CACHE_ALIAS': 'default',
+    'TIMEOUT': 300,
+}
+
+
+def get_cache_settings():
+    return {**DEFAULTS, **getattr(settings, 'CATALOG_CACHE', {})}
+
+
+def get_cache():
+    return caches[get_cache_settings()['CACHE_ALIAS']]
+
+
+def version_key(namespace):
+    return f'catalog-cache-version:{namespace}'
+
+
+def get_version(namespace):
+    cache = get_cache()
+    version = cache.get(version_key(namespace))
+    if version is None:
+        cache.add(version_key(namespace), 1, timeout=None)
+        version = cache.get(version_key(namespace), 1)
+    return version
+
+
+def bump_version(*namespaces):
+    """Инвалидирует все закэшированные ответы указанных пространств имен."""
+    cache = get_cache()
+    for namespace in namespaces:
+        key = version_key(namespace)
+        cache.add(key, 1, timeout=None)
+        try:
+            cache.incr(key)
+        except ValueError:
+            # Ключ успели вытеснить между add() и incr()
+            cache.set(key, 2, timeout=None)
+
+
+def scheme_namespace(scheme_id):
+    """Пространство имен одной схемы: его версия входит в ETag детальной страницы."""
+    return f'scheme:{scheme_id}'
+
+
+def invalidate_schemes(*scheme_ids):
+    """
+    Сбрасывает кэш списков схем и ETag детальных страниц `scheme_ids` после изменения
+    счетчиков (лайки, избранное, комментарии, скачивания): они пишутся UPDATE без сигналов.
+    По возможности вызывается после выхода из транзакции, иначе параллельный запрос
+    успел бы закэшировать старые значения под новой версией.
+    """
+    bump_version('schemes', *(scheme_namespace(pk) for pk in scheme_ids))
+
+
+# Параметры, не влияющие на общую часть ответа
+IGNORED_PARAMS = ('user_fields',)
+
+
+def normalize_query(query_params):
+    return urlencode(sorted(
+        (key, value) for key, values in query_params.lists() if key not in IGNORED_PARAMS for value in values
+    ))
+
+
+def wants_user_fields(request):
+    return request.query_params.get('user_fields') != '0'
+
+
+def build_key(namespace, request, depends_on=()):
+    """depends_on — другие пространства имен, при смене версии которых ответ тоже устаревает."""
+    raw = '|'.join((
+        request.path,
+        normalize_query(request.query_params),
+        request.META.get('HTTP_ACCEPT', ''),
+    ))
+    digest = hashlib.md5(raw.encode()).hexdigest()
+    versions = ''.join(f':v{get_version(name)}' for name in (namespace, *depends_on))
+    return f'catalog-cache:{namespace}{versions}:{digest}'
+
+
+def results_of(data):
+    """Строки результата: у постраничного ответа они лежат в 'results'."""
+    if isinstance(data, dict):
+        return data.get('results', [])
+    return data
+
+
+class CatalogCacheMixin:
+    """
+    Кэширует ответ `list` для ViewSet'ов каталога.
+
+    cache_namespace — пространство имен для инвалидации;
+    cache_user_fields — True, если в строках есть is_liked/is_favorited,
+    которые нужно подставлять для каждого пользователя отдельно.
+    Ключ и то, какие запросы кэшировать, можно переопределить
+    в get_cache_key() и is_cacheable().
+    """
+    cache_namespace = None
+    cache_user_fields = False
+
+    def get_cache_key(self, request):
+        return build_key(self.cache_namespace, request)
+
+    def is_cacheable(self, request):
+        return True
+
+    def get_list_cache_key(self, request):
+        """Ключ закэшированного ответа `list` или None, если этот ответ не кэшируется."""
+        if not get_cache_settings()['ENABLED'] or not self.cache_namespace or not self.is_cacheable(request):
+            return None
+        return self.get_cache_key(request)
+
+    def cache_list_data(self, key, data):
+        data = copy.deepcopy(data)
+        if self.cache_user_fields:
+            strip_user_fields(results_of(data))
+        get_cache().set(key, data, get_cache_settings()['TIMEOUT'])
+
+    def personalize_list_data(self, request, data, cached):
+        """
+        Персональные поля для текущего пользователя: убирает их при ?user_fields=0
+        или подставляет в общий ответ из кэша (`cached`), не меняя сам кэш.
+        """
+        if not self.cache_user_fields:
+            return data
+        if not wants_user_fields(request):
+            data = copy.deepcopy(data) if cached else data
+            omit_user_fields(results_of(data))
+        elif cached and request.user.is_authenticated:
+            data = copy.deepcopy(data)
+            merge_user_fields(results_of(data), request.user)
+        return data
+
+    def list(self, request, *args, **kwargs):
+        key = self.get_list_cache_key(request)
+        data = get_cache().get(key) if key else None
+        if data is None:
+            response = super().list(request, *args, **kwargs)
+            if response.status_code == 200:
+                if key:
+                    self.cache_list_data(key, response.data)
+                self.personalize_list_data(request, response.data, cached=False)
+            return response
+        return Response(self.personalize_list_data(request, data, cached=True))
@@ -0,0 +1,65 @@
+# backend/api/conditional.py
+"""
+Условные GET-запросы (ETag / If-None-Match) для ViewSet'ов.
+
+ETag считается одним легким запросом (values()/aggregate() по updated_at,
+количеству строк и денормализованным счетчикам), без загрузки объектов и без
+сериализатора. Если клиент прислал If-None-Match и данные не менялись,
+сразу отдаем 304 Not Modified.
+
+Last-Modified не отдаем: лайки, удаление комментариев и т.п. меняют ответ,
+не меняя ни одного updated_at, и проверка по дате вернула бы устаревшие данные.
+
+ETag слабый (W/"..."): в него не входит views_count, который растет на каждом
+просмотре, — такие ответы считаем семантически эквивалентными.
+"""
+import hashlib
+import json
+
+from django.utils.cache import get_conditional_response, patch_vary_headers
+
+
+def make_etag(*parts):
+    raw = json.dumps(parts, sort_keys=True, default=str)
+    return 'W/"%s"' % hashlib.md5(raw.encode()).hexdigest()
+
+
+class ConditionalGetMixin:
+    """
+    ViewSet определяет get_etag(), который для текущего action
+    возвращает ETag или None, если условная обработка не нужна.
+    list и retrieve проверяются автоматически; переопределенные методы могут
+    вызвать check_not_modified() сами.
+    """
+    conditional_actions = ('list', 'retrieve')
+
+    def get_etag(self):
+        return None
+
+    def check_not_modified(self, request):
+        """Возвращает ответ 304, если у клиента актуальная версия, иначе None."""
+        if request.method not in ('GET', 'HEAD') or self.action not in self.conditional_actions:
+            return None
+        etag = self.get_etag()
+        if etag is None:
+            return None
+        self._etag = etag
+        return get_conditional_response(request, etag=etag)
+
+    def list(self, request, *args, **kwargs):
+        return self.check_not_modified(request) or super().list(request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.check_not_modified(request) or super().retrieve(request, *args, **kwargs)
+
+    def set_etag_headers(self, response):
+        etag = getattr(self, '_etag', None)
+        if etag and response.status_code in (200, 304):
+            response['ETag'] = etag
+            # Персональные поля (is_liked и т.п.) зависят от пользователя
+            patch_vary_headers(response, ('Authorization',))
+        return response
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        return self.set_etag_headers(response)
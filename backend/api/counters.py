@@ -0,0 +1,292 @@
+# backend/api/counters.py
+"""
+Счетчики просмотров и скачиваний.
+
+В режиме 'sync' каждый инкремент сразу пишется в базу одним UPDATE.
+В режиме 'buffered' инкременты копятся в буфере (в памяти процесса или в кэше Django)
+и сбрасываются в базу пачкой: один UPDATE ... CASE WHEN на модель и поле.
+Сброс происходит по порогу количества инкрементов, по интервалу времени
+или командой `python manage.py flush_counters`. Если запись в базу не удалась,
+несохраненные инкременты возвращаются в буфер и попадут в следующий сброс.
+
+Счетчики схем отдаются и из кэша каталога (api/cache.py), поэтому их запись
+сбрасывает версию пространства имен 'schemes': в режиме 'buffered' — один раз
+на сброс буфера, в режиме 'sync' — на каждый инкремент, кроме просмотров
+(иначе каждый просмотр обнулял бы кэш; просмотры попадают в него при
+следующем изменении схемы или по истечении TTL).
+
+Настройки (settings.SCHEME_COUNTERS):
+    MODE            'sync' или 'buffered'
+    BACKEND         'memory' или 'cache' (только для режима 'buffered')
+    CACHE_ALIAS     алиас кэша для BACKEND='cache'
+    FLUSH_INTERVAL  секунд между автоматическими сбросами
+    FLUSH_THRESHOLD сколько инкрементов копить до автоматического сброса
+"""
+import atexit
+import logging
+import threading
+import time
+from collections import defaultdict
+
+from django.apps import apps
+from django.conf import settings
+from django.core.cache import caches
+from django.core.signals import setting_changed
+from django.db.models import Case, When, F
+from django.dispatch import receiver
+
+from .cache import invalidate_schemes
+
+SCHEME_LABEL = 'api.EmbroideryScheme'
+
+# Поля, инкремент которых в режиме 'sync' не сбрасывает кэш каталога
+QUIET_FIELDS = ('views_count',)
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'MODE': 'sync',
+    'BACKEND': 'memory',
+    'CACHE_ALIAS': 'default',
+    'FLUSH_INTERVAL': 10,
+    'FLUSH_THRESHOLD': 500,
+}
+
+
+def get_counter_settings():
+    return {**DEFAULTS, **getattr(settings, 'SCHEME_COUNTERS', {})}
+
+
+class BaseCounterBuffer:
+    """Копит инкременты вида (модель, поле, pk) -> delta и сбрасывает их в базу."""
+
+    def __init__(self, flush_interval, flush_threshold):
+        self.flush_interval = flush_interval
+        self.flush_threshold = flush_threshold
+        self._last_flush = time.monotonic()
+        self._pending = 0
+        self._lock = threading.Lock()
+
+    def add(self, label, field_name, pk, delta=1):
+        self._add(label, field_name, pk, delta)
+        with self._lock:
+            self._pending += delta
+            should_flush = (
+                self._pending >= self.flush_threshold
+                or time.monotonic() - self._last_flush >= self.flush_interval
+            )
+        if should_flush:
+            self.flush()
+
+    def flush(self):
+        """Сбрасывает накопленные инкременты в базу. Возвращает количество обновленных строк."""
+        with self._lock:
+            self._pending = 0
+            self._last_flush = time.monotonic()
+        updated = 0
+        scheme_ids = set()
+        groups = [(key, deltas) for key, deltas in self._drain().items() if deltas]
+        try:
+            while groups:
+                (label, field_name), deltas = groups[0]
+                updated += write_deltas(apps.get_model(label), field_name, deltas)
+                groups.pop(0)
+                if label == SCHEME_LABEL:
+                    scheme_ids.update(deltas)
+        finally:
+            # Незаписанные группы (та, на которой упала запись, и следующие) — обратно в буфер
+            for (label, field_name), deltas in groups:
+                for pk, delta in deltas.items():
+                    self._add(label, field_name, pk, delta)
+            if scheme_ids:
+                invalidate_schemes(*scheme_ids)
+        return updated
+
+    def _add(self, label, field_name, pk, delta):
+        raise NotImplementedError
+
+    def _drain(self):
+        """Забирает и очищает накопленные значения: {(label, field): {pk: delta}}."""
+        raise NotImplementedError
+
+
+class InMemoryCounterBuffer(BaseCounterBuffer):
+    """
+    Буфер в памяти процесса. Самый быстрый вариант, но у каждого воркера свой буфер,
+    поэтому сбрасывается он только самим процессом (по порогу, интервалу и при завершении).
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._data = defaultdict(lambda: defaultdict(int))
+        self._data_lock = threading.Lock()
+
+    def _add(self, label, field_name, pk, delta):
+        with self._data_lock:
+            self._data[(label, field_name)][pk] += delta
+
+    def _drain(self):
+        with self._data_lock:
+            data, self._data = self._data, defaultdict(lambda: defaultdict(int))
+        return data
+
+
+class CacheCounterBuffer(BaseCounterBuffer):
+    """
+    Буфер в кэше Django (memcached/redis), общий для всех воркеров.
+    Значения хранятся в отдельных ключах и увеличиваются через cache.incr().
+    Какие значения "грязные", записывает журнал: инкремент получает номер атомарным
+    cache.incr() счетчика журнала и кладет (модель, поле, pk) в ключ со своим номером.
+    Общего индекса, который пришлось бы читать и перезаписывать, нет — параллельные
+    воркеры используют только атомарные операции и ничего не теряют.
+
+    Сбрасывает буфер один процесс за раз (блокировка через cache.add). Он читает
+    записи журнала после последней обработанной и уменьшает значения на прочитанную
+    величину (а не удаляет их), поэтому инкременты, пришедшие во время сброса, не теряются.
+    Номер, выданный, но еще не записанный, сброс дожидается до следующего раза;
+    если записи нет и тогда (воркер упал между двумя операциями), номер пропускается.
+    """
+    key_prefix = 'scheme-counters'
+    lock_timeout = 300
+
+    def __init__(self, *args, cache_alias='default', **kwargs):
+        super().__init__(*args, **kwargs)
+        self.cache = caches[cache_alias]
+
+    def _value_key(self, label, field_name, pk):
+        return f'{self.key_prefix}:{label}:{field_name}:{pk}'
+
+    def _sequence_key(self):
+        return f'{self.key_prefix}:journal'
+
+    def _entry_key(self, number):
+        return f'{self.key_prefix}:journal:{number}'
+
+    def _cursor_key(self):
+        return f'{self.key_prefix}:journal-cursor'
+
+    def _lock_key(self):
+        return f'{self.key_prefix}:flush-lock'
+
+    def _add(self, label, field_name, pk, delta):
+        value_key = self._value_key(label, field_name, pk)
+        self.cache.add(value_key, 0, timeout=None)
+        self.cache.incr(value_key, delta)
+
+        self.cache.add(self._sequence_key(), 0, timeout=None)
+        number = self.cache.incr(self._sequence_key())
+        self.cache.set(self._entry_key(number), (label, field_name, pk), timeout=None)
+
+    def _read_journal(self):
+        """Записи журнала после последней обработанной: множество (модель, поле, pk)."""
+        done, waiting = self.cache.get(self._cursor_key()) or (0, None)
+        last = self.cache.get(self._sequence_key()) or 0
+        if last < done:
+            # Счетчик журнала вытеснили из кэша, и нумерация началась заново
+            done, waiting = 0, None
+        numbers = range(done + 1, last + 1)
+        entries = self.cache.get_many([self._entry_key(number) for number in numbers])
+        dirty, read = set(), []
+        for number in numbers:
+            entry = entries.get(self._entry_key(number))
+            if entry is None and number != waiting:
+                waiting = number
+                break
+            if entry is not None:
+                dirty.add(tuple(entry))
+                read.append(self._entry_key(number))
+            done = number
+        self.cache.delete_many(read)
+        self.cache.set(self._cursor_key(), (done, waiting), timeout=None)
+        return dirty
+
+    def _drain(self):
+        if not self.cache.add(self._lock_key(), 1, timeout=self.lock_timeout):
+            return {}  # буфер сейчас сбрасывает другой процесс
+        try:
+            dirty = self._read_journal()
+            values = self.cache.get_many([self._value_key(*entry) for entry in dirty])
+            result = defaultdict(dict)
+            for label, field_name, pk in dirty:
+                value_key = self._value_key(label, field_name, pk)
+                delta = values.get(value_key) or 0
+                if delta:
+                    self.cache.decr(value_key, delta)
+                    result[(label, field_name)][pk] = delta
+            return result
+        finally:
+            self.cache.delete(self._lock_key())
+
+
+def write_deltas(model, field_name, deltas):
+    """
+    Применяет инкременты {pk: delta} к полю модели одним UPDATE с CASE WHEN.
+    """
+    whens = [When(pk=pk, then=F(field_name) + delta) for pk, delta in deltas.items()]
+    field = model._meta.get_field(field_name)
+    return model._default_manager.filter(pk__in=list(deltas)).update(
+        **{field_name: Case(*whens, default=F(field_name), output_field=field)}
+    )
+
+
+_buffer = None
+_buffer_lock = threading.Lock()
+
+
+def get_counter_buffer():
+    """Возвращает буфер счетчиков текущего процесса (создается по настройкам при первом вызове)."""
+    global _buffer
+    with _buffer_lock:
+        if _buffer is None:
+            config = get_counter_settings()
+            kwargs = {
+                'flush_interval': config['FLUSH_INTERVAL'],
+                'flush_threshold': config['FLUSH_THRESHOLD'],
+            }
+            if config['BACKEND'] == 'cache':
+                _buffer = CacheCounterBuffer(cache_alias=config['CACHE_ALIAS'], **kwargs)
+            else:
+                _buffer = InMemoryCounterBuffer(**kwargs)
+        return _buffer
+
+
+def increment(instance, field_name, delta=1):
+    """
+    Увеличивает счетчик `field_name` у объекта модели.
+
+    В синхронном режиме сразу выполняет UPDATE ... SET field = field + delta,
+    в буферизованном — только кладет инкремент в буфер. В обоих случаях значение
+    у переданного экземпляра увеличивается в памяти, так что refresh_from_db() не нужен.
+    """
+    model = type(instance)
+    if get_counter_settings()['MODE'] == 'buffered':
+        get_counter_buffer().add(model._meta.label, field_name, instance.pk, delta)
+    else:
+        model._default_manager.filter(pk=instance.pk).update(**{field_name: F(field_name) + delta})
+        if model._meta.label == SCHEME_LABEL and field_name not in QUIET_FIELDS:
+            invalidate_schemes(instance.pk)
+    setattr(instance, field_name, getattr(instance, field_name) + delta)
+
+
+def flush():
+    """Сбрасывает буфер текущего процесса в базу."""
+    if _buffer is None and get_counter_settings()['BACKEND'] != 'cache':
+        return 0
+    return get_counter_buffer().flush()
+
+
+@atexit.register
+def _flush_on_exit():
+    # Не теряем инкременты из памяти при штатной остановке воркера
+    if _buffer is not None and isinstance(_buffer, InMemoryCounterBuffer):
+        try:
+            _buffer.flush()
+        except Exception:
+            logger.exception('Не удалось сбросить счетчики при завершении процесса')
+
+
+@receiver(setting_changed)
+def _reset_buffer(setting, **kwargs):
+    global _buffer
+    if setting in ('SCHEME_COUNTERS', 'CACHES'):
+        _buffer = None
@@ -0,0 +1,149 @@
+# backend/api/db.py
+"""
+Настройка соединений с базой.
+
+Для SQLite при каждом новом соединении выполняются PRAGMA из settings.SQLITE_PRAGMAS
+(WAL, synchronous, busy_timeout, mmap). Эти настройки действуют на соединение,
+поэтому задаются здесь, а не один раз при создании файла базы.
+
+Здесь же роутер чтения с реплик (PrimaryReplicaRouter) и его middleware.
+"""
+import contextvars
+import random
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+from django.utils.functional import LazyObject
+
+
+@receiver(connection_created)
+def apply_sqlite_pragmas(sender, connection, **kwargs):
+    if connection.vendor != 'sqlite':
+        return
+    pragmas = getattr(settings, 'SQLITE_PRAGMAS', {})
+    if not pragmas:
+        return
+    with connection.cursor() as cursor:
+        for name, value in pragmas.items():
+            if name == 'journal_mode' and connection.is_in_memory_db():
+                # У базы в памяти (тесты) нет журнала на диске
+                continue
+            cursor.execute(f'PRAGMA {name} = {value}')
+
+
+# --- Чтение с реплик ---
+#
+# PrimaryReplicaRouter отправляет чтение моделей из REPLICA_ROUTING['APPS'] на реплики,
+# а запись — на основную базу. На основную базу идут и чтения, если:
+#   * запрос изменяет данные (POST/PUT/PATCH/DELETE) — ответ должен видеть свою запись;
+#   * открыта транзакция на основной базе;
+#   * пользователь недавно что-то записал (STICKY_SECONDS): реплика могла еще
+#     не догнать основную базу. Признак хранится в cookie и, для клиентов с JWT
+#     без cookie, в кэше по id пользователя.
+#
+# Настройки (settings.REPLICA_ROUTING):
+#     REPLICAS        алиасы баз-реплик из DATABASES (пусто — роутер ничего не делает)
+#     APPS            приложения, чьи модели читаются с реплик
+#     STICKY_SECONDS  сколько секунд после записи читать с основной базы
+#     COOKIE_NAME     имя cookie с этим признаком
+
+REPLICA_DEFAULTS = {
+    'REPLICAS': [],
+    'APPS': ('api', 'users'),
+    'STICKY_SECONDS': 10,
+    'COOKIE_NAME': 'db_primary',
+}
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+_request_state = contextvars.ContextVar('replica_routing_state', default=None)
+
+
+def get_replica_settings():
+    return {**REPLICA_DEFAULTS, **getattr(settings, 'REPLICA_ROUTING', {})}
+
+
+def sticky_key(user_id):
+    return f'db-primary-sticky:{user_id}'
+
+
+def use_primary():
+    """True, если в текущем запросе читать нужно с основной базы."""
+    state = _request_state.get()
+    if state is None:
+        return False
+    if state['pinned']:
+        return True
+    # request.user становится настоящим пользователем после аутентификации DRF;
+    # ленивый объект из AuthenticationMiddleware не трогаем, чтобы не вызвать запрос из роутера
+    user = state['request'].__dict__.get('user')
+    if user is None or isinstance(user, LazyObject) or not user.is_authenticated:
+        return False
+    if state.get('sticky_user') != user.pk:
+        state['sticky_user'] = user.pk
+        state['sticky'] = bool(cache.get(sticky_key(user.pk)))
+    return state['sticky']
+
+
+@contextmanager
+def pin_primary():
+    """Все чтения внутри блока идут на основную базу (фоновые задачи: реплика может отставать)."""
+    token = _request_state.set({'pinned': True})
+    try:
+        yield
+    finally:
+        _request_state.reset(token)
+
+
+class ReplicaRoutingMiddleware:
+    """Запоминает текущий запрос для роутера и включает "прилипание" к основной базе после записи."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        config = get_replica_settings()
+        writing = request.method not in SAFE_METHODS
+        token = _request_state.set({
+            'request': request,
+            'pinned': writing or config['COOKIE_NAME'] in request.COOKIES,
+        })
+        try:
+            response = self.get_response(request)
+        finally:
+            _request_state.reset(token)
+
+        if writing and response.status_code < 400 and config['REPLICAS']:
+            seconds = config['STICKY_SECONDS']
+            response.set_cookie(config['COOKIE_NAME'], '1', max_age=seconds, httponly=True, samesite='Lax')
+            user = getattr(request, 'user', None)
+            if user is not None and user.is_authenticated:
+                cache.set(sticky_key(user.pk), 1, seconds)
+        return response
+
+
+class PrimaryReplicaRouter:
+    def db_for_read(self, model, **hints):
+        config = get_replica_settings()
+        if not config['REPLICAS'] or model._meta.app_label not in config['APPS']:
+            return None
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block or use_primary():
+            return DEFAULT_DB_ALIAS
+        return random.choice(config['REPLICAS'])
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Реплики содержат те же данные, что и основная база
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Схему реплик меняет репликация, а не migrate
+        if db in get_replica_settings()['REPLICAS']:
+            return False
+        return None
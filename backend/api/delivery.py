@@ -0,0 +1,203 @@
+# backend/api/delivery.py
+"""
+Отдача файлов схем (download_file).
+
+Права доступа проверяет Django, а сами байты по возможности отдает веб-сервер:
+
+    'x-accel'    nginx: ответ с заголовком X-Accel-Redirect на internal-локацию
+    'x-sendfile' Apache mod_xsendfile / lighttpd: заголовок X-Sendfile с путем к файлу
+    'django'     FileResponse из самого Django с поддержкой Range / If-Range
+    'redirect'   старое поведение — редирект на MEDIA_URL (файлы должны быть публичными)
+
+Пример для nginx (ACCEL_PREFIX = '/protected-media/'):
+
+    location /protected-media/ {
+        internal;
+        alias /srv/vishivka/media/;
+    }
+
+В режиме 'django' полный файл отдается через wsgi.file_wrapper — gunicorn и uWSGI
+используют для него sendfile() без копирования в user space. Запрос диапазона
+(Range: bytes=...) отдается потоком блоками только в нужных границах.
+
+Настройки (settings.FILE_DELIVERY):
+    BACKEND        один из вариантов выше
+    ACCEL_PREFIX   internal-локация nginx, соответствующая MEDIA_ROOT
+    BLOCK_SIZE     размер блока при отдаче диапазона, байт
+"""
+import mimetypes
+import os
+import re
+from urllib.parse import quote
+
+from django.conf import settings
+from django.http import FileResponse, Http404, HttpResponse, HttpResponseRedirect, StreamingHttpResponse
+from django.utils.http import http_date, parse_http_date_safe
+
+DEFAULTS = {
+    'BACKEND': 'django',
+    'ACCEL_PREFIX': '/protected-media/',
+    'BLOCK_SIZE': 64 * 1024,
+}
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+def get_delivery_settings():
+    return {**DEFAULTS, **getattr(settings, 'FILE_DELIVERY', {})}
+
+
+def file_validators(path):
+    """Сильный ETag и Last-Modified по размеру и времени изменения файла."""
+    stat = os.stat(path)
+    return f'"{stat.st_size:x}-{stat.st_mtime_ns:x}"', int(stat.st_mtime), stat.st_size
+
+
+def parse_range(header, size):
+    """
+    Разбирает одиночный диапазон 'bytes=start-end' и возвращает (start, end) включительно.
+    None — заголовка нет, он не поддерживается (несколько диапазонов) или поврежден:
+    в этом случае отдается весь файл, как разрешает RFC 9110.
+    False — диапазон синтаксически верный, но за пределами файла (416).
+    """
+    match = RANGE_RE.match(header or '')
+    if not match or match.group(1) == match.group(2) == '':
+        return None
+    start, end = match.groups()
+    if start == '':
+        # bytes=-500: последние 500 байт
+        length = int(end)
+        if length == 0:
+            return False
+        return max(size - length, 0), size - 1
+    start = int(start)
+    end = min(int(end), size - 1) if end else size - 1
+    if start >= size or start > end:
+        return False
+    return start, end
+
+
+def if_range_matches(header, etag, last_modified):
+    """If-Range: диапазон отдаем, только если у клиента та же версия файла."""
+    if not header:
+        return True
+    if header.startswith(('"', 'W/')):
+        return header == etag
+    return parse_http_date_safe(header) == last_modified
+
+
+def iter_range(path, start, end, block_size):
+    with open(path, 'rb') as source:
+        source.seek(start)
+        remaining = end - start + 1
+        while remaining > 0:
+            block = source.read(min(block_size, remaining))
+            if not block:
+                break
+            remaining -= len(block)
+            yield block
+
+
+def content_disposition(filename):
+    return "attachment; filename*=UTF-8''%s" % quote(filename)
+
+
+def requested_range(request, field_file):
+    """
+    (start, end) запрошенного диапазона или None, если нужен весь файл.
+    Используется и для учета скачиваний: докачка с середины файла не считается новым скачиванием.
+    """
+    try:
+        path = field_file.path
+    except NotImplementedError:
+        return None
+    if not os.path.exists(path):
+        return None
+    etag, last_modified, size = file_validators(path)
+    if not if_range_matches(request.headers.get('If-Range'), etag, last_modified):
+        return None
+    return parse_range(request.headers.get('Range'), size)
+
+
+class BaseDelivery:
+    def serve(self, request, field_file):
+        raise NotImplementedError
+
+
+class RedirectDelivery(BaseDelivery):
+    def serve(self, request, field_file):
+        return HttpResponseRedirect(redirect_to=field_file.url)
+
+
+class XAccelRedirectDelivery(BaseDelivery):
+    def __init__(self, prefix):
+        self.prefix = prefix.rstrip('/') + '/'
+
+    def serve(self, request, field_file):
+        # Тело, Range и кэширующие заголовки nginx обработает сам
+        response = HttpResponse()
+        del response['Content-Type']
+        response['X-Accel-Redirect'] = self.prefix + quote(field_file.name)
+        response['Content-Disposition'] = content_disposition(os.path.basename(field_file.name))
+        return response
+
+
+class XSendfileDelivery(BaseDelivery):
+    def serve(self, request, field_file):
+        response = HttpResponse()
+        del response['Content-Type']
+        response['X-Sendfile'] = field_file.path
+        response['Content-Disposition'] = content_disposition(os.path.basename(field_file.name))
+        return response
+
+
+class DjangoDelivery(BaseDelivery):
+    def __init__(self, block_size):
+        self.block_size = block_size
+
+    def serve(self, request, field_file):
+        path = field_file.path
+        try:
+            etag, last_modified, size = file_validators(path)
+        except FileNotFoundError:
+            raise Http404('Файл не найден.')
+        filename = os.path.basename(field_file.name)
+        content_type = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+
+        byte_range = requested_range(request, field_file)
+        if byte_range is False:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{size}'
+        elif byte_range is not None:
+            start, end = byte_range
+            response = StreamingHttpResponse(
+                iter_range(path, start, end, self.block_size), status=206, content_type=content_type
+            )
+            response['Content-Range'] = f'bytes {start}-{end}/{size}'
+            response['Content-Length'] = str(end - start + 1)
+            response['Content-Disposition'] = content_disposition(filename)
+        else:
+            # Весь файл: FileResponse отдает его через wsgi.file_wrapper (sendfile)
+            response = FileResponse(open(path, 'rb'), as_attachment=True, filename=filename)
+
+        response['Accept-Ranges'] = 'bytes'
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(last_modified)
+        return response
+
+
+def get_delivery():
+    config = get_delivery_settings()
+    backend = config['BACKEND']
+    if backend == 'x-accel':
+        return XAccelRedirectDelivery(config['ACCEL_PREFIX'])
+    if backend == 'x-sendfile':
+        return XSendfileDelivery()
+    if backend == 'redirect':
+        return RedirectDelivery()
+    return DjangoDelivery(config['BLOCK_SIZE'])
+
+
+def serve_file(request, field_file):
+    """Отдает файл выбранным в настройках способом. Права доступа проверяются до вызова."""
+    return get_delivery().serve(request, field_file)
@@ -0,0 +1,141 @@
+# backend/api/facets.py
+"""
+Подсчет фасетов для боковой панели каталога: сколько схем найдется
+для каждой категории, сложности, лицензии и самых популярных тегов.
+
+Фасеты "дизъюнктивные": при подсчете категорий игнорируется сам фильтр по категории
+(иначе в списке осталась бы только выбранная), но учитываются все остальные.
+На каждый фасет — один сгруппированный запрос, итого четыре запроса независимо
+от количества значений. Результат кэшируется по нормализованному набору фильтров
+в кэше каталога (api/cache.py: алиас, TIMEOUT и ENABLED из settings.CATALOG_CACHE)
+в пространстве имен 'schemes', поэтому сбрасывается вместе со списками схем.
+"""
+import hashlib
+import json
+
+from django.conf import settings
+from django.db.models import Count
+from django_filters.utils import translate_validation
+
+from .cache import get_cache, get_cache_settings, get_version
+from .filters import SchemeFilter
+from .models import EmbroideryScheme
+
+FACET_PARAMS = ('category', 'difficulty', 'license', 'tags')
+FILTER_PARAMS = FACET_PARAMS + ('search',)
+
+DEFAULTS = {
+    'TOP_TAGS': 20,
+    'MAX_TOP_TAGS': 100,
+}
+
+
+def get_facet_settings():
+    return {**DEFAULTS, **getattr(settings, 'SCHEME_FACETS', {})}
+
+
+def normalize_params(query_params):
+    """Оставляет только параметры фильтра и приводит их к каноническому виду."""
+    normalized = {}
+    for name in FILTER_PARAMS:
+        value = (query_params.get(name) or '').strip()
+        if not value:
+            continue
+        if name == 'tags':
+            value = ','.join(sorted({tag.strip() for tag in value.split(',') if tag.strip()}))
+        elif name == 'search':
+            value = ' '.join(value.lower().split())
+        normalized[name] = value
+    return normalized
+
+
+def cache_key(params, top_tags):
+    digest = hashlib.md5(json.dumps([params, top_tags], sort_keys=True).encode()).hexdigest()
+    # Версия каталога схем меняется при любом изменении схем, тегов, категорий и счетчиков
+    return f'catalog-cache:schemes:v{get_version("schemes")}:facets:{digest}'
+
+
+def validate_params(base_queryset, params, request=None):
+    """Неверные значения фильтров — та же ошибка 400, что и у списка (DjangoFilterBackend)."""
+    filterset = SchemeFilter(data=params, queryset=base_queryset, request=request)
+    if not filterset.is_valid():
+        raise translate_validation(filterset.errors)
+
+
+def filtered_ids(base_queryset, params, exclude=None, request=None):
+    """Возвращает подзапрос id схем, подходящих под все фильтры, кроме `exclude`."""
+    data = {name: value for name, value in params.items() if name != exclude}
+    filterset = SchemeFilter(data=data, queryset=base_queryset, request=request)
+    return filterset.qs.order_by().values('pk')
+
+
+def compute_facets(base_queryset, params, top_tags, request=None):
+    # Проверяется только при вычислении: с неверными фильтрами результат в кэш не попадает
+    validate_params(base_queryset, params, request)
+    schemes = EmbroideryScheme.objects.order_by()
+
+    categories = schemes.filter(
+        pk__in=filtered_ids(base_queryset, params, 'category', request), category__isnull=False
+    ).values('category_id', 'category__name').annotate(count=Count('pk')).order_by('category__name')
+
+    difficulties = schemes.filter(
+        pk__in=filtered_ids(base_queryset, params, 'difficulty', request)
+    ).values('difficulty').annotate(count=Count('pk'))
+
+    licenses = schemes.filter(
+        pk__in=filtered_ids(base_queryset, params, 'license', request)
+    ).values('license_id', 'license__short_name').annotate(count=Count('pk')).order_by('license__short_name')
+
+    tags = EmbroideryScheme.tags.through.objects.filter(
+        embroideryscheme_id__in=filtered_ids(base_queryset, params, 'tags', request)
+    ).values('tag_id', 'tag__name').annotate(count=Count('embroideryscheme_id')).order_by('-count', 'tag__name')
+
+    # Значения сложности отдаем в том же виде, в каком их принимает фильтр ('easy', 'medium', ...)
+    difficulty_values = {db_value: value for value, db_value in SchemeFilter.DIFFICULTY_MAP.items()}
+    difficulty_labels = dict(EmbroideryScheme.Difficulty.choices)
+    difficulty_order = list(difficulty_labels)
+
+    return {
+        'category': [
+            {'id': row['category_id'], 'name': row['category__name'], 'count': row['count']}
+            for row in categories
+        ],
+        'difficulty': [
+            {
+                'value': difficulty_values.get(row['difficulty'], row['difficulty']),
+                'label': str(difficulty_labels.get(row['difficulty'], row['difficulty'])),
+                'count': row['count'],
+            }
+            for row in sorted(difficulties, key=lambda row: difficulty_order.index(row['difficulty']))
+        ],
+        'license': [
+            {'id': row['license_id'], 'short_name': row['license__short_name'], 'count': row['count']}
+            for row in licenses
+        ],
+        'tags': [
+            {'id': row['tag_id'], 'name': row['tag__name'], 'count': row['count']}
+            for row in tags[:top_tags]
+        ],
+    }
+
+
+def get_facets(base_queryset, query_params, request=None):
+    """Возвращает фасеты для набора фильтров, используя кэш."""
+    config = get_facet_settings()
+    try:
+        top_tags = int(query_params.get('top_tags', config['TOP_TAGS']))
+    except (TypeError, ValueError):
+        top_tags = config['TOP_TAGS']
+    top_tags = max(0, min(top_tags, config['MAX_TOP_TAGS']))
+
+    params = normalize_params(query_params)
+    cache_config = get_cache_settings()
+    if not cache_config['ENABLED']:
+        return compute_facets(base_queryset, params, top_tags, request)
+    cache = get_cache()
+    key = cache_key(params, top_tags)
+    facets = cache.get(key)
+    if facets is None:
+        facets = compute_facets(base_queryset, params, top_tags, request)
+        cache.set(key, facets, cache_config['TIMEOUT'])
+    return facets
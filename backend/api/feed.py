@@ -0,0 +1,300 @@
+# backend/api/feed.py
+"""
+Персональная лента "для вас" (/api/v1/users/me/feed/) по совместным лайкам и избранному.
+
+Лента не считается на запрос: пакетный пересчет (команда build_feed или фоновая задача
+'feed.build') строит по взаимодействиям item-item модель и сохраняет для каждого
+пользователя SIZE лучших схем в таблицу Recommendation. Эндпоинт читает ее по индексу
+(user, -score) с курсорной пагинацией. Пользователь без рекомендаций (нет лайков
+и избранного или пересчет еще не запускался) получает публичные схемы в порядке trending.
+
+Модель — классическая item-item коллаборативная фильтрация:
+
+    A          разреженная матрица пользователь x схема: WEIGHTS['like'] за лайк плюс
+               WEIGHTS['favorite'] за избранное (только публичные схемы)
+    S = AᵀA    совместная встречаемость схем, нормированная до косинуса:
+               S[i, j] / (|A[:, i]| * |A[:, j]|); у каждой схемы остается NEIGHBORS соседей
+    R = A S    оценка схемы для пользователя — сумма сходств с тем, что он уже отметил;
+               отмеченные схемы и собственные схемы пользователя из ленты исключаются
+
+Обе матрицы считаются блоками по CHUNK_SIZE строк, поэтому в памяти одновременно
+только блок, A и урезанная S. Блоки — произведения scipy.sparse (SciPy есть в requirements.txt);
+тот же алгоритм на словарях Python остается запасным вариантом без SciPy и эталоном,
+с которым тесты сверяют результат.
+У пользователей с очень длинной историей берется MAX_USER_ITEMS схем с наибольшим весом:
+их вклад в AᵀA растет квадратично.
+
+Рекомендации пользователя заменяются целиком внутри транзакции его блока; строки
+пользователей, у которых взаимодействий больше нет, удаляются в конце по built_at.
+Между пересчетами лента не меняется: новый лайк попадет в нее при следующем запуске.
+
+Пересчет возвращает и логирует статистику: размеры матриц, время этапов
+и пиковую память по tracemalloc (учитывает и буферы NumPy).
+
+Настройки (settings.FEED):
+    WEIGHTS         вес лайка и добавления в избранное
+    NEIGHBORS       соседей на схему в матрице сходства
+    SIZE            рекомендаций на пользователя
+    MAX_USER_ITEMS  сколько схем пользователя учитывать
+    CHUNK_SIZE      строк матрицы (схем или пользователей) в одном блоке
+    TRACE_MEMORY    измерять пиковую память (tracemalloc замедляет пересчет)
+"""
+import heapq
+import logging
+import math
+import time
+import tracemalloc
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import EmbroideryScheme, Like, Recommendation
+from .ranking import get_ordering
+
+try:
+    import numpy as np
+    from scipy import sparse
+except ImportError:  # без SciPy работает реализация на словарях
+    np = sparse = None
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'WEIGHTS': {
+        'like': 1.0,
+        'favorite': 2.0,
+    },
+    'NEIGHBORS': 50,
+    'SIZE': 100,
+    'MAX_USER_ITEMS': 500,
+    'CHUNK_SIZE': 1000,
+    'TRACE_MEMORY': True,
+}
+
+
+def get_feed_settings():
+    config = {**DEFAULTS, **getattr(settings, 'FEED', {})}
+    config['WEIGHTS'] = {**DEFAULTS['WEIGHTS'], **config['WEIGHTS']}
+    return config
+
+
+# --- Данные ---
+
+class Interactions:
+    """
+    Матрица A в виде списков строк и столбцов: пользователь users[u] отметил схему
+    items[i] с весом w, если (i, w) есть в user_rows[u] и (u, w) — в item_columns[i].
+    """
+
+    def __init__(self, weights, authors, max_user_items):
+        by_user = defaultdict(dict)
+        for (user_id, scheme_id), weight in weights.items():
+            by_user[user_id][scheme_id] = weight
+        self.users = sorted(by_user)
+        self.items = sorted({scheme_id for row in by_user.values() for scheme_id in row})
+        index = {scheme_id: i for i, scheme_id in enumerate(self.items)}
+        self.authors = [authors.get(scheme_id) for scheme_id in self.items]
+        self.user_rows = []
+        self.item_columns = [[] for _ in self.items]
+        for u, user_id in enumerate(self.users):
+            # Самые "весомые" схемы, при равенстве — более новые
+            row = sorted(by_user[user_id].items(), key=lambda item: (-item[1], -item[0]))[:max_user_items]
+            self.user_rows.append([(index[scheme_id], weight) for scheme_id, weight in row])
+            for scheme_id, weight in row:
+                self.item_columns[index[scheme_id]].append((u, weight))
+        self.norms = [math.sqrt(sum(w * w for _, w in column)) for column in self.item_columns]
+
+    @property
+    def nnz(self):
+        return sum(len(row) for row in self.user_rows)
+
+
+def load_interactions(config):
+    """Три запроса: лайки, избранное и авторы публичных схем."""
+    public = EmbroideryScheme.Visibility.PUBLIC
+    weights = defaultdict(float)
+    likes = Like.objects.filter(scheme__visibility=public).order_by().values_list('user_id', 'scheme_id')
+    for pair in likes.iterator(chunk_size=5000):
+        weights[pair] += config['WEIGHTS']['like']
+    favorites = EmbroideryScheme.favorited_by.through.objects.filter(
+        embroideryscheme__visibility=public
+    ).order_by().values_list('user_id', 'embroideryscheme_id')
+    for pair in favorites.iterator(chunk_size=5000):
+        weights[pair] += config['WEIGHTS']['favorite']
+    authors = dict(EmbroideryScheme.objects.filter(visibility=public).values_list('pk', 'author_id'))
+    return Interactions(weights, authors, config['MAX_USER_ITEMS'])
+
+
+def top(pairs, k, exclude=()):
+    """
+    k пар (индекс, оценка) с наибольшей положительной оценкой, при равенстве — с меньшим индексом.
+    Оценки сравниваются с округлением, чтобы порядок сложения (словари или SciPy) не менял результат.
+    """
+    candidates = ((j, score) for j, score in pairs if score > 0 and j not in exclude)
+    return heapq.nsmallest(k, candidates, key=lambda item: (-round(item[1], 9), item[0]))
+
+
+# --- Произведения матриц: словари Python ---
+
+class _PythonEngine:
+    name = 'python'
+
+    def __init__(self, data):
+        self.data = data
+
+    def similarity_rows(self, rows):
+        """Строки косинусной матрицы AᵀA: для каждой схемы — [(j, сходство), ...], включая саму схему."""
+        data = self.data
+        for i in rows:
+            products = defaultdict(float)
+            for u, weight in data.item_columns[i]:
+                for j, other_weight in data.user_rows[u]:
+                    products[j] += weight * other_weight
+            yield [(j, value / (data.norms[i] * data.norms[j])) for j, value in products.items()]
+
+    def score_rows(self, users, neighbors):
+        """Строки R = A S для пользователей `users`: [(схема, оценка), ...]."""
+        for u in users:
+            scores = defaultdict(float)
+            for i, weight in self.data.user_rows[u]:
+                for j, similarity in neighbors[i]:
+                    scores[j] += weight * similarity
+            yield scores.items()
+
+
+# --- Произведения матриц: scipy.sparse ---
+
+class _SparseEngine:
+    name = 'scipy'
+
+    def __init__(self, data):
+        self.data = data
+        self.matrix = self._csr(
+            ((u, i, weight) for u, row in enumerate(data.user_rows) for i, weight in row),
+            (len(data.users), len(data.items))
+        )
+        self.transposed = self.matrix.T.tocsr()
+        norms = np.asarray(data.norms, dtype=np.float64)
+        self.inverse_norms = np.divide(1.0, norms, out=np.zeros_like(norms), where=norms > 0)
+        self.similarity = None
+
+    @staticmethod
+    def _csr(triples, shape):
+        rows, columns, values = [], [], []
+        for row, column, value in triples:
+            rows.append(row)
+            columns.append(column)
+            values.append(value)
+        return sparse.csr_matrix((values, (rows, columns)), shape=shape, dtype=np.float64)
+
+    @staticmethod
+    def _pairs(block):
+        """Строки разреженного блока как списки пар (столбец, значение)."""
+        block = block.tocsr()
+        for position in range(block.shape[0]):
+            start, end = block.indptr[position], block.indptr[position + 1]
+            yield list(zip(block.indices[start:end].tolist(), block.data[start:end].tolist()))
+
+    def similarity_rows(self, rows):
+        first, last = rows[0], rows[-1] + 1
+        block = self.transposed[first:last] @ self.matrix
+        return self._pairs(sparse.diags(self.inverse_norms[first:last]) @ block @ sparse.diags(self.inverse_norms))
+
+    def score_rows(self, users, neighbors):
+        if self.similarity is None:
+            size = len(self.data.items)
+            self.similarity = self._csr(
+                ((i, j, similarity) for i, pairs in enumerate(neighbors) for j, similarity in pairs),
+                (size, size)
+            )
+        return self._pairs(self.matrix[users[0]:users[-1] + 1] @ self.similarity)
+
+
+def get_engine(data):
+    return _SparseEngine(data) if sparse is not None else _PythonEngine(data)
+
+
+# --- Пересчет ---
+
+def _chunks(size, chunk_size):
+    for start in range(0, size, chunk_size):
+        yield range(start, min(start + chunk_size, size))
+
+
+def _save_chunk(data, users, recommendations):
+    user_ids = [data.users[u] for u in users]
+    with transaction.atomic():
+        Recommendation.objects.filter(user_id__in=user_ids).delete()
+        Recommendation.objects.bulk_create(recommendations, batch_size=1000)
+
+
+def build_feed():
+    """Полный пересчет рекомендаций. Возвращает статистику (она же пишется в лог)."""
+    config = get_feed_settings()
+    trace = config['TRACE_MEMORY'] and not tracemalloc.is_tracing()
+    if trace:
+        tracemalloc.start()
+    built_at = timezone.now()
+    stats = {'timings': {}}
+    try:
+        started = time.monotonic()
+        data = load_interactions(config)
+        engine = get_engine(data)
+        stats.update(engine=engine.name, users=len(data.users), items=len(data.items), interactions=data.nnz)
+        stats['timings']['load'] = time.monotonic() - started
+
+        started = time.monotonic()
+        neighbors = []
+        for rows in _chunks(len(data.items), config['CHUNK_SIZE']):
+            neighbors.extend(
+                top(pairs, config['NEIGHBORS'], exclude=(i,)) for i, pairs in zip(rows, engine.similarity_rows(rows))
+            )
+        stats['similar_pairs'] = sum(len(pairs) for pairs in neighbors)
+        stats['timings']['similarity'] = time.monotonic() - started
+
+        started = time.monotonic()
+        written = 0
+        for users in _chunks(len(data.users), config['CHUNK_SIZE']):
+            recommendations = []
+            for u, pairs in zip(users, engine.score_rows(users, neighbors)):
+                user_id = data.users[u]
+                pairs = list(pairs)
+                # Уже отмеченные и собственные схемы пользователю не рекомендуем
+                seen = {i for i, _ in data.user_rows[u]}
+                seen.update(j for j, _ in pairs if data.authors[j] == user_id)
+                recommendations.extend(
+                    Recommendation(user_id=user_id, scheme_id=data.items[j], score=score, built_at=built_at)
+                    for j, score in top(pairs, config['SIZE'], exclude=seen)
+                )
+            _save_chunk(data, users, recommendations)
+            written += len(recommendations)
+        # Пользователи, у которых больше нет взаимодействий, в пересчет не попали
+        Recommendation.objects.filter(built_at__lt=built_at).delete()
+        stats['recommendations'] = written
+        stats['timings']['recommendations'] = time.monotonic() - started
+        if trace:
+            stats['peak_memory'] = tracemalloc.get_traced_memory()[1]
+    finally:
+        if trace:
+            tracemalloc.stop()
+    stats['seconds'] = sum(stats['timings'].values())
+    logger.info('Лента пересчитана: %s', stats)
+    return stats
+
+
+# --- Чтение ---
+
+def get_feed(user, queryset):
+    """
+    Лента пользователя из `queryset` публичных схем: (выборка, порядок для курсора, источник).
+    Источник 'personal' — сохраненные рекомендации, 'trending' — запасной вариант.
+    """
+    queryset = queryset.filter(visibility=EmbroideryScheme.Visibility.PUBLIC)
+    if Recommendation.objects.filter(user=user).exists():
+        # F() использует тот же JOIN, что и фильтр, — одна строка на схему
+        personal = queryset.filter(recommended_to__user=user).annotate(feed_score=F('recommended_to__score'))
+        return personal, ('-feed_score', '-id'), 'personal'
+    return queryset.exclude(author=user), get_ordering('trending'), 'trending'
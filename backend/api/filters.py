@@ -2,15 +2,32 @@
 
 from django_filters import rest_framework as filters
 from .models import EmbroideryScheme
+from .ranking import ORDERINGS, get_ordering
+from .search import get_search_backend
 
 class SchemeFilter(filters.FilterSet):
     """
     Кастомный набор фильтров для модели EmbroideryScheme.
     """
-    search = filters.CharFilter(field_name='title', lookup_expr='icontains')
+    # Словарь для сопоставления значений с фронтенда и ключей модели
+    DIFFICULTY_MAP = {
+        'easy': 'EA',
+        'medium': 'ME',
+        'hard': 'HA',
+        'expert': 'EX'
+    }
+
+    search = filters.CharFilter(method='filter_by_search', label='Full-text search')
     license = filters.NumberFilter(field_name='license__id')
     tags = filters.CharFilter(method='filter_by_tags_name', label='Filter by tag names (comma-separated)')
 
+    # Сортировка по заранее посчитанным оценкам (api/ranking.py); по умолчанию — новые сверху
+    ordering = filters.ChoiceFilter(
+        choices=[(name, name) for name in ORDERINGS],
+        method='order_by_ranking',
+        label='Ordering'
+    )
+
     # --- НАЧАЛО ИЗМЕНЕНИЙ ---
 
     # Явно указываем, как фильтровать по сложности.
@@ -30,7 +47,18 @@ class SchemeFilter(filters.FilterSet):
         model = EmbroideryScheme
         # 'difficulty' теперь определен выше, так что его можно оставить или убрать из fields.
         # Для ясности оставим, но django-filter будет использовать наше кастомное определение.
-        fields = ['category', 'difficulty', 'license', 'search', 'tags']
+        fields = ['category', 'difficulty', 'license', 'search', 'tags', 'ordering']
+
+    def filter_by_search(self, queryset, name, value):
+        """
+        Полнотекстовый поиск по названию, описанию, тегам, категории и автору.
+        Результаты сортируются по релевантности (см. api/search.py).
+        """
+        return get_search_backend(queryset.db).search(queryset, value)
+
+    def order_by_ranking(self, queryset, name, value):
+        # Явная сортировка заменяет и порядок по релевантности при поиске
+        return queryset.order_by(*get_ordering(value))
 
     def filter_by_tags_name(self, queryset, name, value):
         tag_names = [tag.strip() for tag in value.split(',') if tag.strip()]
@@ -42,15 +70,8 @@ class SchemeFilter(filters.FilterSet):
         """
         Конвертирует 'easy' -> 'EA', 'medium' -> 'ME' и т.д.
         """
-        # Словарь для сопоставления
-        difficulty_map = {
-            'easy': 'EA',
-            'medium': 'ME',
-            'hard': 'HA',
-            'expert': 'EX'
-        }
         # Получаем код для БД, например, 'ME'
-        db_value = difficulty_map.get(value)
+        db_value = self.DIFFICULTY_MAP.get(value)
         if db_value:
             # Если значение найдено, фильтруем queryset
             return queryset.filter(difficulty=db_value)
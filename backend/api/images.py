@@ -0,0 +1,165 @@
+# backend/api/images.py
+"""
+Уменьшенные копии (производные) изображений схем.
+
+Для главного изображения схемы и картинок галереи генерируются копии фиксированных
+размеров в WebP и JPEG. Файлы лежат рядом с оригиналом:
+
+    schemes/main_images/2025/07/06/photo.jpg
+    schemes/main_images/2025/07/06/photo.card.webp
+    schemes/main_images/2025/07/06/photo.card.jpg
+
+Пути и размеры сохраняются в JSON-поле модели (main_image_variants / variants),
+чтобы сериализатору не приходилось проверять наличие файлов.
+
+render_variants() и render_job() работают только с файлами и не трогают базу, а модуль
+не импортирует модели на верхнем уровне, поэтому render_job() можно выполнять в пуле
+процессов, в том числе запущенных через spawn без django.setup() (см. команду generate_thumbnails).
+"""
+import io
+import os
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+# Имя варианта -> максимальные (ширина, высота); пропорции сохраняются
+VARIANT_SIZES = {
+    'card': (400, 400),
+    'gallery': (800, 800),
+    'detail': (1200, 1200),
+}
+
+# Какие варианты нужны для каждого вида изображений
+MAIN_IMAGE_VARIANTS = ('card', 'detail')
+GALLERY_IMAGE_VARIANTS = ('card', 'gallery')
+
+FORMATS = {
+    'webp': {'format': 'WEBP', 'quality': 80, 'method': 4},
+    'jpeg': {'format': 'JPEG', 'quality': 82, 'optimize': True, 'progressive': True},
+}
+EXTENSIONS = {'webp': 'webp', 'jpeg': 'jpg'}
+
+# Ошибки битого, отсутствующего или слишком большого файла: их пропускаем, а не повторяем
+IMAGE_ERRORS = (OSError, UnidentifiedImageError, Image.DecompressionBombError)
+
+
+def variant_name(source_name, variant, fmt):
+    base, _ = os.path.splitext(source_name)
+    return f'{base}.{variant}.{EXTENSIONS[fmt]}'
+
+
+def _save(storage, name, content):
+    if storage.exists(name):
+        storage.delete(name)
+    return storage.save(name, ContentFile(content))
+
+
+def render_variants(source_name, variants, storage=None):
+    """
+    Генерирует варианты для файла `source_name` из хранилища.
+    Возвращает словарь для JSON-поля:
+        {'source': ..., 'card': {'webp': path, 'jpeg': path, 'width': w, 'height': h}, ...}
+    """
+    storage = storage or default_storage
+    with storage.open(source_name, 'rb') as source:
+        image = Image.open(source)
+        image = ImageOps.exif_transpose(image)
+        if image.mode not in ('RGB', 'L'):
+            # JPEG не умеет прозрачность — подкладываем белый фон
+            background = Image.new('RGB', image.size, (255, 255, 255))
+            background.paste(image, mask=image.convert('RGBA').split()[-1])
+            image = background
+        image = image.convert('RGB')
+
+    result = {'source': source_name}
+    for variant in variants:
+        copy = image.copy()
+        copy.thumbnail(VARIANT_SIZES[variant], Image.Resampling.LANCZOS)
+        entry = {'width': copy.width, 'height': copy.height}
+        for fmt, options in FORMATS.items():
+            buffer = io.BytesIO()
+            copy.save(buffer, **options)
+            entry[fmt] = _save(storage, variant_name(source_name, variant, fmt), buffer.getvalue())
+        result[variant] = entry
+    return result
+
+
+def render_job(job):
+    """
+    Задача для пула процессов: (метка, pk, имя файла, варианты) ->
+    (метка, pk, варианты или None, текст ошибки или None).
+    """
+    label, pk, source_name, variants = job
+    try:
+        return label, pk, render_variants(source_name, variants), None
+    except IMAGE_ERRORS as exc:
+        return label, pk, None, str(exc)
+
+
+def variant_paths(variants):
+    return {
+        entry[fmt]
+        for variant, entry in (variants or {}).items() if variant != 'source'
+        for fmt in FORMATS if entry.get(fmt)
+    }
+
+
+def delete_variants(variants, keep=None, storage=None):
+    """Удаляет файлы вариантов, кроме тех, что перечислены в `keep`."""
+    storage = storage or default_storage
+    for path in variant_paths(variants) - variant_paths(keep):
+        if storage.exists(path):
+            storage.delete(path)
+
+
+def needs_variants(field_file, variants):
+    """True, если у изображения есть файл, а варианты отсутствуют или построены для другого файла."""
+    return bool(field_file) and (variants or {}).get('source') != field_file.name
+
+
+def update_scheme_variants(scheme):
+    """Строит варианты главного изображения схемы и сохраняет их без вызова save()."""
+    from .models import EmbroideryScheme
+
+    if not needs_variants(scheme.main_image, scheme.main_image_variants):
+        return False
+    try:
+        variants = render_variants(scheme.main_image.name, MAIN_IMAGE_VARIANTS)
+    except IMAGE_ERRORS:
+        # Битый или отсутствующий файл повторная попытка не исправит
+        return False
+    delete_variants(scheme.main_image_variants, keep=variants)
+    scheme.main_image_variants = variants
+    EmbroideryScheme.objects.filter(pk=scheme.pk).update(main_image_variants=scheme.main_image_variants)
+    return True
+
+
+def update_gallery_image_variants(image):
+    from .models import SchemeImage
+
+    if not needs_variants(image.image, image.variants):
+        return False
+    try:
+        variants = render_variants(image.image.name, GALLERY_IMAGE_VARIANTS)
+    except IMAGE_ERRORS:
+        return False
+    delete_variants(image.variants, keep=variants)
+    image.variants = variants
+    SchemeImage.objects.filter(pk=image.pk).update(variants=image.variants)
+    return True
+
+
+def variant_urls(variants, request=None, storage=None):
+    """Превращает пути из JSON-поля в URL для ответа API."""
+    storage = storage or default_storage
+    result = {}
+    for variant, entry in (variants or {}).items():
+        if variant == 'source':
+            continue
+        urls = {'width': entry['width'], 'height': entry['height']}
+        for fmt in FORMATS:
+            url = storage.url(entry[fmt])
+            urls[fmt] = request.build_absolute_uri(url) if request else url
+        result[variant] = urls
+    return result
@@ -0,0 +1,282 @@
+# backend/api/jobs.py
+"""
+Фоновые задачи: обработка загруженных файлов и изображений вне запроса.
+
+Задача — функция, зарегистрированная декоратором @task('имя') (см. api/tasks.py).
+В очередь ее ставит enqueue('имя', *args, scheme_id=...); аргументы хранятся в JSON,
+поэтому передаются id, а не объекты. Задачи, относящиеся к схеме, видны в поле
+processing детальной страницы.
+
+Режимы (settings.BACKGROUND_JOBS['MODE']):
+    'sync'      задача выполняется сразу, в том же запросе, запись Job не создается, ошибка
+                только логируется (для тестов: запрос ждет окончания обработки)
+    'thread'    запись Job создается в транзакции запроса, после коммита задача уходит
+                в пул потоков этого же процесса — для небольших установок без отдельного
+                воркера (по умолчанию)
+    'database'  задача только записывается в таблицу, выполняет ее
+                `python manage.py run_jobs` (один или несколько процессов)
+
+Задачу забирает условный UPDATE ... WHERE status='QU', поэтому несколько воркеров
+и пул потоков не выполнят ее дважды. При ошибке попытка повторяется через
+RETRY_DELAY * 2**(n-1) секунд; после MAX_ATTEMPTS попыток задача получает статус
+FAILED с текстом ошибки.
+
+Настройки (settings.BACKGROUND_JOBS):
+    MODE           'sync', 'thread' или 'database'
+    WORKERS        потоков в режиме 'thread'
+    MAX_ATTEMPTS   попыток на задачу
+    RETRY_DELAY    секунд до первой повторной попытки
+    STALE_AFTER    через сколько секунд задача RUNNING считается брошенной и возвращается в очередь
+    KEEP_DONE      сколько секунд хранить выполненные задачи
+    POLL_INTERVAL  пауза воркера при пустой очереди, секунд
+"""
+import atexit
+import logging
+import threading
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.db import close_old_connections, transaction
+from django.db.models import F
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .db import pin_primary
+from .models import EmbroideryScheme, Job
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'MODE': 'thread',
+    'WORKERS': 2,
+    'MAX_ATTEMPTS': 3,
+    'RETRY_DELAY': 30,
+    'STALE_AFTER': 3600,
+    'KEEP_DONE': 7 * 24 * 3600,
+    'POLL_INTERVAL': 2,
+}
+
+_registry = {}
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_job_settings():
+    return {**DEFAULTS, **getattr(settings, 'BACKGROUND_JOBS', {})}
+
+
+def task(name):
+    """Регистрирует функцию как фоновую задачу с именем `name`."""
+    def decorator(func):
+        _registry[name] = func
+        return func
+    return decorator
+
+
+def _check_name(name):
+    if name not in _registry:
+        raise ValueError(f'Неизвестная фоновая задача: {name}')
+
+
+def enqueue(name, *args, scheme_id=None, debounce=None):
+    """
+    Ставит задачу в очередь. Возвращает Job или None в режиме 'sync' (задача уже выполнена).
+
+    debounce — секунды: задача откладывается на это время, а пока она ждет, такая же
+    (то же имя и аргументы) повторно не ставится — серия изменений дает одну задачу.
+    В режиме 'sync' задача выполняется сразу, как обычно.
+    """
+    _check_name(name)
+    config = get_job_settings()
+    if config['MODE'] == 'sync':
+        run_now(name, args)
+        return None
+    run_after = timezone.now()
+    if debounce:
+        # Задача в очереди еще не начата и прочитает данные уже после этого изменения
+        waiting = Job.objects.filter(name=name, args=list(args), status=Job.Status.QUEUED).first()
+        if waiting is not None:
+            return waiting
+        run_after += timedelta(seconds=debounce)
+    job = Job.objects.create(
+        name=name, args=list(args), scheme_id=scheme_id, max_attempts=config['MAX_ATTEMPTS'], run_after=run_after
+    )
+    _dispatch(config, [job.pk], delay=debounce)
+    return job
+
+
+def enqueue_many(name, args_list, scheme_id=None):
+    """Ставит в очередь несколько задач одного вида одним INSERT."""
+    _check_name(name)
+    config = get_job_settings()
+    if config['MODE'] == 'sync':
+        for args in args_list:
+            run_now(name, args)
+        return []
+    jobs = Job.objects.bulk_create([
+        Job(name=name, args=list(args), scheme_id=scheme_id, max_attempts=config['MAX_ATTEMPTS'])
+        for args in args_list
+    ])
+    _dispatch(config, [job.pk for job in jobs])
+    return jobs
+
+
+def run_now(name, args):
+    """Режим 'sync': ошибка обработки логируется, но не ломает запрос, который создал задачу."""
+    try:
+        _registry[name](*args)
+    except Exception:
+        logger.exception('Фоновая задача %s%s не выполнена', name, tuple(args))
+
+
+def _dispatch(config, job_ids, delay=None):
+    if config['MODE'] == 'thread' and job_ids:
+        # Поток не увидит запись, пока транзакция запроса не закоммичена
+        if delay:
+            transaction.on_commit(lambda: [_submit_later(job_id, delay) for job_id in job_ids])
+        else:
+            transaction.on_commit(lambda: [submit(job_id) for job_id in job_ids])
+
+
+# --- Выполнение ---
+
+def claim(job_id):
+    """Забирает задачу на выполнение. False, если ее уже взял кто-то другой."""
+    return Job.objects.filter(pk=job_id, status=Job.Status.QUEUED).update(
+        status=Job.Status.RUNNING, started_at=timezone.now(), attempts=F('attempts') + 1
+    ) == 1
+
+
+def run_job(job_id):
+    """
+    Выполняет задачу, если удалось ее забрать. Возвращает итоговый статус
+    (QUEUED — будет повторная попытка) или None, если задача не взята.
+    """
+    with pin_primary():
+        return _run_claimed(job_id) if claim(job_id) else None
+
+
+def _run_claimed(job_id):
+    job = Job.objects.get(pk=job_id)
+    func = _registry.get(job.name)
+    try:
+        if func is None:
+            raise LookupError(f'Неизвестная фоновая задача: {job.name}')
+        func(*job.args)
+    except Exception:
+        logger.exception('Фоновая задача %s не выполнена (попытка %s)', job, job.attempts)
+        retry = func is not None and job.attempts < job.max_attempts
+        updates = {'last_error': traceback.format_exc()}
+        if retry:
+            delay = get_job_settings()['RETRY_DELAY'] * 2 ** (job.attempts - 1)
+            updates.update(status=Job.Status.QUEUED, run_after=timezone.now() + timedelta(seconds=delay))
+        else:
+            updates.update(status=Job.Status.FAILED, finished_at=timezone.now())
+    else:
+        updates = {'status': Job.Status.DONE, 'finished_at': timezone.now(), 'last_error': ''}
+    Job.objects.filter(pk=job_id).update(**updates)
+    if updates['status'] != Job.Status.QUEUED and job.scheme_id:
+        # Поле processing изменилось: обновляем updated_at, чтобы сменился ETag детальной страницы
+        EmbroideryScheme.objects.filter(pk=job.scheme_id).update(updated_at=timezone.now())
+    return updates['status']
+
+
+def due_jobs(limit):
+    with pin_primary():
+        return list(Job.objects.filter(
+            status=Job.Status.QUEUED, run_after__lte=timezone.now()
+        ).values_list('pk', flat=True)[:limit])
+
+
+def run_pending(limit=100):
+    """Выполняет до `limit` задач, время которых наступило. Возвращает количество выполненных."""
+    done = 0
+    for job_id in due_jobs(limit):
+        if run_job(job_id) is not None:
+            done += 1
+    return done
+
+
+def requeue_stale():
+    """Возвращает в очередь задачи, застрявшие в RUNNING (например, воркер был убит)."""
+    threshold = timezone.now() - timedelta(seconds=get_job_settings()['STALE_AFTER'])
+    return Job.objects.filter(status=Job.Status.RUNNING, started_at__lt=threshold).update(status=Job.Status.QUEUED)
+
+
+def purge_finished():
+    threshold = timezone.now() - timedelta(seconds=get_job_settings()['KEEP_DONE'])
+    deleted, _ = Job.objects.filter(status=Job.Status.DONE, finished_at__lt=threshold).delete()
+    return deleted
+
+
+# --- Пул потоков (режим 'thread') ---
+
+def get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=get_job_settings()['WORKERS'], thread_name_prefix='background-jobs'
+            )
+        return _executor
+
+
+def submit(job_id):
+    get_executor().submit(_run_in_thread, job_id)
+
+
+def _submit_later(job_id, delay):
+    # Ждем таймером, не занимая поток пула
+    timer = threading.Timer(delay, submit, [job_id])
+    timer.daemon = True
+    timer.start()
+
+
+def _run_in_thread(job_id):
+    try:
+        status = run_job(job_id)
+        if status == Job.Status.QUEUED:
+            # Повторная попытка
+            with pin_primary():
+                run_after = Job.objects.filter(pk=job_id).values_list('run_after', flat=True).first()
+            _submit_later(job_id, max((run_after - timezone.now()).total_seconds(), 0) if run_after else 0)
+    finally:
+        close_old_connections()
+
+
+def shutdown_executor(wait=True):
+    global _executor
+    with _executor_lock:
+        executor, _executor = _executor, None
+    if executor is not None:
+        executor.shutdown(wait=wait)
+
+
+atexit.register(shutdown_executor)
+
+
+@receiver(setting_changed)
+def _reset_on_settings_change(setting, **kwargs):
+    if setting == 'BACKGROUND_JOBS':
+        shutdown_executor()
+
+
+# --- Состояние обработки схемы ---
+
+def processing_state(jobs):
+    """
+    Сводка по незавершенным задачам схемы для поля processing:
+    status 'pending' (есть задачи в очереди или в работе), 'failed' или 'done'.
+    """
+    pending = sum(1 for job in jobs if job.status in (Job.Status.QUEUED, Job.Status.RUNNING))
+    failed = sum(1 for job in jobs if job.status == Job.Status.FAILED)
+    if pending:
+        state = 'pending'
+    elif failed:
+        state = 'failed'
+    else:
+        state = 'done'
+    return {'status': state, 'pending': pending, 'failed': failed}
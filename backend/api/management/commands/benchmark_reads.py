@@ -0,0 +1,74 @@
+# backend/api/management/commands/benchmark_reads.py
+
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.error import URLError
+from urllib.request import urlopen
+
+from django.core.management.base import BaseCommand, CommandError
+
+DEFAULT_PATHS = ('schemes/', 'schemes/{scheme}/', 'schemes/{scheme}/comments/', 'users/{username}/')
+
+
+class Command(BaseCommand):
+    help = (
+        'Нагрузочный тест эндпоинтов чтения. Сравнивает уже запущенные WSGI- и ASGI-серверы '
+        'с одинаковым числом воркеров, например:\n'
+        '  gunicorn core.wsgi -w 4 -b :8001\n'
+        '  gunicorn core.asgi -w 4 -k uvicorn.workers.UvicornWorker -b :8002\n'
+        '  python manage.py benchmark_reads --target wsgi=http://127.0.0.1:8001/api/v1/ '
+        '--target asgi=http://127.0.0.1:8002/api/v1/async/'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--target', action='append', required=True, metavar='NAME=BASE_URL',
+                            help='Сервер и базовый URL API; можно указать несколько раз.')
+        parser.add_argument('--requests', type=int, default=1000, help='Запросов на каждый путь.')
+        parser.add_argument('--concurrency', type=int, default=32, help='Одновременных клиентов.')
+        parser.add_argument('--scheme', default='1', help='id схемы для детальных путей.')
+        parser.add_argument('--username', default='admin', help='Пользователь для пути профиля.')
+        parser.add_argument('--path', action='append', dest='paths', default=None,
+                            help='Пути относительно BASE_URL (по умолчанию список, схема, комментарии, профиль).')
+
+    def fetch(self, url):
+        started = time.perf_counter()
+        try:
+            with urlopen(url, timeout=30) as response:
+                response.read()
+                ok = response.status == 200
+        except (URLError, OSError):
+            ok = False
+        return time.perf_counter() - started, ok
+
+    def run(self, url, total, concurrency):
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            results = list(executor.map(self.fetch, [url] * total))
+        elapsed = time.perf_counter() - started
+        latencies = sorted(latency for latency, ok in results if ok)
+        errors = sum(1 for _, ok in results if not ok)
+        if not latencies:
+            return total / elapsed, None, None, errors
+        p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+        return len(latencies) / elapsed, statistics.median(latencies), p95, errors
+
+    def handle(self, *args, **options):
+        targets = []
+        for target in options['target']:
+            name, sep, base_url = target.partition('=')
+            if not sep:
+                raise CommandError(f'Ожидается NAME=BASE_URL, получено: {target}')
+            targets.append((name, base_url.rstrip('/') + '/'))
+        paths = [
+            path.format(scheme=options['scheme'], username=options['username'])
+            for path in options['paths'] or DEFAULT_PATHS
+        ]
+
+        self.stdout.write(f'{"сервер":<8} {"путь":<28} {"зап/с":>8} {"p50, мс":>8} {"p95, мс":>8} {"ошибок":>7}')
+        for path in paths:
+            for name, base_url in targets:
+                rps, p50, p95, errors = self.run(base_url + path, options['requests'], options['concurrency'])
+                p50 = f'{p50 * 1000:.1f}' if p50 is not None else '-'
+                p95 = f'{p95 * 1000:.1f}' if p95 is not None else '-'
+                self.stdout.write(f'{name:<8} {path:<28} {rps:>8.0f} {p50:>8} {p95:>8} {errors:>7}')
@@ -0,0 +1,24 @@
+# backend/api/management/commands/build_feed.py
+
+from django.core.management.base import BaseCommand
+
+from api.feed import build_feed
+
+
+class Command(BaseCommand):
+    help = (
+        'Пересчитывает персональные ленты /users/me/feed/ по совместным лайкам и избранному '
+        '(api/feed.py) и печатает время этапов и пиковую память. Запускать периодически (cron).'
+    )
+
+    def handle(self, *args, **options):
+        stats = build_feed()
+        self.stdout.write(
+            f"Пользователей: {stats['users']}, схем: {stats['items']}, "
+            f"взаимодействий: {stats['interactions']}, пар похожих схем: {stats['similar_pairs']}, "
+            f"рекомендаций: {stats['recommendations']} ({stats['engine']})"
+        )
+        timings = ', '.join(f'{name} {seconds:.2f} с' for name, seconds in stats['timings'].items())
+        self.stdout.write(f"Время: {stats['seconds']:.2f} с ({timings})")
+        if 'peak_memory' in stats:
+            self.stdout.write(f"Пиковая память: {stats['peak_memory'] / 1024 / 1024:.1f} МБ")
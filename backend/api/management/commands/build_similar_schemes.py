@@ -0,0 +1,19 @@
+# backend/api/management/commands/build_similar_schemes.py
+
+import time
+
+from django.core.management.base import BaseCommand
+
+from api import similarity
+
+
+class Command(BaseCommand):
+    help = (
+        'Полностью пересчитывает таблицу похожих схем (api/similarity.py): '
+        'K ближайших соседей для каждой публичной схемы.'
+    )
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        pairs = similarity.rebuild_neighbors()
+        self.stdout.write(f'Записано пар: {pairs} за {time.monotonic() - started:.2f} с')
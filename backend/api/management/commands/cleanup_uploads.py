@@ -0,0 +1,29 @@
+# backend/api/management/commands/cleanup_uploads.py
+
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from api.models import ChunkedUpload
+from api.uploads import delete_upload, get_upload_settings
+
+
+class Command(BaseCommand):
+    help = (
+        'Удаляет незавершенные и неиспользованные загрузки по частям старше '
+        'CHUNKED_UPLOADS["EXPIRE_HOURS"] вместе с временными файлами.'
+    )
+
+    def handle(self, *args, **options):
+        hours = get_upload_settings()['EXPIRE_HOURS']
+        expired = ChunkedUpload.objects.filter(
+            created_at__lt=timezone.now() - timedelta(hours=hours)
+        ).exclude(status=ChunkedUpload.Status.ATTACHED)
+        count = 0
+        for upload in expired.iterator():
+            delete_upload(upload)
+            count += 1
+        # Использованные загрузки больше не нужны: файл уже перенесен к схеме
+        attached, _ = ChunkedUpload.objects.filter(status=ChunkedUpload.Status.ATTACHED).delete()
+        self.stdout.write(f'Удалено загрузок: {count + attached}')
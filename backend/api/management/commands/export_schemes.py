@@ -0,0 +1,72 @@
+# backend/api/management/commands/export_schemes.py
+
+import os
+import shutil
+import time
+
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+
+from api.models import EmbroideryScheme
+from api.transfer import FORMATS, RecordWriter, detect_format, media_source, open_stream, scheme_record
+
+
+class Command(BaseCommand):
+    help = 'Выгружает схемы в JSONL или CSV (и, по желанию, их файлы в каталог медиа).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('output', help="Файл выгрузки ('-' — stdout).")
+        parser.add_argument('--format', choices=FORMATS, default=None,
+                            help='Формат (по умолчанию — по расширению файла, иначе jsonl).')
+        parser.add_argument('--chunk-size', type=int, default=2000,
+                            help='Сколько схем читать из базы за раз (по умолчанию 2000).')
+        parser.add_argument('--media-dir', default=None,
+                            help='Скопировать главные изображения, файлы и галерею в этот каталог.')
+        parser.add_argument('--public-only', action='store_true', help='Только публичные схемы.')
+
+    def copy_media(self, media_dir, names):
+        for name in names:
+            if not name:
+                continue
+            target = media_source(media_dir, name)
+            if os.path.exists(target):
+                continue
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            try:
+                with default_storage.open(name, 'rb') as source, open(target, 'wb') as destination:
+                    shutil.copyfileobj(source, destination)
+            except FileNotFoundError:
+                self.log.write(f'  файл не найден: {name}')
+
+    def handle(self, *args, **options):
+        output = options['output']
+        fmt = detect_format(output, options['format'])
+        media_dir = options['media_dir']
+        # Если данные идут в stdout, прогресс пишем в stderr
+        self.log = self.stderr if output == '-' else self.stdout
+
+        queryset = EmbroideryScheme.objects.select_related('author', 'category', 'license').prefetch_related(
+            'tags', 'files', 'images'
+        ).order_by('pk')
+        if options['public_only']:
+            queryset = queryset.filter(visibility=EmbroideryScheme.Visibility.PUBLIC)
+
+        started = time.monotonic()
+        total = 0
+        with open_stream(output, 'w') as stream:
+            writer = RecordWriter(stream, fmt)
+            # iterator() с prefetch_related подгружает связи порциями по chunk_size
+            for scheme in queryset.iterator(chunk_size=options['chunk_size']):
+                record = scheme_record(scheme)
+                writer.write(record)
+                if media_dir:
+                    self.copy_media(media_dir, [record['main_image'], *record['files'], *record['images']])
+                total += 1
+                if total % options['chunk_size'] == 0:
+                    elapsed = time.monotonic() - started
+                    self.log.write(f'  выгружено: {total} ({total / elapsed:.0f} схем/с)')
+
+        elapsed = time.monotonic() - started
+        self.log.write(self.style.SUCCESS(
+            f'Готово: {total} схем за {elapsed:.1f} с ({total / elapsed if elapsed else 0:.0f} схем/с)'
+        ))
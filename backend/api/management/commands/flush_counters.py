@@ -0,0 +1,29 @@
+# backend/api/management/commands/flush_counters.py
+
+import time
+
+from django.core.management.base import BaseCommand
+
+from api import counters
+
+
+class Command(BaseCommand):
+    help = (
+        'Сбрасывает буферизованные счетчики просмотров и скачиваний в базу. '
+        'Имеет смысл для SCHEME_COUNTERS["BACKEND"] = "cache", где буфер общий для всех воркеров.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--loop', type=float, default=None, metavar='SECONDS',
+            help='Не завершаться, а сбрасывать буфер каждые SECONDS секунд.'
+        )
+
+    def handle(self, *args, **options):
+        interval = options['loop']
+        while True:
+            updated = counters.flush()
+            self.stdout.write(f'Обновлено строк: {updated}')
+            if interval is None:
+                break
+            time.sleep(interval)
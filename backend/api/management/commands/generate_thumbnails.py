@@ -0,0 +1,83 @@
+# backend/api/management/commands/generate_thumbnails.py
+
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from api.cache import bump_version
+from api.images import render_job, needs_variants, MAIN_IMAGE_VARIANTS, GALLERY_IMAGE_VARIANTS
+from api.models import EmbroideryScheme, SchemeImage
+
+
+# Сколько сохраненных изображений между сбросами кэша каталога (и строками прогресса)
+BATCH_SIZE = 100
+
+
+class Command(BaseCommand):
+    help = 'Генерирует уменьшенные копии для уже загруженных главных изображений и картинок галереи.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=None,
+                            help='Количество процессов (по умолчанию — по числу ядер).')
+        parser.add_argument('--force', action='store_true',
+                            help='Перегенерировать варианты, даже если они уже есть.')
+
+    def collect_jobs(self, force):
+        for scheme in EmbroideryScheme.objects.exclude(main_image='').exclude(main_image__isnull=True).only(
+                'pk', 'main_image', 'main_image_variants').iterator(chunk_size=1000):
+            if force or needs_variants(scheme.main_image, scheme.main_image_variants):
+                yield 'scheme', scheme.pk, scheme.main_image.name, MAIN_IMAGE_VARIANTS
+        for image in SchemeImage.objects.only('pk', 'image', 'variants').iterator(chunk_size=1000):
+            if force or needs_variants(image.image, image.variants):
+                yield 'image', image.pk, image.image.name, GALLERY_IMAGE_VARIANTS
+
+    def save_variants(self, model_label, pk, variants):
+        if model_label == 'scheme':
+            EmbroideryScheme.objects.filter(pk=pk).update(main_image_variants=variants)
+        else:
+            SchemeImage.objects.filter(pk=pk).update(variants=variants)
+
+    def handle(self, *args, **options):
+        jobs = list(self.collect_jobs(options['force']))
+        self.stdout.write(f'Изображений к обработке: {len(jobs)}')
+        if not jobs:
+            return
+
+        # Дочерние процессы не должны наследовать открытые соединения с базой
+        connections.close_all()
+
+        started = time.monotonic()
+        done = failed = pending = 0
+        with ProcessPoolExecutor(max_workers=options['workers']) as executor:
+            # Задача лежит в api.images без импорта моделей: процессы, запущенные через spawn,
+            # импортируют только ее модуль, а не этот (он требует готового реестра приложений)
+            futures = {executor.submit(render_job, job): job for job in jobs}
+            for future in as_completed(futures):
+                model_label, pk = futures[future][:2]
+                try:
+                    _, _, variants, error = future.result()
+                    if not error:
+                        self.save_variants(model_label, pk, variants)
+                except Exception as exc:
+                    # Неожиданная ошибка одного файла (или упавший процесс) не останавливает остальные
+                    error = f'{type(exc).__name__}: {exc}'
+                if error:
+                    failed += 1
+                    self.stderr.write(f'  {model_label} #{pk}: {error}')
+                    continue
+                done += 1
+                pending += 1
+                if pending == BATCH_SIZE:
+                    # Варианты пишутся UPDATE без сигналов: списки и ETag схем сбрасываем сами
+                    bump_version('schemes')
+                    pending = 0
+                    self.stdout.write(f'  готово: {done}/{len(jobs)}')
+        if pending:
+            bump_version('schemes')
+
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Готово: {done}, ошибок: {failed}, {elapsed:.1f} с ({done / elapsed if elapsed else 0:.1f} изобр./с)'
+        ))
@@ -0,0 +1,155 @@
+# backend/api/management/commands/import_schemes.py
+
+import os
+import time
+from itertools import islice
+
+from django.contrib.auth import get_user_model
+from django.core.exceptions import ValidationError
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from api.cache import bump_version
+from api.models import Category, EmbroideryScheme, License, SchemeFile, SchemeImage
+from api.search import index_schemes
+from api.tags import normalize_tag_name, resolve_tags
+from api.transfer import FORMATS, SCALAR_FIELDS, detect_format, media_source, open_stream, read_records
+
+
+class Command(BaseCommand):
+    help = (
+        'Загружает схемы из JSONL или CSV (формат см. в api/transfer.py). '
+        'Авторы, категории, лицензии и теги ищутся пачками, схемы создаются через bulk_create.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('input', help="Файл выгрузки ('-' — stdin).")
+        parser.add_argument('--format', choices=FORMATS, default=None,
+                            help='Формат (по умолчанию — по расширению файла, иначе jsonl).')
+        parser.add_argument('--batch-size', type=int, default=500,
+                            help='Сколько схем создавать в одной транзакции (по умолчанию 500).')
+        parser.add_argument('--media-dir', default=None,
+                            help='Каталог с файлами из выгрузки. Без него пути должны уже существовать в MEDIA_ROOT.')
+
+    def store(self, name):
+        """Копирует файл из --media-dir в хранилище и возвращает имя, под которым он сохранен."""
+        if not name or not self.media_dir:
+            return name
+        source = media_source(self.media_dir, name)
+        if not os.path.exists(source):
+            self.stderr.write(f'  файл не найден: {source}')
+            return None
+        with open(source, 'rb') as content:
+            stored_name = default_storage.save(name, File(content, name=os.path.basename(name)))
+        self.stored.append(stored_name)
+        return stored_name
+
+    def clean_fields(self, record):
+        """
+        Скалярные поля записи, проверенные и приведенные полями модели (варианты visibility
+        и difficulty, числа, длина строк). Возвращает (поля, ошибки).
+        """
+        fields, errors = {}, []
+        for name in SCALAR_FIELDS:
+            if record.get(name) in (None, ''):
+                continue
+            try:
+                fields[name] = EmbroideryScheme._meta.get_field(name).clean(record[name], None)
+            except ValidationError as exc:
+                errors.append(f"{name}={record[name]!r}: {' '.join(exc.messages)}")
+        return fields, errors
+
+    def import_batch(self, records):
+        # Файлы копируются в хранилище до транзакции пачки; если она откатится, их нужно удалить
+        self.stored = []
+        try:
+            return self.create_batch(records)
+        except BaseException:
+            for name in self.stored:
+                default_storage.delete(name)
+            raise
+
+    def create_batch(self, records):
+        # Справочники — по одному запросу на пачку
+        authors = {user.username: user for user in get_user_model().objects.filter(
+            username__in={record.get('author') for record in records})}
+        categories = {category.slug: category for category in Category.objects.filter(
+            slug__in={record.get('category') for record in records if record.get('category')})}
+        licenses = {license.short_name: license for license in License.objects.filter(
+            short_name__in={record.get('license') for record in records})}
+        tags = {tag.normalized_name: tag for tag in resolve_tags(
+            [name for record in records for name in record.get('tags') or []])}
+
+        schemes, relations = [], []
+        for record in records:
+            author, license = authors.get(record.get('author')), licenses.get(record.get('license'))
+            if not record.get('title') or author is None or license is None:
+                self.skipped += 1
+                self.stderr.write(
+                    f"  пропущена запись {record.get('id') or record.get('title')!r}: "
+                    f"нет названия, автора {record.get('author')!r} или лицензии {record.get('license')!r}"
+                )
+                continue
+            fields, errors = self.clean_fields(record)
+            if errors:
+                self.skipped += 1
+                self.stderr.write(
+                    f"  пропущена запись {record.get('id') or record.get('title')!r}: {'; '.join(errors)}"
+                )
+                continue
+            schemes.append(EmbroideryScheme(
+                author=author, license=license, category=categories.get(record.get('category')),
+                main_image=self.store(record.get('main_image')), **fields
+            ))
+            relations.append((
+                {tags[normalize_tag_name(name)] for name in record.get('tags') or []},
+                [self.store(name) for name in record.get('files') or []],
+                [self.store(name) for name in record.get('images') or []],
+            ))
+
+        Through = EmbroideryScheme.tags.through
+        with transaction.atomic():
+            EmbroideryScheme.objects.bulk_create(schemes)
+            through_rows, files, images = [], [], []
+            for scheme, (scheme_tags, file_names, image_names) in zip(schemes, relations):
+                through_rows += [Through(embroideryscheme_id=scheme.pk, tag_id=tag.pk) for tag in scheme_tags]
+                files += [SchemeFile(scheme=scheme, file=name) for name in file_names if name]
+                images += [SchemeImage(scheme=scheme, image=name) for name in image_names if name]
+            Through.objects.bulk_create(through_rows)
+            SchemeFile.objects.bulk_create(files)
+            SchemeImage.objects.bulk_create(images)
+            # bulk_create не отправляет сигналы — поисковый индекс обновляем сами
+            index_schemes([scheme.pk for scheme in schemes])
+        return len(schemes)
+
+    def handle(self, *args, **options):
+        path = options['input']
+        if path != '-' and not os.path.exists(path):
+            raise CommandError(f'Файл не найден: {path}')
+        self.media_dir = options['media_dir']
+        self.skipped = 0
+        batch_size = options['batch_size']
+
+        started = time.monotonic()
+        total = 0
+        with open_stream(path, 'r') as stream:
+            records = read_records(stream, detect_format(path, options['format']))
+            while True:
+                batch = list(islice(records, batch_size))
+                if not batch:
+                    break
+                total += self.import_batch(batch)
+                elapsed = time.monotonic() - started
+                self.stdout.write(f'  загружено: {total} ({total / elapsed:.0f} схем/с)')
+
+        if total:
+            bump_version('schemes', 'tags')
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Готово: {total} схем, пропущено: {self.skipped}, {elapsed:.1f} с '
+            f'({total / elapsed if elapsed else 0:.0f} схем/с)'
+        ))
+        if total:
+            self.stdout.write('Уменьшенные копии изображений: python manage.py generate_thumbnails')
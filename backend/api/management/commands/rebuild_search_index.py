@@ -0,0 +1,46 @@
+# backend/api/management/commands/rebuild_search_index.py
+
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from api.models import EmbroideryScheme
+from api.search import get_search_backend
+
+
+class Command(BaseCommand):
+    help = 'Полностью перестраивает полнотекстовый индекс схем.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=500,
+            help='Сколько схем индексировать за один проход (по умолчанию 500).'
+        )
+        parser.add_argument('--database', default='default', help='Алиас базы данных.')
+
+    def handle(self, *args, **options):
+        using = options['database']
+        batch_size = options['batch_size']
+        backend = get_search_backend(using)
+        self.stdout.write(f'Бэкенд поиска: {type(backend).__name__}')
+
+        started = time.monotonic()
+        total = 0
+        queryset = EmbroideryScheme.objects.using(using).select_related('author', 'category').order_by('pk')
+
+        with transaction.atomic(using=using):
+            backend.clear()
+            last_pk = 0
+            while True:
+                # Листаем по pk, а не OFFSET — так каждый проход стоит одинаково
+                batch = list(queryset.filter(pk__gt=last_pk).prefetch_related('tags')[:batch_size])
+                if not batch:
+                    break
+                backend.index(batch)
+                last_pk = batch[-1].pk
+                total += len(batch)
+                self.stdout.write(f'  проиндексировано: {total}')
+
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(f'Готово: {total} схем за {elapsed:.1f} с'))
@@ -0,0 +1,35 @@
+# backend/api/management/commands/recount_scheme_stats.py
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from api.models import EmbroideryScheme
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает денормализованные счетчики схем (лайки, избранное, комментарии, скачивания).'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Сколько схем пересчитывать одним UPDATE (по умолчанию 1000).'
+        )
+        parser.add_argument(
+            'ids', nargs='*', type=int,
+            help='ID схем для пересчета. Если не указаны, пересчитываются все схемы.'
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        queryset = EmbroideryScheme.objects.order_by('pk')
+        if options['ids']:
+            queryset = queryset.filter(pk__in=options['ids'])
+
+        ids = list(queryset.values_list('pk', flat=True))
+        updated = 0
+        for start in range(0, len(ids), batch_size):
+            batch = ids[start:start + batch_size]
+            with transaction.atomic():
+                updated += EmbroideryScheme.objects.filter(pk__in=batch).recount_stats()
+
+        self.stdout.write(self.style.SUCCESS(f'Пересчитано схем: {updated}'))
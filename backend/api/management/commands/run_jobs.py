@@ -0,0 +1,43 @@
+# backend/api/management/commands/run_jobs.py
+
+import time
+
+from django.core.management.base import BaseCommand
+
+from api import jobs
+
+
+class Command(BaseCommand):
+    help = (
+        'Воркер фоновых задач (api/jobs.py): выполняет задачи из очереди в базе. '
+        'Нужен для BACKGROUND_JOBS["MODE"] = "database"; в режиме "thread" дорабатывает '
+        'задачи, оставшиеся после перезапуска процесса. Можно запускать несколько экземпляров.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--once', action='store_true',
+            help='Выполнить задачи, время которых наступило, и завершиться.'
+        )
+        parser.add_argument(
+            '--batch', type=int, default=100,
+            help='Сколько задач забирать из очереди за один проход.'
+        )
+
+    def handle(self, *args, **options):
+        config = jobs.get_job_settings()
+        total = 0
+        try:
+            while True:
+                jobs.requeue_stale()
+                done = jobs.run_pending(options['batch'])
+                total += done
+                if done:
+                    continue
+                if options['once']:
+                    break
+                jobs.purge_finished()
+                time.sleep(config['POLL_INTERVAL'])
+        except KeyboardInterrupt:
+            pass
+        self.stdout.write(f'Выполнено задач: {total}')
@@ -0,0 +1,30 @@
+# backend/api/management/commands/update_scheme_scores.py
+
+import time
+
+from django.core.management.base import BaseCommand
+
+from api.ranking import update_scores
+
+
+class Command(BaseCommand):
+    help = (
+        'Пересчитывает оценки popularity_score и trending_score для сортировок каталога '
+        '?ordering=popular|trending (api/ranking.py). Запускать периодически (cron) или с --loop.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--loop', type=float, default=None, metavar='SECONDS',
+            help='Не завершаться, а пересчитывать оценки каждые SECONDS секунд.'
+        )
+
+    def handle(self, *args, **options):
+        interval = options['loop']
+        while True:
+            started = time.monotonic()
+            updated = update_scores()
+            self.stdout.write(f'Обновлено схем: {updated} за {time.monotonic() - started:.2f} с')
+            if interval is None:
+                break
+            time.sleep(interval)
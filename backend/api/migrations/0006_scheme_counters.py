@@ -0,0 +1,64 @@
+# Generated by Django 5.2.4 on 2026-10-18 06:45
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery, Sum, IntegerField
+from django.db.models.functions import Coalesce
+
+
+def populate_counters(apps, schema_editor):
+    """
+    Заполняет новые счетчики по уже существующим лайкам, избранному, комментариям и скачиваниям.
+    """
+    EmbroideryScheme = apps.get_model('api', 'EmbroideryScheme')
+    Like = apps.get_model('api', 'Like')
+    Comment = apps.get_model('api', 'Comment')
+    SchemeFile = apps.get_model('api', 'SchemeFile')
+    FavoritesThrough = EmbroideryScheme.favorited_by.through
+
+    def count_of(queryset, group_by):
+        return Coalesce(Subquery(
+            queryset.order_by().values(group_by).annotate(total=Count('pk')).values('total'),
+            output_field=IntegerField()
+        ), 0)
+
+    downloads = SchemeFile.objects.filter(scheme=OuterRef('pk')).order_by().values('scheme').annotate(
+        total=Sum('downloads_count')
+    ).values('total')
+
+    EmbroideryScheme.objects.update(
+        likes_count=count_of(Like.objects.filter(scheme=OuterRef('pk')), 'scheme'),
+        favorites_count=count_of(FavoritesThrough.objects.filter(embroideryscheme=OuterRef('pk')), 'embroideryscheme'),
+        comments_count=count_of(Comment.objects.filter(scheme=OuterRef('pk')), 'scheme'),
+        downloads_count=Coalesce(Subquery(downloads, output_field=IntegerField()), 0),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0005_populate_licenses'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='embroideryscheme',
+            name='comments_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='comments count'),
+        ),
+        migrations.AddField(
+            model_name='embroideryscheme',
+            name='downloads_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='downloads count'),
+        ),
+        migrations.AddField(
+            model_name='embroideryscheme',
+            name='favorites_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='favorites count'),
+        ),
+        migrations.AddField(
+            model_name='embroideryscheme',
+            name='likes_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='likes count'),
+        ),
+        migrations.RunPython(populate_counters, reverse_code=migrations.RunPython.noop),
+    ]
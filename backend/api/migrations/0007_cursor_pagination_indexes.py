@@ -0,0 +1,23 @@
+# Generated by Django 5.2.4 on 2026-10-18 06:47
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0006_scheme_counters'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['scheme', 'created_at', 'id'], name='api_comment_scheme_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='embroideryscheme',
+            index=models.Index(fields=['-created_at', '-id'], name='api_scheme_created_id_idx'),
+        ),
+    ]
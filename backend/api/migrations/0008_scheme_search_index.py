@@ -0,0 +1,49 @@
+# backend/api/migrations/0008_scheme_search_index.py
+
+from django.db import migrations
+
+
+def create_search_tables(apps, schema_editor):
+    """
+    Создает служебную таблицу полнотекстового поиска под текущую базу (см. api/search.py).
+    Для других баз ничего не делаем — будет использоваться поиск через icontains.
+    """
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        with schema_editor.connection.cursor() as cursor:
+            cursor.execute("SELECT sqlite_compileoption_used('ENABLE_FTS5')")
+            fts5_enabled = cursor.fetchone()[0]
+        if not fts5_enabled:
+            return
+        schema_editor.execute(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS api_scheme_fts USING fts5("
+            "title, description, tags, category, author, tokenize = 'unicode61 remove_diacritics 2')"
+        )
+    elif vendor == 'postgresql':
+        schema_editor.execute(
+            "CREATE TABLE IF NOT EXISTS api_scheme_search ("
+            "scheme_id bigint PRIMARY KEY REFERENCES api_embroideryscheme (id) ON DELETE CASCADE DEFERRABLE INITIALLY DEFERRED, "
+            "document tsvector NOT NULL)"
+        )
+        schema_editor.execute(
+            "CREATE INDEX IF NOT EXISTS api_scheme_search_document_gin ON api_scheme_search USING GIN (document)"
+        )
+
+
+def drop_search_tables(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        schema_editor.execute('DROP TABLE IF EXISTS api_scheme_fts')
+    elif vendor == 'postgresql':
+        schema_editor.execute('DROP TABLE IF EXISTS api_scheme_search')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0007_cursor_pagination_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_tables, reverse_code=drop_search_tables),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.4 on 2026-10-18 06:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0008_scheme_search_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='embroideryscheme',
+            name='main_image_variants',
+            field=models.JSONField(blank=True, default=dict, editable=False, verbose_name='main image variants'),
+        ),
+        migrations.AddField(
+            model_name='schemeimage',
+            name='variants',
+            field=models.JSONField(blank=True, default=dict, editable=False, verbose_name='image variants'),
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 5.2.4 on 2026-10-18 06:55
+
+import django.db.models.deletion
+import uuid
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0009_image_variants'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChunkedUpload',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('filename', models.CharField(max_length=255, verbose_name='file name')),
+                ('size', models.PositiveBigIntegerField(verbose_name='size in bytes')),
+                ('offset', models.PositiveBigIntegerField(default=0, verbose_name='bytes received')),
+                ('checksum', models.CharField(blank=True, max_length=64, verbose_name='SHA-256 checksum')),
+                ('status', models.CharField(choices=[('UP', 'Uploading'), ('OK', 'Complete'), ('AT', 'Attached')], default='UP', max_length=2, verbose_name='status')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='created at')),
+                ('completed_at', models.DateTimeField(blank=True, null=True, verbose_name='completed at')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='chunked_uploads', to=settings.AUTH_USER_MODEL, verbose_name='user')),
+            ],
+            options={
+                'verbose_name': 'chunked upload',
+                'verbose_name_plural': 'chunked uploads',
+                'ordering': ['-created_at'],
+            },
+        ),
+    ]
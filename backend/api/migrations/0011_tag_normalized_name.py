@@ -0,0 +1,48 @@
+from django.db import migrations, models
+
+
+def normalize(name):
+    # Копия api.tags.normalize_tag_name: миграции не должны зависеть от текущего кода
+    return ' '.join(name.split()).casefold()
+
+
+def populate_normalized_names(apps, schema_editor):
+    """
+    Заполняет normalized_name. Теги, отличавшиеся только регистром ("Пионы" и "пионы"),
+    сливаются в самый старый: связи со схемами переносятся, дубликаты удаляются.
+    """
+    Tag = apps.get_model('api', 'Tag')
+    Through = apps.get_model('api', 'EmbroideryScheme').tags.through
+
+    keep = {}
+    for tag in Tag.objects.order_by('pk'):
+        key = normalize(tag.name)
+        if key not in keep:
+            keep[key] = tag.pk
+            Tag.objects.filter(pk=tag.pk).update(normalized_name=key)
+            continue
+        target = keep[key]
+        linked = set(Through.objects.filter(tag_id=target).values_list('embroideryscheme_id', flat=True))
+        Through.objects.filter(tag_id=tag.pk).exclude(embroideryscheme_id__in=linked).update(tag_id=target)
+        tag.delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0010_chunked_upload'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tag',
+            name='normalized_name',
+            field=models.CharField(editable=False, max_length=100, null=True, verbose_name='normalized name'),
+        ),
+        migrations.RunPython(populate_normalized_names, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='tag',
+            name='normalized_name',
+            field=models.CharField(editable=False, max_length=100, unique=True, verbose_name='normalized name'),
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 5.2.4 on 2026-10-18 07:02
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0011_tag_normalized_name'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='embroideryscheme',
+            index=models.Index(condition=models.Q(('visibility', 'PUB')), fields=['-created_at', '-id'], name='api_scheme_pub_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='embroideryscheme',
+            index=models.Index(fields=['visibility', '-created_at', '-id'], name='api_scheme_vis_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='embroideryscheme',
+            index=models.Index(condition=models.Q(('visibility', 'PUB')), fields=['category', '-created_at'], name='api_scheme_pub_category_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='embroideryscheme',
+            index=models.Index(condition=models.Q(('visibility', 'PUB')), fields=['difficulty', '-created_at'], name='api_scheme_pub_difficulty_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='embroideryscheme',
+            index=models.Index(condition=models.Q(('visibility', 'PUB')), fields=['license', '-created_at'], name='api_scheme_pub_license_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='embroideryscheme',
+            index=models.Index(fields=['author', '-created_at'], name='api_scheme_author_created_idx'),
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.2.4 on 2026-10-18 07:15
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0012_scheme_query_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Job',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, verbose_name='task name')),
+                ('args', models.JSONField(blank=True, default=list, verbose_name='arguments')),
+                ('status', models.CharField(choices=[('QU', 'Queued'), ('RU', 'Running'), ('OK', 'Done'), ('ER', 'Failed')], default='QU', max_length=2, verbose_name='status')),
+                ('attempts', models.PositiveSmallIntegerField(default=0, verbose_name='attempts')),
+                ('max_attempts', models.PositiveSmallIntegerField(default=3, verbose_name='max attempts')),
+                ('run_after', models.DateTimeField(default=django.utils.timezone.now, verbose_name='run after')),
+                ('last_error', models.TextField(blank=True, verbose_name='last error')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='created at')),
+                ('started_at', models.DateTimeField(blank=True, null=True, verbose_name='started at')),
+                ('finished_at', models.DateTimeField(blank=True, null=True, verbose_name='finished at')),
+                ('scheme', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='jobs', to='api.embroideryscheme', verbose_name='embroidery scheme')),
+            ],
+            options={
+                'verbose_name': 'background job',
+                'verbose_name_plural': 'background jobs',
+                'ordering': ['run_after', 'id'],
+                'indexes': [models.Index(fields=['status', 'run_after'], name='api_job_status_run_after_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 5.2.4 on 2026-10-18 07:18
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0013_background_jobs'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='embroideryscheme',
+            name='popularity_score',
+            field=models.FloatField(default=0, editable=False, verbose_name='popularity score'),
+        ),
+        migrations.AddField(
+            model_name='embroideryscheme',
+            name='scores_updated_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True, verbose_name='scores updated at'),
+        ),
+        migrations.AddField(
+            model_name='embroideryscheme',
+            name='trending_score',
+            field=models.FloatField(default=0, editable=False, verbose_name='trending score'),
+        ),
+        migrations.AddIndex(
+            model_name='embroideryscheme',
+            index=models.Index(fields=['visibility', '-trending_score', '-id'], name='api_scheme_vis_trending_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='embroideryscheme',
+            index=models.Index(fields=['visibility', '-popularity_score', '-id'], name='api_scheme_vis_popular_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='embroideryscheme',
+            index=models.Index(fields=['visibility', '-downloads_count', '-id'], name='api_scheme_vis_downloads_idx'),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.4 on 2026-10-18 07:21
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0014_scheme_scores'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SimilarScheme',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('score', models.FloatField(verbose_name='similarity')),
+                ('scheme', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='similar', to='api.embroideryscheme', verbose_name='embroidery scheme')),
+                ('similar', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='similar_to', to='api.embroideryscheme', verbose_name='similar scheme')),
+            ],
+            options={
+                'verbose_name': 'similar scheme',
+                'verbose_name_plural': 'similar schemes',
+                'indexes': [models.Index(fields=['scheme', '-score'], name='api_similar_scheme_score_idx')],
+                'constraints': [models.UniqueConstraint(fields=('scheme', 'similar'), name='api_similar_scheme_unique')],
+            },
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.4 on 2026-10-18 07:26
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0015_similar_schemes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Recommendation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('score', models.FloatField(verbose_name='score')),
+                ('built_at', models.DateTimeField(verbose_name='built at')),
+                ('scheme', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='recommended_to', to='api.embroideryscheme', verbose_name='embroidery scheme')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='recommendations', to=settings.AUTH_USER_MODEL, verbose_name='user')),
+            ],
+            options={
+                'verbose_name': 'recommendation',
+                'verbose_name_plural': 'recommendations',
+                'indexes': [models.Index(fields=['user', '-score', '-scheme'], name='api_recommendation_score_idx'), models.Index(fields=['built_at'], name='api_recommendation_built_idx')],
+                'constraints': [models.UniqueConstraint(fields=('user', 'scheme'), name='api_recommendation_unique')],
+            },
+        ),
+    ]
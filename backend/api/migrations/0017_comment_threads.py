@@ -0,0 +1,39 @@
+# Generated by Django 5.2.4 on 2026-10-18 07:31
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import CharField, Value
+from django.db.models.functions import Cast, LPad
+
+
+def fill_paths(apps, schema_editor):
+    # Все существующие комментарии — корневые: путь из одного id
+    Comment = apps.get_model('api', 'Comment')
+    Comment.objects.update(path=LPad(Cast('id', output_field=CharField()), 10, Value('0')))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0016_user_recommendations'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='comment',
+            name='parent',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='replies', to='api.comment', verbose_name='parent comment'),
+        ),
+        migrations.AddField(
+            model_name='comment',
+            name='path',
+            field=models.CharField(default='', editable=False, max_length=121, verbose_name='path'),
+        ),
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['scheme', 'path'], name='api_comment_scheme_path_idx'),
+        ),
+        migrations.RunPython(fill_paths, migrations.RunPython.noop),
+    ]
@@ -1,7 +1,13 @@
+import uuid
+
 from django.db import models
+from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 from django.conf import settings
-from django.db.models import Sum
+from django.db.models import (
+    F, Sum, Count, Exists, OuterRef, Prefetch, Subquery, Value, BooleanField, IntegerField
+)
+from django.db.models.functions import Coalesce, Concat, Greatest
 
 
 class License(models.Model):
@@ -44,6 +50,17 @@ class Tag(models.Model):
         unique=True,
         help_text=_('A short label for URLs, generally a hyphenated version of the name.')
     )
+    # Имя для сравнения без учета регистра и лишних пробелов (см. api/tags.py)
+    normalized_name = models.CharField(_('normalized name'), max_length=100, unique=True, editable=False)
+
+    def save(self, *args, **kwargs):
+        from .tags import normalize_tag_name
+
+        self.normalized_name = normalize_tag_name(self.name)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'name' in update_fields:
+            kwargs['update_fields'] = {*update_fields, 'normalized_name'}
+        super().save(*args, **kwargs)
 
     def __str__(self):
         return self.name
@@ -54,6 +71,85 @@ class Tag(models.Model):
         ordering = ['name']
 
 
+class EmbroiderySchemeQuerySet(models.QuerySet):
+    def with_list_stats(self, user=None):
+        """
+        Добавляет к выборке флаги is_liked/is_favorited для текущего пользователя.
+        Счетчики лайков, избранного, комментариев и скачиваний хранятся в самих
+        колонках схемы, поэтому сериализаторам не нужно ходить в базу для каждой строки.
+        """
+        if user is not None and user.is_authenticated:
+            favorites_through = EmbroideryScheme.favorited_by.through
+            return self.annotate(
+                is_liked=Exists(Like.objects.filter(scheme=OuterRef('pk'), user=user)),
+                is_favorited=Exists(
+                    favorites_through.objects.filter(embroideryscheme=OuterRef('pk'), user=user)
+                ),
+            )
+        return self.annotate(
+            is_liked=Value(False, output_field=BooleanField()),
+            is_favorited=Value(False, output_field=BooleanField()),
+        )
+
+    def summary(self, **extra):
+        """
+        Сводка по выборке одним агрегатом: количество схем и суммы счетчиков
+        (статистика профиля автора). extra — дополнительные агрегаты.
+        """
+        return self.order_by().aggregate(
+            schemes_count=Count('pk'),
+            likes_count=Coalesce(Sum('likes_count'), 0),
+            favorites_count=Coalesce(Sum('favorites_count'), 0),
+            downloads_count=Coalesce(Sum('downloads_count'), 0),
+            **extra
+        )
+
+    def with_processing(self):
+        """Предзагружает незавершенные фоновые задачи схемы (поле processing детальной страницы)."""
+        return self.prefetch_related(Prefetch(
+            'jobs',
+            queryset=Job.objects.exclude(status=Job.Status.DONE).only('id', 'scheme_id', 'status'),
+            to_attr='unfinished_jobs'
+        ))
+
+    def adjust_counters(self, **deltas):
+        """
+        Атомарно изменяет денормализованные счетчики одним UPDATE через F()-выражения.
+        Пример: EmbroideryScheme.objects.filter(pk=pk).adjust_counters(likes_count=1)
+        """
+        updates = {}
+        for field_name, delta in deltas.items():
+            if delta >= 0:
+                updates[field_name] = F(field_name) + delta
+            else:
+                # Не даем счетчику уйти в минус, если он успел разойтись с реальностью
+                updates[field_name] = Greatest(F(field_name) + delta, Value(0))
+        return self.update(**updates)
+
+    def recount_stats(self):
+        """Пересчитывает все счетчики по исходным таблицам одним UPDATE."""
+        favorites_through = EmbroideryScheme.favorited_by.through
+
+        def count_of(queryset, group_by):
+            return Coalesce(Subquery(
+                queryset.order_by().values(group_by).annotate(total=Count('pk')).values('total'),
+                output_field=IntegerField()
+            ), 0)
+
+        downloads_count = SchemeFile.objects.filter(scheme=OuterRef('pk')).order_by().values('scheme').annotate(
+            total=Sum('downloads_count')
+        ).values('total')
+
+        return self.update(
+            likes_count=count_of(Like.objects.filter(scheme=OuterRef('pk')), 'scheme'),
+            favorites_count=count_of(
+                favorites_through.objects.filter(embroideryscheme=OuterRef('pk')), 'embroideryscheme'
+            ),
+            comments_count=count_of(Comment.objects.filter(scheme=OuterRef('pk')), 'scheme'),
+            downloads_count=Coalesce(Subquery(downloads_count, output_field=IntegerField()), 0),
+        )
+
+
 class EmbroideryScheme(models.Model):
     class Difficulty(models.TextChoices):
         EASY = 'EA', _('Easy')
@@ -88,6 +184,8 @@ class EmbroideryScheme(models.Model):
         upload_to='schemes/main_images/%Y/%m/%d/',
         null=True, blank=True  # Может быть добавлено позже
     )
+    # Уменьшенные копии главного изображения (см. api/images.py)
+    main_image_variants = models.JSONField(_('main image variants'), default=dict, blank=True, editable=False)
 
     category = models.ForeignKey(
         Category,
@@ -138,17 +236,34 @@ class EmbroideryScheme(models.Model):
 
     views_count = models.PositiveIntegerField(_('views count'), default=0, editable=False)
 
-    # downloads_count = models.PositiveIntegerField(_('downloads count'), default=0, editable=False) # Добавим, когда будут файлы
+    # Денормализованные счетчики. Обновляются атомарно в действиях API
+    # (см. EmbroiderySchemeQuerySet.adjust_counters), расхождения чинит
+    # команда recount_scheme_stats.
+    likes_count = models.PositiveIntegerField(_('likes count'), default=0, editable=False)
+    favorites_count = models.PositiveIntegerField(_('favorites count'), default=0, editable=False)
+    comments_count = models.PositiveIntegerField(_('comments count'), default=0, editable=False)
+    downloads_count = models.PositiveIntegerField(_('downloads count'), default=0, editable=False)
+
+    # Оценки для сортировки каталога, пересчитываются командой update_scheme_scores (api/ranking.py)
+    popularity_score = models.FloatField(_('popularity score'), default=0, editable=False)
+    trending_score = models.FloatField(_('trending score'), default=0, editable=False)
+    scores_updated_at = models.DateTimeField(_('scores updated at'), null=True, blank=True, editable=False)
 
     # slug = models.SlugField(_('slug'), max_length=250, unique=True, blank=True) # Если нужен уникальный слаг для схемы
 
+    objects = EmbroiderySchemeQuerySet.as_manager()
+
     @property
     def total_downloads_count(self):
         """Возвращает сумму скачиваний всех файлов, связанных с этой схемой."""
-        # Мы используем aggregate для эффективного подсчета на уровне БД.
-        # Если файлов нет, вернется None, поэтому мы обрабатываем этот случай.
-        result = self.files.aggregate(total=Sum('downloads_count'))
-        return result['total'] or 0
+        # Сумма хранится в денормализованной колонке downloads_count.
+        return self.downloads_count
+
+    def is_visible_to(self, user):
+        """Приватная схема доступна только автору; публичная и по ссылке — всем."""
+        if self.visibility != self.Visibility.PRIVATE:
+            return True
+        return user is not None and user.is_authenticated and user.pk == self.author_id
 
     def __str__(self):
         return self.title
@@ -162,6 +277,41 @@ class EmbroideryScheme(models.Model):
         verbose_name = _('embroidery scheme')
         verbose_name_plural = _('embroidery schemes')
         ordering = ['-created_at']  # По умолчанию сортируем по дате создания (новые сверху)
+        indexes = [
+            # Для курсорной пагинации по (-created_at, -id)
+            models.Index(fields=['-created_at', '-id'], name='api_scheme_created_id_idx'),
+            # Каталог: только публичные схемы, новые сверху. Частичный индекс меньше
+            # полного и сразу отдает строки в нужном порядке без сортировки
+            models.Index(
+                fields=['-created_at', '-id'],
+                condition=models.Q(visibility='PUB'),
+                name='api_scheme_pub_created_idx'
+            ),
+            models.Index(fields=['visibility', '-created_at', '-id'], name='api_scheme_vis_created_idx'),
+            # Фильтры каталога (api/filters.py) в сочетании с сортировкой по дате
+            models.Index(
+                fields=['category', '-created_at'],
+                condition=models.Q(visibility='PUB'),
+                name='api_scheme_pub_category_idx'
+            ),
+            models.Index(
+                fields=['difficulty', '-created_at'],
+                condition=models.Q(visibility='PUB'),
+                name='api_scheme_pub_difficulty_idx'
+            ),
+            models.Index(
+                fields=['license', '-created_at'],
+                condition=models.Q(visibility='PUB'),
+                name='api_scheme_pub_license_idx'
+            ),
+            # Сортировки каталога ?ordering=trending|popular|most_downloaded (api/ranking.py):
+            # равенство по visibility, дальше строки уже идут в нужном порядке
+            models.Index(fields=['visibility', '-trending_score', '-id'], name='api_scheme_vis_trending_idx'),
+            models.Index(fields=['visibility', '-popularity_score', '-id'], name='api_scheme_vis_popular_idx'),
+            models.Index(fields=['visibility', '-downloads_count', '-id'], name='api_scheme_vis_downloads_idx'),
+            # "Мои схемы" (action my): все схемы автора, новые сверху
+            models.Index(fields=['author', '-created_at'], name='api_scheme_author_created_idx'),
+        ]
 
 
 class Like(models.Model):
@@ -240,6 +390,7 @@ class SchemeImage(models.Model):
         _('image'),
         upload_to='schemes/gallery/%Y/%m/%d/'
     )
+    variants = models.JSONField(_('image variants'), default=dict, blank=True, editable=False)
     caption = models.CharField(_('caption'), max_length=255, blank=True)
     uploaded_at = models.DateTimeField(_('uploaded at'), auto_now_add=True)
 
@@ -252,8 +403,40 @@ class SchemeImage(models.Model):
         ordering = ['-uploaded_at']
 
 
+class CommentQuerySet(models.QuerySet):
+    def roots(self):
+        return self.filter(parent__isnull=True)
+
+    def descendants_of(self, comment):
+        """
+        Все ответы в ветке комментария в порядке дерева — один запрос по индексу (scheme, path):
+        пути потомков лежат строго между 'путь.' и 'путь/' ('/' следует за '.' в ASCII).
+        """
+        return self.filter(
+            scheme_id=comment.scheme_id, path__gt=f'{comment.path}.', path__lt=f'{comment.path}/'
+        ).order_by('path')
+
+    def with_replies_count(self):
+        """Количество ответов во всей ветке каждого комментария — подзапросом по тому же индексу."""
+        descendants = Comment.objects.filter(
+            scheme_id=OuterRef('scheme_id'),
+            path__gt=Concat(OuterRef('path'), Value('.')),
+            path__lt=Concat(OuterRef('path'), Value('/')),
+        ).order_by().values('scheme_id').annotate(total=Count('pk')).values('total')
+        return self.annotate(replies_count=Coalesce(Subquery(descendants, output_field=IntegerField()), 0))
+
+
 class Comment(models.Model):
-    """Модель для комментариев к схемам."""
+    """
+    Модель для комментариев к схемам.
+
+    Ответы образуют дерево: parent — комментарий, на который отвечают, path — материализованный
+    путь из id предков и самого комментария ('0000000007.0000000012'). Сортировка по path
+    дает ветку в порядке обхода дерева, а вся ветка выбирается одним диапазоном по индексу.
+    """
+    PATH_STEP = 10  # цифр на id в path
+    MAX_DEPTH = 10  # уровней вложенности ответов; path помещается в max_length
+
     scheme = models.ForeignKey(
         EmbroideryScheme,
         on_delete=models.CASCADE,
@@ -266,14 +449,196 @@ class Comment(models.Model):
         related_name='comments',
         verbose_name=_('author')
     )
+    parent = models.ForeignKey(
+        'self',
+        on_delete=models.CASCADE,
+        related_name='replies',
+        null=True,
+        blank=True,
+        verbose_name=_('parent comment')
+    )
+    path = models.CharField(_('path'), max_length=(PATH_STEP + 1) * (MAX_DEPTH + 1), default='', editable=False)
     text = models.TextField(_('text'))
     created_at = models.DateTimeField(_('created at'), auto_now_add=True)
     updated_at = models.DateTimeField(_('updated at'), auto_now=True)
 
+    objects = CommentQuerySet.as_manager()
+
     def __str__(self):
         return f'Comment by {self.author} on {self.scheme}'
 
+    @property
+    def depth(self):
+        return self.path.count('.')
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        if not self.path:
+            # id известен только после INSERT; parent уже загружен сериализатором
+            segment = f'{self.pk:0{self.PATH_STEP}d}'
+            self.path = f'{self.parent.path}.{segment}' if self.parent_id else segment
+            Comment.objects.filter(pk=self.pk).update(path=self.path)
+
     class Meta:
         verbose_name = _('comment')
         verbose_name_plural = _('comments')
-        ordering = ['created_at'] # Старые комментарии сверху
\ No newline at end of file
+        ordering = ['created_at'] # Старые комментарии сверху
+        indexes = [
+            # Комментарии всегда выбираются по схеме и листаются по (created_at, id)
+            models.Index(fields=['scheme', 'created_at', 'id'], name='api_comment_scheme_created_idx'),
+            # Ветка ответов — диапазон путей внутри схемы
+            models.Index(fields=['scheme', 'path'], name='api_comment_scheme_path_idx'),
+        ]
+
+
+class ChunkedUpload(models.Model):
+    """
+    Загрузка большого файла по частям (см. api/uploads.py).
+    Части пишутся во временный файл в MEDIA_ROOT, после проверки контрольной суммы
+    файл прикрепляется к SchemeFile или SchemeImage без повторной передачи.
+    """
+    class Status(models.TextChoices):
+        UPLOADING = 'UP', _('Uploading')
+        COMPLETE = 'OK', _('Complete')
+        ATTACHED = 'AT', _('Attached')
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='chunked_uploads',
+        verbose_name=_('user')
+    )
+    filename = models.CharField(_('file name'), max_length=255)
+    size = models.PositiveBigIntegerField(_('size in bytes'))
+    offset = models.PositiveBigIntegerField(_('bytes received'), default=0)
+    checksum = models.CharField(_('SHA-256 checksum'), max_length=64, blank=True)
+    status = models.CharField(
+        _('status'),
+        max_length=2,
+        choices=Status.choices,
+        default=Status.UPLOADING
+    )
+    created_at = models.DateTimeField(_('created at'), auto_now_add=True)
+    completed_at = models.DateTimeField(_('completed at'), null=True, blank=True)
+
+    def __str__(self):
+        return f'Upload {self.filename} ({self.offset}/{self.size})'
+
+    class Meta:
+        verbose_name = _('chunked upload')
+        verbose_name_plural = _('chunked uploads')
+        ordering = ['-created_at']
+
+
+class SimilarScheme(models.Model):
+    """Заранее посчитанный сосед схемы для /schemes/{id}/similar/ (см. api/similarity.py)."""
+    scheme = models.ForeignKey(
+        EmbroideryScheme,
+        on_delete=models.CASCADE,
+        related_name='similar',
+        verbose_name=_('embroidery scheme')
+    )
+    similar = models.ForeignKey(
+        EmbroideryScheme,
+        on_delete=models.CASCADE,
+        related_name='similar_to',
+        verbose_name=_('similar scheme')
+    )
+    score = models.FloatField(_('similarity'))
+
+    def __str__(self):
+        return f'{self.scheme_id} ~ {self.similar_id} ({self.score:.3f})'
+
+    class Meta:
+        verbose_name = _('similar scheme')
+        verbose_name_plural = _('similar schemes')
+        constraints = [
+            models.UniqueConstraint(fields=['scheme', 'similar'], name='api_similar_scheme_unique'),
+        ]
+        indexes = [
+            # Соседи схемы сразу в порядке убывания сходства
+            models.Index(fields=['scheme', '-score'], name='api_similar_scheme_score_idx'),
+        ]
+
+
+class Job(models.Model):
+    """
+    Фоновая задача (см. api/jobs.py): имя зарегистрированной функции и ее аргументы.
+    Очередь — сама таблица: воркер забирает задачи со статусом QUEUED и наступившим run_after.
+    """
+    class Status(models.TextChoices):
+        QUEUED = 'QU', _('Queued')
+        RUNNING = 'RU', _('Running')
+        DONE = 'OK', _('Done')
+        FAILED = 'ER', _('Failed')
+
+    name = models.CharField(_('task name'), max_length=100)
+    args = models.JSONField(_('arguments'), default=list, blank=True)
+    scheme = models.ForeignKey(
+        EmbroideryScheme,
+        on_delete=models.CASCADE,
+        related_name='jobs',
+        null=True,
+        blank=True,
+        verbose_name=_('embroidery scheme')
+    )
+    status = models.CharField(
+        _('status'),
+        max_length=2,
+        choices=Status.choices,
+        default=Status.QUEUED
+    )
+    attempts = models.PositiveSmallIntegerField(_('attempts'), default=0)
+    max_attempts = models.PositiveSmallIntegerField(_('max attempts'), default=3)
+    run_after = models.DateTimeField(_('run after'), default=timezone.now)
+    last_error = models.TextField(_('last error'), blank=True)
+    created_at = models.DateTimeField(_('created at'), auto_now_add=True)
+    started_at = models.DateTimeField(_('started at'), null=True, blank=True)
+    finished_at = models.DateTimeField(_('finished at'), null=True, blank=True)
+
+    def __str__(self):
+        return f'{self.name}{tuple(self.args)} [{self.get_status_display()}]'
+
+    class Meta:
+        verbose_name = _('background job')
+        verbose_name_plural = _('background jobs')
+        ordering = ['run_after', 'id']
+        indexes = [
+            # Выборка воркера: WHERE status='QU' AND run_after <= now ORDER BY run_after
+            models.Index(fields=['status', 'run_after'], name='api_job_status_run_after_idx'),
+        ]
+
+
+class Recommendation(models.Model):
+    """Схема в персональной ленте пользователя (/users/me/feed/, см. api/feed.py)."""
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='recommendations',
+        verbose_name=_('user')
+    )
+    scheme = models.ForeignKey(
+        EmbroideryScheme,
+        on_delete=models.CASCADE,
+        related_name='recommended_to',
+        verbose_name=_('embroidery scheme')
+    )
+    score = models.FloatField(_('score'))
+    # Время запуска пересчета, записавшего строку: строки прошлых запусков удаляются в конце
+    built_at = models.DateTimeField(_('built at'))
+
+    def __str__(self):
+        return f'{self.user_id} -> {self.scheme_id} ({self.score:.3f})'
+
+    class Meta:
+        verbose_name = _('recommendation')
+        verbose_name_plural = _('recommendations')
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'scheme'], name='api_recommendation_unique'),
+        ]
+        indexes = [
+            # Лента пользователя сразу в порядке убывания оценки (курсорная пагинация)
+            models.Index(fields=['user', '-score', '-scheme'], name='api_recommendation_score_idx'),
+            models.Index(fields=['built_at'], name='api_recommendation_built_idx'),
+        ]
@@ -0,0 +1,310 @@
+# backend/api/pagination.py
+import json
+from base64 import b64decode, b64encode
+
+from asgiref.sync import sync_to_async
+from django.core.paginator import InvalidPage, Page
+from django.db import connections
+from django.db.models import Q
+from django.utils.translation import gettext_lazy as _
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+def estimate_count(queryset):
+    """
+    Возвращает примерное количество строк без COUNT(*).
+    На PostgreSQL берем оценку планировщика из EXPLAIN, на остальных базах
+    дешевой оценки нет, поэтому возвращаем None.
+    """
+    connection = connections[queryset.db]
+    if connection.vendor != 'postgresql':
+        return None
+    sql, params = queryset.query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+        plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return plan[0]['Plan']['Plan Rows']
+
+
+async def afetch(queryset, chunk_size):
+    """Строки выборки через асинхронный ORM (с chunk_size работает и prefetch_related)."""
+    return [row async for row in queryset.aiterator(chunk_size=chunk_size)]
+
+
+class CountOptionalPageNumberPagination(PageNumberPagination):
+    """
+    Обычная постраничная пагинация, но с параметром `?count=exact|estimate|none`.
+    Для `estimate` и `none` не выполняется COUNT(*): берем на одну строку больше,
+    чтобы понять, есть ли следующая страница.
+    """
+    count_query_param = 'count'
+    count_modes = ('exact', 'estimate', 'none')
+
+    def get_count_mode(self, request):
+        count_mode = request.query_params.get(self.count_query_param, 'exact')
+        return count_mode if count_mode in self.count_modes else 'exact'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.count_mode = self.get_count_mode(request)
+        if self.count_mode == 'exact':
+            return super().paginate_queryset(queryset, request, view)
+        page_queryset = self.get_page_queryset(queryset, request)
+        if page_queryset is None:
+            return None
+        count = estimate_count(queryset) if self.count_mode == 'estimate' else None
+        return self.set_page(list(page_queryset), count)
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        """То же, что paginate_queryset(), но COUNT(*) и строки читаются асинхронным ORM."""
+        self.count_mode = self.get_count_mode(request)
+        if self.count_mode == 'exact':
+            return await self.apaginate_exact(queryset, request)
+        page_queryset = self.get_page_queryset(queryset, request)
+        if page_queryset is None:
+            return None
+        rows = await afetch(page_queryset, self.page_limit + 1)
+        count = await sync_to_async(estimate_count)(queryset) if self.count_mode == 'estimate' else None
+        return self.set_page(rows, count)
+
+    async def apaginate_exact(self, queryset, request):
+        # Страница Django строится из готовых строк: ссылки и count считаются так же, как в DRF
+        page_size = self.get_page_size(request)
+        if not page_size:
+            return None
+        self.request = request
+        paginator = self.django_paginator_class(queryset, page_size)
+        paginator.count = await queryset.acount()
+        page_number = self.get_page_number(request, paginator)
+        try:
+            number = paginator.validate_number(page_number)
+        except InvalidPage as exc:
+            raise NotFound(self.invalid_page_message.format(page_number=page_number, message=str(exc)))
+        offset = (number - 1) * page_size
+        rows = await afetch(queryset[offset:offset + page_size], page_size)
+        self.page = Page(rows, number, paginator)
+        if paginator.num_pages > 1 and self.template is not None:
+            self.display_page_controls = True
+        return rows
+
+    def get_page_queryset(self, queryset, request):
+        """Выборка страницы на одну строку больше, чтобы понять, есть ли следующая (без COUNT(*))."""
+        page_size = self.get_page_size(request)
+        if not page_size:
+            return None
+
+        self.request = request
+        self.page_limit = page_size
+        try:
+            self.page_number = int(request.query_params.get(self.page_query_param, 1))
+            if self.page_number < 1:
+                raise ValueError
+        except ValueError:
+            raise NotFound(self.invalid_page_message)
+
+        offset = (self.page_number - 1) * page_size
+        return queryset[offset:offset + page_size + 1]
+
+    def set_page(self, rows, count):
+        self.has_next = len(rows) > self.page_limit
+        self.count = count
+        return rows[:self.page_limit]
+
+    def get_next_link(self):
+        if self.count_mode == 'exact':
+            return super().get_next_link()
+        if not self.has_next:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.page_query_param, self.page_number + 1)
+
+    def get_previous_link(self):
+        if self.count_mode == 'exact':
+            return super().get_previous_link()
+        if self.page_number <= 1:
+            return None
+        url = self.request.build_absolute_uri()
+        if self.page_number == 2:
+            return remove_query_param(url, self.page_query_param)
+        return replace_query_param(url, self.page_query_param, self.page_number - 1)
+
+    def get_paginated_response(self, data):
+        if self.count_mode == 'exact':
+            return super().get_paginated_response(data)
+        return Response({
+            'count': self.count,
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        })
+
+
+class KeysetCursorPagination(BasePagination):
+    """
+    Курсорная (keyset) пагинация без OFFSET и COUNT(*). Порядок берется из атрибута
+    `cursor_ordering` представления (или из `ordering`), последним полем должен идти
+    уникальный ключ (обычно -id).
+
+    Курсор хранит значения всех полей порядка у последней строки страницы, а следующая
+    страница выбирается сравнением кортежей: для ('-trending_score', '-id')
+
+        trending_score < X OR (trending_score = X AND id < Y)
+
+    Поэтому строки не пропускаются и не повторяются, даже если значения неуникальны
+    и меняются между запросами: изменившаяся строка просто окажется там, куда переехала.
+    Поля порядка — поля модели или аннотации без NULL.
+    """
+    cursor_query_param = 'cursor'
+    page_size = api_settings.PAGE_SIZE
+    ordering = ('-created_at', '-id')
+    invalid_cursor_message = _('Invalid cursor')
+    display_page_controls = False
+
+    def get_ordering(self, request, queryset, view):
+        return tuple(getattr(view, 'cursor_ordering', self.ordering))
+
+    def paginate_queryset(self, queryset, request, view=None):
+        page_queryset = self.get_page_queryset(queryset, request, view)
+        if page_queryset is None:
+            return None
+        return self.set_page(list(page_queryset))
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        """То же, что paginate_queryset(), но строки читаются асинхронным ORM."""
+        page_queryset = self.get_page_queryset(queryset, request, view)
+        if page_queryset is None:
+            return None
+        return self.set_page(await afetch(page_queryset, self.page_size + 1))
+
+    def get_page_queryset(self, queryset, request, view=None):
+        """Выборка страницы (на одну строку больше) после курсора из запроса."""
+        if not self.page_size:
+            return None
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(request, queryset, view)
+        self.cursor = self.decode_cursor(request)
+        # Назад — та же выборка в обратном порядке, страница затем разворачивается
+        self.backwards = bool(self.cursor and self.cursor['reverse'])
+        ordering = tuple(invert(field) for field in self.ordering) if self.backwards else self.ordering
+        queryset = queryset.order_by(*ordering)
+        if self.cursor:
+            queryset = queryset.filter(keyset_filter(ordering, self.cursor['position']))
+        return queryset[:self.page_size + 1]
+
+    def set_page(self, rows):
+        has_more = len(rows) > self.page_size
+        self.page = rows[:self.page_size]
+        if self.backwards:
+            self.page.reverse()
+            self.has_next, self.has_previous = True, has_more
+        else:
+            self.has_next, self.has_previous = has_more, self.cursor is not None
+        return self.page
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if encoded is None:
+            return None
+        try:
+            cursor = json.loads(b64decode(encoded.encode('ascii')).decode('utf-8'))
+            if len(cursor['position']) != len(self.ordering):
+                raise ValueError
+            cursor['reverse'] = bool(cursor.get('reverse'))
+        except (TypeError, KeyError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+        return cursor
+
+    def encode_cursor(self, row, reverse):
+        position = [getattr(row, field.lstrip('-')) for field in self.ordering]
+        # str() сохраняет даты с микросекундами, иначе равенство в keyset_filter не сработает
+        data = json.dumps({'position': position, 'reverse': reverse}, default=str)
+        return replace_query_param(self.base_url, self.cursor_query_param, b64encode(data.encode('utf-8')).decode('ascii'))
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor(self.page[-1], reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous or not self.page:
+            return None
+        return self.encode_cursor(self.page[0], reverse=True)
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        })
+
+
+def invert(field):
+    return field[1:] if field.startswith('-') else f'-{field}'
+
+
+def keyset_filter(ordering, position):
+    """
+    Условие "строка идет после `position` в порядке `ordering`":
+    (a, b, c) > (x, y, z)  ->  a > x OR (a = x AND (b > y OR (b = y AND c > z))).
+    """
+    condition = None
+    for field, value in reversed(list(zip(ordering, position))):
+        name = field.lstrip('-')
+        after = Q(**{f'{name}__lt' if field.startswith('-') else f'{name}__gt': value})
+        condition = after if condition is None else after | (Q(**{name: value}) & condition)
+    return condition
+
+
+class OptInCursorPagination(BasePagination):
+    """
+    По умолчанию ведет себя как CountOptionalPageNumberPagination, а при `?pagination=cursor`
+    (или если в запросе уже есть `cursor`) переключается на KeysetCursorPagination.
+    Бесконечной прокрутке на фронтенде точное количество не нужно, поэтому курсорный режим
+    total не возвращает.
+
+    Курсор листает только в порядке cursor_ordering представления (для схем — ?ordering=
+    или новые сверху), поэтому сортировка по релевантности поиска (?search=) в этом режиме
+    теряется. Каталог на фронтенде (SchemeList.jsx) включает курсор для поиска только
+    вместе с явным ?ordering=, а поиск без него листает постранично.
+    """
+    mode_query_param = 'pagination'
+
+    def __init__(self):
+        self.page_paginator = CountOptionalPageNumberPagination()
+        self.cursor_paginator = KeysetCursorPagination()
+        self.delegate = self.page_paginator
+
+    def use_cursor(self, request):
+        return (
+            request.query_params.get(self.mode_query_param) == 'cursor'
+            or self.cursor_paginator.cursor_query_param in request.query_params
+        )
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.delegate = self.cursor_paginator if self.use_cursor(request) else self.page_paginator
+        return self.delegate.paginate_queryset(queryset, request, view)
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        self.delegate = self.cursor_paginator if self.use_cursor(request) else self.page_paginator
+        return await self.delegate.apaginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        return self.delegate.get_paginated_response(data)
+
+    def get_paginated_response_schema(self, schema):
+        return self.page_paginator.get_paginated_response_schema(schema)
+
+    def get_schema_operation_parameters(self, view):
+        return self.page_paginator.get_schema_operation_parameters(view)
+
+    def to_html(self):
+        return self.delegate.to_html()
+
+    @property
+    def display_page_controls(self):
+        return self.delegate.display_page_controls
@@ -0,0 +1,99 @@
+# backend/api/ranking.py
+"""
+Рейтинги схем для сортировки каталога: ?ordering=trending|popular|newest|most_downloaded.
+
+Оценки хранятся в колонках схемы и пересчитываются периодически командой
+`python manage.py update_scheme_scores` (или с --loop), а не на каждый запрос:
+
+    popularity_score  взвешенная сумма счетчиков за все время
+                      (просмотры, лайки, избранное, скачивания, комментарии)
+    trending_score    та же взвешенная активность, но с экспоненциальным затуханием:
+                      при каждом пересчете старое значение умножается на
+                      0.5 ** (прошло часов / HALF_LIFE_HOURS) и к нему прибавляется
+                      прирост popularity_score с прошлого пересчета
+
+Так "в тренде" не требует журнала событий: хватает денормализованных счетчиков.
+Пересчет — UPDATE по диапазонам id (BATCH_SIZE строк), без чтения строк в Python.
+Каждая сортировка идет по индексу (visibility, оценка, id) без сортировки в памяти
+(см. EmbroideryScheme.Meta).
+
+Настройки (settings.SCHEME_RANKING):
+    WEIGHTS          вес каждого счетчика в оценке
+    HALF_LIFE_HOURS  период полураспада trending_score, часов
+    BATCH_SIZE       строк в одном UPDATE
+"""
+from django.conf import settings
+from django.db.models import F, Max, Value
+from django.utils import timezone
+
+from .cache import bump_version
+from .models import EmbroideryScheme
+
+DEFAULTS = {
+    'WEIGHTS': {
+        'views_count': 1,
+        'likes_count': 5,
+        'favorites_count': 8,
+        'downloads_count': 4,
+        'comments_count': 3,
+    },
+    'HALF_LIFE_HOURS': 48,
+    'BATCH_SIZE': 5000,
+}
+
+# Значение ?ordering= -> порядок строк; последний ключ (-id) делает порядок однозначным
+ORDERINGS = {
+    'newest': ('-created_at', '-id'),
+    'trending': ('-trending_score', '-id'),
+    'popular': ('-popularity_score', '-id'),
+    'most_downloaded': ('-downloads_count', '-id'),
+}
+DEFAULT_ORDERING = 'newest'
+
+
+def get_ranking_settings():
+    return {**DEFAULTS, **getattr(settings, 'SCHEME_RANKING', {})}
+
+
+def get_ordering(name):
+    return ORDERINGS.get(name) or ORDERINGS[DEFAULT_ORDERING]
+
+
+def popularity_expression(weights):
+    """Взвешенная сумма счетчиков как SQL-выражение."""
+    expression = Value(0.0)
+    for field_name, weight in weights.items():
+        expression = expression + F(field_name) * Value(float(weight))
+    return expression
+
+
+def decay_factor(last_update, now, half_life_hours):
+    if last_update is None:
+        return 1.0
+    hours = max((now - last_update).total_seconds(), 0) / 3600
+    return 0.5 ** (hours / half_life_hours)
+
+
+def update_scores(now=None):
+    """Пересчитывает оценки всех схем. Возвращает количество обновленных строк."""
+    config = get_ranking_settings()
+    now = now or timezone.now()
+    schemes = EmbroideryScheme.objects.order_by()
+    stats = schemes.aggregate(last_update=Max('scores_updated_at'), max_id=Max('pk'))
+    decay = decay_factor(stats['last_update'], now, config['HALF_LIFE_HOURS'])
+    popularity = popularity_expression(config['WEIGHTS'])
+
+    updated = 0
+    batch_size = config['BATCH_SIZE']
+    for start in range(0, stats['max_id'] or 0, batch_size):
+        # В SET все F() ссылаются на значения до обновления, поэтому
+        # popularity - F('popularity_score') — прирост с прошлого пересчета
+        updated += schemes.filter(pk__gt=start, pk__lte=start + batch_size).update(
+            trending_score=F('trending_score') * Value(decay) + popularity - F('popularity_score'),
+            popularity_score=popularity,
+            scores_updated_at=now,
+        )
+    if updated:
+        # Порядок в закэшированных списках и их ETag изменились
+        bump_version('schemes')
+    return updated
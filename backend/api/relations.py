@@ -0,0 +1,191 @@
+# backend/api/relations.py
+"""
+Отношения пользователя к схемам: какие из них он лайкнул и добавил в избранное.
+
+Множества id лайкнутых и избранных схем пользователя загружаются двумя запросами
+по индексам (user_id, scheme_id) и кэшируются в памяти процесса на короткое время:
+карточки каталога, эндпоинт /schemes/relations/ и подстановка персональных полей
+в закэшированный список берут их отсюда. Кэш сбрасывается при изменении лайков
+и избранного (set_like / set_favorite ниже, а для избранного, измененного в обход них, —
+api/signals.py); в других процессах устаревшие данные живут не дольше TIMEOUT.
+
+Изменение лайка или избранного (set_like / set_favorite) — один INSERT с игнорированием
+конфликта или один DELETE, затем сдвиг счетчика и чтение новых значений в той же транзакции.
+Повторный запрос (двойной клик) ничего не меняет и не падает на уникальном индексе.
+
+Настройки (settings.USER_RELATIONS):
+    CACHE_USERS  сколько пользователей держать в кэше (0 — не кэшировать)
+    TIMEOUT      время жизни записи, секунд
+    MAX_IDS      максимум id в одном запросе /schemes/relations/
+"""
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.db import connections, router, transaction
+from django.db.models.constants import OnConflict
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .models import EmbroideryScheme, Like
+
+USER_FIELDS = ('is_liked', 'is_favorited')
+
+DEFAULTS = {
+    'CACHE_USERS': 1000,
+    'TIMEOUT': 30,
+    'MAX_IDS': 100,
+}
+
+_user_sets = OrderedDict()
+_lock = threading.Lock()
+
+
+def get_relations_settings():
+    return {**DEFAULTS, **getattr(settings, 'USER_RELATIONS', {})}
+
+
+def load_user_sets(user_id):
+    """Два запроса: id всех лайкнутых и всех избранных схем пользователя."""
+    liked = frozenset(Like.objects.filter(user_id=user_id).values_list('scheme_id', flat=True))
+    favorited = frozenset(
+        EmbroideryScheme.favorited_by.through.objects.filter(user_id=user_id).values_list(
+            'embroideryscheme_id', flat=True
+        )
+    )
+    return liked, favorited
+
+
+def get_user_sets(user_id):
+    config = get_relations_settings()
+    if not config['CACHE_USERS']:
+        return load_user_sets(user_id)
+    now = time.monotonic()
+    with _lock:
+        entry = _user_sets.get(user_id)
+        if entry is not None and entry[0] > now:
+            _user_sets.move_to_end(user_id)
+            return entry[1]
+    sets = load_user_sets(user_id)
+    with _lock:
+        _user_sets[user_id] = (now + config['TIMEOUT'], sets)
+        _user_sets.move_to_end(user_id)
+        while len(_user_sets) > config['CACHE_USERS']:
+            _user_sets.popitem(last=False)
+    return sets
+
+
+def invalidate_user_relations(*user_ids):
+    with _lock:
+        for user_id in user_ids:
+            _user_sets.pop(user_id, None)
+
+
+def clear_user_relations():
+    with _lock:
+        _user_sets.clear()
+
+
+@receiver(setting_changed)
+def _reset_on_settings_change(setting, **kwargs):
+    if setting == 'USER_RELATIONS':
+        clear_user_relations()
+
+
+def get_user_relations(user, scheme_ids):
+    """Возвращает (liked_ids, favorited_ids) среди `scheme_ids` для пользователя."""
+    scheme_ids = set(scheme_ids)
+    if not scheme_ids or user is None or not user.is_authenticated:
+        return set(), set()
+    liked, favorited = get_user_sets(user.pk)
+    return liked & scheme_ids, favorited & scheme_ids
+
+
+def merge_user_fields(rows, user):
+    """Проставляет is_liked/is_favorited в сериализованные строки схем (на месте)."""
+    liked, favorited = get_user_relations(user, [row['id'] for row in rows])
+    for row in rows:
+        row['is_liked'] = row['id'] in liked
+        row['is_favorited'] = row['id'] in favorited
+    return rows
+
+
+def strip_user_fields(rows):
+    """Сбрасывает персональные поля, чтобы строки можно было отдавать любому пользователю."""
+    for row in rows:
+        for field in USER_FIELDS:
+            if field in row:
+                row[field] = False
+    return rows
+
+
+def omit_user_fields(rows):
+    """Удаляет персональные поля из строк (режим списка ?user_fields=0)."""
+    for row in rows:
+        for field in USER_FIELDS:
+            row.pop(field, None)
+    return rows
+
+
+def insert_ignore(model, **values):
+    """
+    INSERT одной строки с игнорированием конфликта уникальности
+    (ON CONFLICT DO NOTHING / INSERT OR IGNORE). Возвращает True, если строка добавлена.
+    """
+    using = router.db_for_write(model)
+    connection = connections[using]
+    ops = connection.ops
+    fields = [model._meta.get_field(name) for name in values]
+    sql = '%s %s (%s) VALUES (%s) %s' % (
+        ops.insert_statement(on_conflict=OnConflict.IGNORE),
+        ops.quote_name(model._meta.db_table),
+        ', '.join(ops.quote_name(field.column) for field in fields),
+        ', '.join(['%s'] * len(fields)),
+        ops.on_conflict_suffix_sql(fields, OnConflict.IGNORE, None, None),
+    )
+    params = [field.get_db_prep_save(value, connection) for field, value in zip(fields, values.values())]
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return cursor.rowcount == 1
+
+
+def _set_relation(user, scheme_id, value, insert, delete, counter):
+    from .cache import invalidate_schemes  # api.cache сам импортирует этот модуль
+
+    schemes = EmbroideryScheme.objects.filter(pk=scheme_id)
+    with transaction.atomic():
+        if value:
+            changed = insert()
+        else:
+            changed = delete() > 0
+        if changed:
+            schemes.adjust_counters(**{counter: 1 if value else -1})
+        counts = schemes.values('likes_count', 'favorites_count').get()
+    if changed:
+        invalidate_schemes(scheme_id)
+    invalidate_user_relations(user.pk)
+    return changed, counts
+
+
+def set_like(user, scheme_id, value):
+    """Ставит (value=True) или убирает лайк. Возвращает (изменилось ли что-то, счетчики схемы)."""
+    return _set_relation(
+        user, scheme_id, value,
+        insert=lambda: insert_ignore(Like, user_id=user.pk, scheme_id=scheme_id, created_at=timezone.now()),
+        # У Like нет обработчиков сигналов удаления, поэтому delete() — один DELETE без SELECT
+        delete=lambda: Like.objects.filter(user_id=user.pk, scheme_id=scheme_id).delete()[0],
+        counter='likes_count',
+    )
+
+
+def set_favorite(user, scheme_id, value):
+    """Добавляет схему в избранное или убирает из него. Возвращает то же, что set_like."""
+    through = EmbroideryScheme.favorited_by.through
+    return _set_relation(
+        user, scheme_id, value,
+        insert=lambda: insert_ignore(through, embroideryscheme_id=scheme_id, user_id=user.pk),
+        delete=lambda: through.objects.filter(user_id=user.pk, embroideryscheme_id=scheme_id).delete()[0],
+        counter='favorites_count',
+    )
@@ -0,0 +1,258 @@
+# backend/api/search.py
+"""
+Полнотекстовый поиск по схемам.
+
+Индексируются название, описание, теги, категория и имя автора. Для каждой базы
+свой бэкенд со своей служебной таблицей (создается миграцией 0008_scheme_search_index):
+
+    SQLite      — виртуальная таблица FTS5 `api_scheme_fts`, ранжирование bm25();
+    PostgreSQL  — таблица `api_scheme_search` с колонкой tsvector и GIN-индексом,
+                  ранжирование ts_rank_cd() с конфигурацией 'russian';
+    остальное   — запасной вариант на icontains без индекса.
+
+Индекс обновляется сигналами (api/signals.py), полная перестройка —
+`python manage.py rebuild_search_index`.
+"""
+import re
+
+from django.conf import settings
+from django.db import connections
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+
+# Окончания для грубого стемминга русских слов (от длинных к коротким).
+# FTS5 не умеет русскую морфологию, поэтому отрезаем окончание и ищем по префиксу:
+# "розами" -> "роз*" найдет и "роза", и "розы".
+RUSSIAN_ENDINGS = sorted((
+    'иями', 'ями', 'ами', 'ого', 'его', 'ому', 'ему', 'ыми', 'ими', 'ией', 'ий', 'ый', 'ой', 'ая', 'яя',
+    'ое', 'ее', 'ые', 'ие', 'ых', 'их', 'ов', 'ев', 'ей', 'ах', 'ях', 'ам', 'ям', 'ом', 'ем', 'ую', 'юю',
+    'а', 'я', 'ы', 'и', 'е', 'о', 'у', 'ю', 'ь', 'й',
+), key=len, reverse=True)
+MIN_STEM_LENGTH = 3
+
+WORD_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def stem(word):
+    word = word.lower()
+    for ending in RUSSIAN_ENDINGS:
+        if word.endswith(ending) and len(word) - len(ending) >= MIN_STEM_LENGTH:
+            return word[:-len(ending)]
+    return word
+
+
+def build_document(scheme):
+    """
+    Собирает текстовые поля схемы для индекса. Ожидает, что author, category
+    и tags уже загружены (select_related/prefetch_related), иначе сделает лишние запросы.
+    """
+    return {
+        'title': scheme.title,
+        'description': scheme.description,
+        'tags': ' '.join(tag.name for tag in scheme.tags.all()),
+        'category': scheme.category.name if scheme.category_id else '',
+        'author': scheme.author.username,
+    }
+
+
+class BaseSearchBackend:
+    def __init__(self, using='default'):
+        self.using = using
+
+    @property
+    def connection(self):
+        return connections[self.using]
+
+    def is_available(self):
+        return True
+
+    def search(self, queryset, query):
+        """Фильтрует queryset по запросу и сортирует по релевантности."""
+        raise NotImplementedError
+
+    def index(self, schemes):
+        """Добавляет или обновляет документы для переданных схем."""
+        raise NotImplementedError
+
+    def remove(self, scheme_ids):
+        raise NotImplementedError
+
+    def clear(self):
+        raise NotImplementedError
+
+
+class SimpleSearchBackend(BaseSearchBackend):
+    """Запасной вариант без индекса: icontains по всем полям документа."""
+
+    def search(self, queryset, query):
+        condition = Q()
+        for word in WORD_RE.findall(query):
+            condition &= (
+                Q(title__icontains=word) | Q(description__icontains=word) | Q(tags__name__icontains=word)
+                | Q(category__name__icontains=word) | Q(author__username__icontains=word)
+            )
+        return queryset.filter(condition).distinct()
+
+    def index(self, schemes):
+        pass
+
+    def remove(self, scheme_ids):
+        pass
+
+    def clear(self):
+        pass
+
+
+class SQLiteFTS5SearchBackend(BaseSearchBackend):
+    table = 'api_scheme_fts'
+    columns = ('title', 'description', 'tags', 'category', 'author')
+    # Веса колонок для bm25(): название важнее тегов, теги важнее описания
+    weights = (10.0, 1.0, 5.0, 3.0, 3.0)
+
+    def is_available(self):
+        with self.connection.cursor() as cursor:
+            cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = %s", [self.table])
+            return cursor.fetchone() is not None
+
+    def build_query(self, query):
+        terms = []
+        for word in WORD_RE.findall(query):
+            # Кавычки экранируют служебный синтаксис FTS5, звездочка — поиск по префиксу
+            terms.append('"%s"*' % stem(word).replace('"', '""'))
+        return ' '.join(terms)
+
+    def search(self, queryset, query):
+        match = self.build_query(query)
+        if not match:
+            return queryset
+        table = queryset.model._meta.db_table
+        weights = ', '.join(str(weight) for weight in self.weights)
+        rank = RawSQL(
+            f'SELECT bm25({self.table}, {weights}) FROM {self.table} '
+            f'WHERE {self.table} MATCH %s AND {self.table}.rowid = {table}.id',
+            (match,)
+        )
+        matched_ids = RawSQL(f'SELECT rowid FROM {self.table} WHERE {self.table} MATCH %s', (match,))
+        # bm25() возвращает отрицательные числа: чем меньше, тем релевантнее
+        return queryset.filter(pk__in=matched_ids).annotate(search_rank=rank).order_by('search_rank', '-created_at')
+
+    def index(self, schemes):
+        rows = []
+        for scheme in schemes:
+            document = build_document(scheme)
+            rows.append([scheme.pk] + [document[column] for column in self.columns])
+        if not rows:
+            return
+        placeholders = ', '.join(['%s'] * (len(self.columns) + 1))
+        with self.connection.cursor() as cursor:
+            cursor.executemany(f'DELETE FROM {self.table} WHERE rowid = %s', [[row[0]] for row in rows])
+            cursor.executemany(
+                f'INSERT INTO {self.table} (rowid, {", ".join(self.columns)}) VALUES ({placeholders})', rows
+            )
+
+    def remove(self, scheme_ids):
+        with self.connection.cursor() as cursor:
+            cursor.executemany(f'DELETE FROM {self.table} WHERE rowid = %s', [[pk] for pk in scheme_ids])
+
+    def clear(self):
+        with self.connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {self.table}')
+
+
+class PostgresSearchBackend(BaseSearchBackend):
+    table = 'api_scheme_search'
+    config = 'russian'
+    # Вес A — название, B — теги, C — категория и автор, D — описание
+    document_sql = (
+        "setweight(to_tsvector(%(config)s, %(title)s), 'A') || "
+        "setweight(to_tsvector(%(config)s, %(tags)s), 'B') || "
+        "setweight(to_tsvector(%(config)s, %(category)s || ' ' || %(author)s), 'C') || "
+        "setweight(to_tsvector(%(config)s, %(description)s), 'D')"
+    )
+
+    def is_available(self):
+        with self.connection.cursor() as cursor:
+            cursor.execute('SELECT to_regclass(%s) IS NOT NULL', [self.table])
+            return cursor.fetchone()[0]
+
+    def search(self, queryset, query):
+        if not query.strip():
+            return queryset
+        table = queryset.model._meta.db_table
+        rank = RawSQL(
+            f'SELECT ts_rank_cd(document, websearch_to_tsquery(%s, %s)) FROM {self.table} '
+            f'WHERE {self.table}.scheme_id = {table}.id',
+            (self.config, query)
+        )
+        matched_ids = RawSQL(
+            f'SELECT scheme_id FROM {self.table} WHERE document @@ websearch_to_tsquery(%s, %s)',
+            (self.config, query)
+        )
+        return queryset.filter(pk__in=matched_ids).annotate(search_rank=rank).order_by('-search_rank', '-created_at')
+
+    def index(self, schemes):
+        rows = []
+        for scheme in schemes:
+            rows.append({'scheme_id': scheme.pk, 'config': self.config, **build_document(scheme)})
+        if not rows:
+            return
+        with self.connection.cursor() as cursor:
+            cursor.executemany(
+                f'INSERT INTO {self.table} (scheme_id, document) VALUES (%(scheme_id)s, {self.document_sql}) '
+                f'ON CONFLICT (scheme_id) DO UPDATE SET document = EXCLUDED.document',
+                rows
+            )
+
+    def remove(self, scheme_ids):
+        with self.connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {self.table} WHERE scheme_id = ANY(%s)', [list(scheme_ids)])
+
+    def clear(self):
+        with self.connection.cursor() as cursor:
+            cursor.execute(f'TRUNCATE {self.table}')
+
+
+BACKENDS = {
+    'sqlite': SQLiteFTS5SearchBackend,
+    'postgresql': PostgresSearchBackend,
+    'simple': SimpleSearchBackend,
+}
+
+_availability = {}
+
+
+def get_search_backend(using='default'):
+    """
+    Возвращает бэкенд поиска для базы `using`.
+    settings.SCHEME_SEARCH['BACKEND'] может быть 'auto' (по типу базы) или ключом из BACKENDS.
+    Если служебная таблица не создана, используется SimpleSearchBackend.
+    """
+    name = getattr(settings, 'SCHEME_SEARCH', {}).get('BACKEND', 'auto')
+    if name == 'auto':
+        name = connections[using].vendor
+    backend_class = BACKENDS.get(name, SimpleSearchBackend)
+    backend = backend_class(using)
+
+    key = (using, backend_class)
+    if key not in _availability:
+        available = backend.is_available()
+        if not available:
+            # Не кэшируем отрицательный результат: таблица появится после migrate
+            return SimpleSearchBackend(using)
+        _availability[key] = available
+    return backend
+
+
+def index_schemes(scheme_ids, using='default'):
+    """Переиндексирует схемы с указанными id (загружая их одним запросом)."""
+    from .models import EmbroideryScheme
+
+    backend = get_search_backend(using)
+    schemes = list(
+        EmbroideryScheme.objects.using(using).filter(pk__in=list(scheme_ids))
+        .select_related('author', 'category').prefetch_related('tags')
+    )
+    backend.index(schemes)
+    missing = set(scheme_ids) - {scheme.pk for scheme in schemes}
+    if missing:
+        backend.remove(missing)
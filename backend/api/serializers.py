@@ -1,8 +1,12 @@
 # backend/api/serializers.py
 from users.serializers import UserSerializer
 from rest_framework import serializers
-from .models import License, Category, Tag, EmbroideryScheme, SchemeFile, SchemeImage, Comment, Like
-from django.utils.text import slugify
+from .models import License, Category, Tag, EmbroideryScheme, SchemeFile, SchemeImage, Comment, Like, ChunkedUpload, Job
+from django.db import transaction
+from .images import variant_urls
+from .jobs import enqueue_many, processing_state
+from .uploads import attach_to_scheme, clean_filename, get_upload_settings, validate_image_upload
+from .tags import resolve_tags, split_tag_names
 
 
 class LicenseSerializer(serializers.ModelSerializer):
@@ -24,9 +28,14 @@ class TagSerializer(serializers.ModelSerializer):
 
 
 class SchemeImageSerializer(serializers.ModelSerializer):
+    image_variants = serializers.SerializerMethodField()
+
     class Meta:
         model = SchemeImage
-        fields = ('id', 'image', 'caption')
+        fields = ('id', 'image', 'image_variants', 'caption')
+
+    def get_image_variants(self, obj):
+        return variant_urls(obj.variants, self.context.get('request'))
 
 
 # --- СЕРИАЛИЗАТОРЫ ДЛЯ ЧТЕНИЯ ДАННЫХ ---
@@ -37,38 +46,40 @@ class EmbroiderySchemeListSerializer(serializers.ModelSerializer):
     category = serializers.StringRelatedField()
     tags = serializers.StringRelatedField(many=True)
     is_favorited = serializers.SerializerMethodField()
-    favorites_count = serializers.SerializerMethodField()
     is_liked = serializers.SerializerMethodField()
-    likes_count = serializers.SerializerMethodField()
+    main_image_thumbnails = serializers.SerializerMethodField()
 
     class Meta:
         model = EmbroideryScheme
         fields = (
-            'id', 'title', 'main_image', 'author', 'category', 'tags',
+            'id', 'title', 'main_image', 'main_image_thumbnails', 'author', 'category', 'tags',
             'difficulty', 'views_count', 'total_downloads_count',
-            'created_at', 'is_favorited', 'favorites_count', 'is_liked', 'likes_count'
+            'created_at', 'is_favorited', 'favorites_count', 'is_liked', 'likes_count',
+            'comments_count'
         )
 
     def get_is_favorited(self, obj):
         """Проверяет, добавлена ли схема в избранное у текущего пользователя."""
+        # Значение уже посчитано в EmbroiderySchemeQuerySet.with_list_stats()
+        if hasattr(obj, 'is_favorited'):
+            return obj.is_favorited
         user = self.context.get('request').user
         if user and user.is_authenticated:
             return obj.favorited_by.filter(id=user.id).exists()
         return False
 
-    def get_favorites_count(self, obj):
-        """Возвращает количество пользователей, добавивших схему в избранное."""
-        return obj.favorited_by.count()
+    def get_main_image_thumbnails(self, obj):
+        """URL уменьшенных копий главного изображения: {'card': {'webp': ..., 'jpeg': ...}, ...}."""
+        return variant_urls(obj.main_image_variants, self.context.get('request'))
 
     def get_is_liked(self, obj):
+        if hasattr(obj, 'is_liked'):
+            return obj.is_liked
         user = self.context.get('request').user
         if user and user.is_authenticated:
             return Like.objects.filter(scheme=obj, user=user).exists()
         return False
 
-    def get_likes_count(self, obj):
-        return obj.likes.count()
-
 
 class SchemeFileSerializer(serializers.ModelSerializer):
     file_url = serializers.FileField(source='file')
@@ -90,13 +101,22 @@ class EmbroiderySchemeDetailSerializer(EmbroiderySchemeListSerializer):
     # Добавляем поля, которых нет в списочном сериализаторе
     files = SchemeFileSerializer(many=True, read_only=True)
     images = SchemeImageSerializer(many=True, read_only=True)
+    # Состояние фоновой обработки загруженных файлов (api/jobs.py)
+    processing = serializers.SerializerMethodField()
 
     class Meta:
         model = EmbroideryScheme
         # Берем все поля из родителя и добавляем новые
         fields = EmbroiderySchemeListSerializer.Meta.fields + (
-            'description', 'license', 'visibility', 'files', 'images'
+            'description', 'license', 'visibility', 'files', 'images', 'processing'
         )
+
+    def get_processing(self, obj):
+        # Обычно задачи предзагружены через with_processing(), иначе — один запрос
+        jobs = getattr(obj, 'unfinished_jobs', None)
+        if jobs is None:
+            jobs = obj.jobs.exclude(status=Job.Status.DONE).only('status')
+        return processing_state(jobs)
     # Методы get_is_favorited, get_is_liked и др. не нужны, они уже есть в родительском классе
 
 
@@ -114,51 +134,91 @@ class EmbroiderySchemeCreateSerializer(serializers.ModelSerializer):
 
     tags_str = serializers.CharField(write_only=True, required=False, allow_blank=True, label="Теги (через запятую)")
     main_image = serializers.ImageField(write_only=True, required=True)
-    file_scheme = serializers.FileField(write_only=True, required=True, label="Файл схемы")
+    file_scheme = serializers.FileField(write_only=True, required=False, label="Файл схемы")
 
     gallery_images = serializers.ListField(
         child=serializers.ImageField(), write_only=True, required=False
     )
 
+    # Файлы, заранее загруженные по частям через /uploads/ (вместо file_scheme / gallery_images)
+    file_upload = serializers.PrimaryKeyRelatedField(
+        queryset=ChunkedUpload.objects.filter(status=ChunkedUpload.Status.COMPLETE),
+        write_only=True, required=False, label="Загруженный файл схемы"
+    )
+    gallery_uploads = serializers.PrimaryKeyRelatedField(
+        queryset=ChunkedUpload.objects.filter(status=ChunkedUpload.Status.COMPLETE),
+        many=True, write_only=True, required=False
+    )
+
     class Meta:
         model = EmbroideryScheme
         fields = (
             'id', 'title', 'description', 'main_image',
             'category', 'tags_str', 'difficulty', 'visibility',
-            'file_scheme', 'license', 'gallery_images'
+            'file_scheme', 'license', 'gallery_images',
+            'file_upload', 'gallery_uploads'
         )
 
+    def validate_gallery_uploads(self, value):
+        for upload in value:
+            validate_image_upload(upload)
+        return value
+
+    def validate(self, attrs):
+        user = self.context['request'].user
+        uploads = list(attrs.get('gallery_uploads', []))
+        if attrs.get('file_upload'):
+            uploads.append(attrs['file_upload'])
+        if any(upload.user_id != user.pk for upload in uploads):
+            raise serializers.ValidationError('Можно использовать только собственные загрузки.')
+        if self.instance is None and not attrs.get('file_scheme') and not attrs.get('file_upload'):
+            raise serializers.ValidationError({'file_scheme': 'Нужен файл схемы или file_upload.'})
+        return attrs
+
     def create(self, validated_data):
         tags_string = validated_data.pop('tags_str', '')
         scheme_file_data = validated_data.pop('file_scheme', None)
         gallery_images_data = validated_data.pop('gallery_images', [])
+        file_upload = validated_data.pop('file_upload', None)
+        gallery_uploads = validated_data.pop('gallery_uploads', [])
+
+        # Все записи — одной транзакцией и фиксированным числом запросов
+        # независимо от количества тегов и изображений
+        with transaction.atomic():
+            scheme = EmbroideryScheme.objects.create(**validated_data)
 
-        scheme = EmbroideryScheme.objects.create(**validated_data)
-
-        if tags_string:
-            tag_names = [name.strip() for name in tags_string.split(',') if name.strip()]
-            tags_to_add = []
-            for name in tag_names:
-                # --- ИЗМЕНЕННАЯ ЛОГИКА ---
-                # Ищем тег по имени без учета регистра. Если не находим, создаем новый.
-                # Это предотвращает ошибку уникальности.
-                tag, _ = Tag.objects.get_or_create(
-                    name__iexact=name,
-                    defaults={'name': name, 'slug': slugify(name, allow_unicode=True)}
-                )
-                tags_to_add.append(tag)
-            scheme.tags.set(tags_to_add)
-
-        if scheme_file_data:
-            SchemeFile.objects.create(scheme=scheme, file=scheme_file_data)
-
-        if gallery_images_data:
-            for image_data in gallery_images_data:
-                SchemeImage.objects.create(scheme=scheme, image=image_data)
+            if tags_string:
+                scheme.tags.set(resolve_tags(split_tag_names(tags_string)))
+
+            if scheme_file_data:
+                SchemeFile.objects.create(scheme=scheme, file=scheme_file_data)
+
+            images = create_gallery_images(scheme, gallery_images_data)
 
+            if file_upload:
+                attach_to_scheme(file_upload, scheme, 'file')
+            for upload in gallery_uploads:
+                attach_to_scheme(upload, scheme, 'image')
+
+        generate_gallery_variants(images)
         return scheme
 
 
+def create_gallery_images(scheme, images_data, caption=''):
+    """Создает картинки галереи одним INSERT."""
+    if not images_data:
+        return []
+    return SchemeImage.objects.bulk_create([
+        SchemeImage(scheme=scheme, image=image_data, caption=caption) for image_data in images_data
+    ])
+
+
+def generate_gallery_variants(images):
+    # bulk_create не отправляет post_save, поэтому задачи ставим сами (как api/signals.py), одним INSERT
+    if images:
+        enqueue_many('scheme_image.variants', [(image.pk,) for image in images], scheme_id=images[0].scheme_id)
+
+
 # Сериализатор для ОБНОВЛЕНИЯ схемы
 class EmbroiderySchemeUpdateSerializer(EmbroiderySchemeCreateSerializer):
     main_image = serializers.ImageField(write_only=True, required=False)
@@ -168,42 +228,103 @@ class EmbroiderySchemeUpdateSerializer(EmbroiderySchemeCreateSerializer):
         tags_string = validated_data.pop('tags_str', None)
         scheme_file_data = validated_data.pop('file_scheme', None)
         gallery_images_data = validated_data.pop('gallery_images', None)
-
-        # Вызываем родительский метод update из ModelSerializer, а не CreateSerializer
-        # super(EmbroiderySchemeCreateSerializer, self).update(...) тут не совсем корректно
-        # Правильнее будет так:
-        for attr, value in validated_data.items():
-            setattr(instance, attr, value)
-        instance.save()
-
-        if tags_string is not None:
-            tags_to_add = []
-            if tags_string:
-                tag_names = [name.strip() for name in tags_string.split(',') if name.strip()]
-                for name in tag_names:
-                    # --- ИЗМЕНЕННАЯ ЛОГИКА ---
-                    tag, _ = Tag.objects.get_or_create(
-                        name__iexact=name,
-                        defaults={'name': name, 'slug': slugify(name, allow_unicode=True)}
-                    )
-                    tags_to_add.append(tag)
-            instance.tags.set(tags_to_add)
-
-        if scheme_file_data:
-            SchemeFile.objects.create(scheme=instance, file=scheme_file_data, description="Обновленный файл")
-
-        if gallery_images_data is not None:
-            instance.images.all().delete()
-            for image_data in gallery_images_data:
-                SchemeImage.objects.create(scheme=instance, image=image_data, caption="Дополнительное изображение")
-
+        file_upload = validated_data.pop('file_upload', None)
+        gallery_uploads = validated_data.pop('gallery_uploads', None)
+
+        with transaction.atomic():
+            # Вызываем родительский метод update из ModelSerializer, а не CreateSerializer
+            # super(EmbroiderySchemeCreateSerializer, self).update(...) тут не совсем корректно
+            # Правильнее будет так:
+            for attr, value in validated_data.items():
+                setattr(instance, attr, value)
+            instance.save()
+
+            if tags_string is not None:
+                instance.tags.set(resolve_tags(split_tag_names(tags_string)))
+
+            if scheme_file_data:
+                SchemeFile.objects.create(scheme=instance, file=scheme_file_data, description="Обновленный файл")
+
+            images = []
+            if gallery_images_data is not None or gallery_uploads is not None:
+                instance.images.all().delete()
+            if gallery_images_data is not None:
+                images = create_gallery_images(instance, gallery_images_data, caption="Дополнительное изображение")
+
+            if file_upload:
+                attach_to_scheme(file_upload, instance, 'file', description="Обновленный файл")
+            for upload in gallery_uploads or []:
+                attach_to_scheme(upload, instance, 'image', caption="Дополнительное изображение")
+
+        generate_gallery_variants(images)
         return instance
 
 
 class CommentSerializer(serializers.ModelSerializer):
     author = UserSerializer(read_only=True)
+    parent = serializers.PrimaryKeyRelatedField(
+        queryset=Comment.objects.only('id', 'scheme_id', 'path'), required=False, allow_null=True
+    )
+    depth = serializers.IntegerField(read_only=True)
+    replies_count = serializers.SerializerMethodField()
 
     class Meta:
         model = Comment
-        fields = ('id', 'author', 'text', 'created_at')
-        read_only_fields = ('scheme',)
\ No newline at end of file
+        fields = ('id', 'author', 'parent', 'depth', 'text', 'created_at', 'replies_count')
+        read_only_fields = ('scheme',)
+
+    def get_replies_count(self, obj):
+        # Аннотация with_replies_count(); у только что созданного комментария ответов нет
+        return getattr(obj, 'replies_count', 0)
+
+    def validate_parent(self, parent):
+        if self.instance is not None:
+            if getattr(parent, 'pk', None) != self.instance.parent_id:
+                raise serializers.ValidationError('Комментарий нельзя перенести в другую ветку.')
+            return parent
+        if parent is None:
+            return parent
+        if str(parent.scheme_id) != str(self.context['view'].kwargs.get('scheme_pk')):
+            raise serializers.ValidationError('Ответ должен относиться к той же схеме.')
+        if parent.depth >= Comment.MAX_DEPTH:
+            raise serializers.ValidationError(f'Не больше {Comment.MAX_DEPTH} уровней ответов.')
+        return parent
+
+    def update(self, instance, validated_data):
+        # Ветка (parent и path) задается только при создании
+        validated_data.pop('parent', None)
+        return super().update(instance, validated_data)
+
+
+class ChunkedUploadSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = ChunkedUpload
+        fields = ('id', 'filename', 'size', 'offset', 'checksum', 'status', 'created_at', 'completed_at')
+        read_only_fields = ('offset', 'status', 'created_at', 'completed_at')
+
+    def validate_filename(self, value):
+        return clean_filename(value)
+
+    def validate_size(self, value):
+        max_size = get_upload_settings()['MAX_SIZE']
+        if value > max_size:
+            raise serializers.ValidationError(f'Максимальный размер файла — {max_size} байт.')
+        return value
+
+    def validate_checksum(self, value):
+        return value.lower()
+
+
+class UploadAttachSerializer(serializers.Serializer):
+    scheme = serializers.PrimaryKeyRelatedField(queryset=EmbroideryScheme.objects.all())
+    kind = serializers.ChoiceField(choices=('file', 'image'), default='file')
+
+    def validate_scheme(self, scheme):
+        if scheme.author_id != self.context['request'].user.pk:
+            raise serializers.ValidationError('Редактирование и удаление чужих схем запрещено.')
+        return scheme
+
+    def validate(self, attrs):
+        if attrs['kind'] == 'image':
+            validate_image_upload(self.context['upload'])
+        return attrs
@@ -0,0 +1,179 @@
+# backend/api/signals.py
+
+from django.conf import settings
+from django.db.models.signals import post_save, post_delete, m2m_changed
+from django.dispatch import receiver
+
+from .cache import bump_version
+from .images import needs_variants
+from .jobs import enqueue
+from .models import EmbroideryScheme, Tag, Category, License, Comment, SchemeFile, SchemeImage
+from .relations import clear_user_relations, invalidate_user_relations
+from .search import get_search_backend, index_schemes
+from .similarity import FEATURE_FIELDS, get_similarity_settings
+
+
+# --- Поисковый индекс (см. api/search.py) ---
+
+@receiver(post_save, sender=EmbroideryScheme)
+def index_scheme_on_save(sender, instance, using, update_fields=None, **kwargs):
+    # Обновление одних только счетчиков не меняет текст документа
+    if update_fields and not set(update_fields) & {'title', 'description', 'category', 'author'}:
+        return
+    index_schemes([instance.pk], using=using)
+
+
+@receiver(post_delete, sender=EmbroideryScheme)
+def remove_scheme_from_index(sender, instance, using, **kwargs):
+    get_search_backend(using).remove([instance.pk])
+
+
+@receiver(m2m_changed, sender=EmbroideryScheme.tags.through)
+def index_scheme_on_tags_change(sender, instance, action, reverse, pk_set, using, **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if not reverse:
+        index_schemes([instance.pk], using=using)
+    elif pk_set:
+        # Схемы добавили/убрали со стороны тега: tag.schemes.add(...)
+        index_schemes(pk_set, using=using)
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_save, sender=Category)
+def index_schemes_on_rename(sender, instance, created, using, **kwargs):
+    if created:
+        return
+    scheme_ids = list(instance.schemes.values_list('pk', flat=True))
+    if scheme_ids:
+        index_schemes(scheme_ids, using=using)
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+def index_schemes_on_username_change(sender, instance, created, using, update_fields=None, **kwargs):
+    # При входе сохраняется только last_login — переиндексация не нужна
+    if created or (update_fields and 'username' not in update_fields):
+        return
+    scheme_ids = list(instance.schemes.values_list('pk', flat=True))
+    if scheme_ids:
+        index_schemes(scheme_ids, using=using)
+
+
+# --- Кэш каталога (см. api/cache.py) ---
+# Списки схем показывают автора, категорию и теги, поэтому их изменение
+# тоже инвалидирует кэш схем. Счетчики меняются через UPDATE без сигналов,
+# поэтому кэш сбрасывают сами места записи: relations.set_like/set_favorite,
+# CommentViewSet и api/counters.py (см. cache.invalidate_schemes).
+
+CATALOG_NAMESPACES = {
+    EmbroideryScheme: ('schemes',),
+    Tag: ('tags', 'schemes'),
+    Category: ('categories', 'schemes'),
+    License: ('licenses', 'schemes'),
+}
+
+
+@receiver(post_save, sender=EmbroideryScheme)
+@receiver(post_delete, sender=EmbroideryScheme)
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+@receiver(post_save, sender=License)
+@receiver(post_delete, sender=License)
+def invalidate_catalog_cache(sender, update_fields=None, **kwargs):
+    if sender is EmbroideryScheme and update_fields and set(update_fields) <= {'views_count'}:
+        return
+    bump_version(*CATALOG_NAMESPACES[sender])
+
+
+@receiver(m2m_changed, sender=EmbroideryScheme.tags.through)
+def invalidate_catalog_cache_on_tags_change(sender, action, **kwargs):
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        bump_version('schemes')
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def invalidate_comments_cache(sender, instance, **kwargs):
+    # Первая страница обсуждения кэшируется отдельно для каждой схемы (CommentViewSet)
+    bump_version(f'comments:{instance.scheme_id}')
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+@receiver(post_save, sender='users.Profile')
+def invalidate_catalog_cache_on_author_change(sender, created, update_fields=None, **kwargs):
+    # Новый пользователь еще не автор ни одной схемы, а вход меняет только last_login
+    if created or (update_fields and set(update_fields) <= {'last_login'}):
+        return
+    bump_version('schemes', 'users')
+
+
+# --- Уменьшенные копии изображений (см. api/images.py) ---
+
+@receiver(post_save, sender=EmbroideryScheme)
+def generate_main_image_variants(sender, instance, raw=False, **kwargs):
+    if raw or not needs_variants(instance.main_image, instance.main_image_variants):
+        return
+    # Как и для галереи: сохранение схемы не ждет обработки картинки
+    enqueue('scheme.image_variants', instance.pk, scheme_id=instance.pk)
+
+
+@receiver(post_save, sender=SchemeImage)
+def generate_gallery_image_variants(sender, instance, raw=False, **kwargs):
+    if raw or not needs_variants(instance.image, instance.variants):
+        return
+    # Выполняется сразу или в фоне — в зависимости от settings.BACKGROUND_JOBS (api/jobs.py)
+    enqueue('scheme_image.variants', instance.pk, scheme_id=instance.scheme_id)
+
+
+# --- Фоновая обработка файлов схем (см. api/tasks.py) ---
+
+@receiver(post_save, sender=SchemeFile)
+def process_uploaded_scheme_file(sender, instance, created, raw=False, **kwargs):
+    if raw or not created:
+        return
+    enqueue('scheme_file.process', instance.pk, scheme_id=instance.scheme_id)
+
+
+# --- Кэш лайков и избранного пользователя (см. api/relations.py) ---
+# Лайки меняются только через relations.set_like, которая сама сбрасывает кэш:
+# обработчики post_save/post_delete у Like лишили бы удаление быстрого пути (один DELETE).
+
+@receiver(m2m_changed, sender=EmbroideryScheme.favorited_by.through)
+def invalidate_user_relations_on_favorite(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if reverse:
+        # user.favorite_schemes.add(...)
+        invalidate_user_relations(instance.pk)
+    elif pk_set:
+        invalidate_user_relations(*pk_set)
+    else:
+        # scheme.favorited_by.clear(): затронутые пользователи неизвестны
+        clear_user_relations()
+
+
+# --- Похожие схемы (см. api/similarity.py) ---
+
+# Сохранение схемы и замена тегов в одном запросе дают одну задачу (debounce, см. api/jobs.py)
+
+def enqueue_similar_schemes(scheme_id):
+    config = get_similarity_settings()
+    if config['INCREMENTAL']:
+        enqueue('scheme.similar', scheme_id, debounce=config['DEBOUNCE'])
+
+
+@receiver(post_save, sender=EmbroideryScheme)
+def update_similar_schemes(sender, instance, raw=False, update_fields=None, **kwargs):
+    # Счетчики и оценки популярности на сходство не влияют
+    if raw or (update_fields and not set(update_fields) & FEATURE_FIELDS):
+        return
+    enqueue_similar_schemes(instance.pk)
+
+
+@receiver(m2m_changed, sender=EmbroideryScheme.tags.through)
+def update_similar_schemes_on_tags(sender, instance, action, reverse, **kwargs):
+    if reverse or action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    enqueue_similar_schemes(instance.pk)
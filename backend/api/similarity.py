@@ -0,0 +1,407 @@
+# backend/api/similarity.py
+"""
+Похожие схемы: заранее посчитанные K ближайших соседей для /schemes/{id}/similar/.
+
+Сходство двух публичных схем — взвешенное среднее по блокам признаков:
+
+    tags        косинус one-hot векторов тегов: |A ∩ B| / sqrt(|A| * |B|)
+    category    1, если категория совпадает
+    difficulty  1 - разница уровней сложности (EA..EX -> 0..1)
+    size        1 - средняя разница ширины и высоты в крестиках
+    colors      1 - разница количества цветов
+
+Размеры и цвета берутся в логарифмической шкале и нормируются на [0, 1] по каталогу;
+если значение не указано у одной из схем, блок дает 0. Итог лежит в [0, 1].
+
+Полный пересчет — команда build_similar_schemes: матрица сходства считается блоками
+по CHUNK_SIZE строк (память O(CHUNK_SIZE * N)) и из каждой строки берутся TOP K.
+Блоки считаются векторно в NumPy: матричное произведение для тегов, broadcasting для
+остальных признаков. Теги, встречающиеся только у одной схемы,
+в матрицу не попадают: на пересечения они не влияют, а нормы считаются по полному числу тегов.
+
+При изменении схемы ее соседи пересчитываются инкрементально (задача 'scheme.similar',
+см. api/tasks.py; серия изменений одной схемы за DEBOUNCE секунд дает одну задачу).
+Признаки каталога кэшируются в процессе на FEATURES_TTL секунд, из базы читается только
+измененная схема, и считается одна строка матрицы. Дальше:
+
+    - список самой схемы — ее K лучших соседей;
+    - списки, где схема была, пересчитываются целиком: ее место могло освободиться;
+    - в списки CANDIDATES самых похожих схем она добавляется, если лучше их K-го соседа,
+      и каждый такой список урезается обратно до K.
+
+Кэш признаков между перезагрузками может отставать от изменений, сделанных в других
+процессах, а схема, похожая на измененную слабее, чем CANDIDATES других, в чужие списки
+не попадает — оба расхождения убирает полный пересчет.
+
+Настройки (settings.SIMILAR_SCHEMES):
+    K            сколько соседей хранить и отдавать
+    WEIGHTS      веса блоков признаков (0 — блок не учитывается)
+    CHUNK_SIZE   строк матрицы в одном блоке при полном пересчете
+    INCREMENTAL  пересчитывать соседей при изменении схемы
+    DEBOUNCE     секунд, на которые откладывается инкрементальный пересчет
+    CANDIDATES   в списки скольких самых похожих схем пробовать добавить измененную
+    FEATURES_TTL сколько секунд процесс использует закэшированные признаки каталога
+"""
+import math
+import threading
+import time
+from collections import Counter, defaultdict
+
+import numpy as np
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.db import transaction
+from django.db.models import Q
+from django.dispatch import receiver
+
+from .models import EmbroideryScheme, SimilarScheme
+
+DEFAULTS = {
+    'K': 12,
+    'WEIGHTS': {
+        'tags': 3,
+        'category': 2,
+        'difficulty': 1,
+        'size': 1,
+        'colors': 1,
+    },
+    'CHUNK_SIZE': 1000,
+    'INCREMENTAL': True,
+    'DEBOUNCE': 10,
+    'CANDIDATES': 200,
+    'FEATURES_TTL': 600,
+}
+
+DIFFICULTY_LEVELS = {
+    EmbroideryScheme.Difficulty.EASY: 0.0,
+    EmbroideryScheme.Difficulty.MEDIUM: 1 / 3,
+    EmbroideryScheme.Difficulty.HARD: 2 / 3,
+    EmbroideryScheme.Difficulty.EXPERT: 1.0,
+}
+NUMERIC_FIELDS = ('size_stitches_width', 'size_stitches_height', 'number_of_colors')
+# Поля схемы, от которых зависит сходство (включая видимость)
+FEATURE_FIELDS = {'visibility', 'category', 'difficulty', *NUMERIC_FIELDS}
+
+
+def get_similarity_settings():
+    config = {**DEFAULTS, **getattr(settings, 'SIMILAR_SCHEMES', {})}
+    config['WEIGHTS'] = {**DEFAULTS['WEIGHTS'], **config['WEIGHTS']}
+    return config
+
+
+class Features:
+    """
+    Признаки всех публичных схем; строка i соответствует схеме ids[i].
+    rows — кортежи (pk, category_id, difficulty, *NUMERIC_FIELDS), как в load_features().
+    """
+
+    def __init__(self, rows, scheme_tags):
+        self.ids, self.index = [], {}
+        self.category, self.difficulty, self.tags, self.numeric = [], [], [], []
+        # Числовые признаки: log1p и нормировка на [0, 1] по границам каталога
+        self.bounds = []
+        for position in range(len(NUMERIC_FIELDS)):
+            present = [math.log1p(row[3 + position]) for row in rows if row[3 + position]]
+            low, high = (min(present), max(present)) if present else (0, 0)
+            self.bounds.append((low, (high - low) or 1))
+        for row in rows:
+            self.set_row(row, scheme_tags.get(row[0], ()))
+
+    def __len__(self):
+        return len(self.ids)
+
+    def _columns(self):
+        return self.category, self.difficulty, self.tags, self.numeric
+
+    def _normalize(self, position, value):
+        if not value:
+            return None  # не указано
+        low, span = self.bounds[position]
+        # Значение новой схемы может выйти за границы каталога до перезагрузки признаков
+        return min(max((math.log1p(value) - low) / span, 0.0), 1.0)
+
+    def set_row(self, row, tags):
+        """Добавляет схему или обновляет ее признаки. Возвращает номер строки."""
+        values = (
+            row[1],
+            DIFFICULTY_LEVELS.get(row[2], 1 / 3),
+            frozenset(tags),
+            tuple(self._normalize(position, row[3 + position]) for position in range(len(NUMERIC_FIELDS))),
+        )
+        i = self.index.get(row[0])
+        if i is None:
+            i = self.index[row[0]] = len(self.ids)
+            self.ids.append(row[0])
+            for column, value in zip(self._columns(), values):
+                column.append(value)
+        else:
+            for column, value in zip(self._columns(), values):
+                column[i] = value
+        return i
+
+    def remove(self, scheme_id):
+        """
+        Убирает схему: на ее место переезжает последняя строка.
+        Возвращает (номер освободившейся строки, номер последней) или None, если схемы нет.
+        """
+        i = self.index.pop(scheme_id, None)
+        if i is None:
+            return None
+        last = len(self.ids) - 1
+        for column in (self.ids, *self._columns()):
+            column[i] = column[last]
+            column.pop()
+        if i != last:
+            self.index[self.ids[i]] = i
+        return i, last
+
+
+def load_features():
+    """Два запроса: поля публичных схем и пары (схема, тег)."""
+    public = EmbroideryScheme.objects.filter(visibility=EmbroideryScheme.Visibility.PUBLIC)
+    rows = list(public.order_by('pk').values_list('pk', 'category_id', 'difficulty', *NUMERIC_FIELDS))
+    scheme_tags = defaultdict(list)
+    pairs = EmbroideryScheme.tags.through.objects.filter(
+        embroideryscheme__visibility=EmbroideryScheme.Visibility.PUBLIC
+    ).values_list('embroideryscheme_id', 'tag_id')
+    for scheme_id, tag_id in pairs:
+        scheme_tags[scheme_id].append(tag_id)
+    return Features(rows, scheme_tags)
+
+
+def load_scheme(scheme_id):
+    """Признаки одной схемы для set_row(): (строка, теги) или None, если схема не публичная."""
+    row = EmbroideryScheme.objects.filter(
+        pk=scheme_id, visibility=EmbroideryScheme.Visibility.PUBLIC
+    ).values_list('pk', 'category_id', 'difficulty', *NUMERIC_FIELDS).first()
+    if row is None:
+        return None
+    tags = EmbroideryScheme.tags.through.objects.filter(embroideryscheme_id=scheme_id).values_list('tag_id', flat=True)
+    return row, list(tags)
+
+
+# --- Сходство ---
+
+class _Matrices:
+    """
+    Признаки в виде массивов NumPy. Строятся один раз на весь пересчет, а в кэше признаков
+    обновляются по строкам. Столбцы тегов фиксируются при построении: тег, который был
+    у одной схемы, у новых схем не учитывается до перезагрузки признаков.
+    """
+
+    def __init__(self, features):
+        tag_counts = Counter(tag for tags in features.tags for tag in tags)
+        self.shared = {tag: column for column, tag in enumerate(t for t, n in tag_counts.items() if n > 1)}
+        self.tags = np.zeros((len(features), len(self.shared)), dtype=np.float64)
+        for i, tags in enumerate(features.tags):
+            self._set_tags(i, tags)
+        self.category = np.array([-1 if value is None else value for value in features.category], dtype=np.int64)
+        self.difficulty = np.array(features.difficulty, dtype=np.float64)
+        self.numeric = np.array(
+            [[np.nan if value is None else value for value in row] for row in features.numeric],
+            dtype=np.float64
+        ).reshape(len(features), len(NUMERIC_FIELDS))
+
+    def _set_tags(self, i, tags):
+        self.tags[i] = 0
+        columns = [self.shared[tag] for tag in tags if tag in self.shared]
+        if columns:
+            self.tags[i, columns] = 1 / math.sqrt(len(tags))
+
+    def set_row(self, features, i):
+        if i == len(self.difficulty):
+            # Новая схема — строка в конце
+            self.tags = np.vstack((self.tags, np.zeros((1, self.tags.shape[1]))))
+            self.category = np.append(self.category, -1)
+            self.difficulty = np.append(self.difficulty, 0.0)
+            self.numeric = np.vstack((self.numeric, np.full((1, len(NUMERIC_FIELDS)), np.nan)))
+        self._set_tags(i, features.tags[i])
+        self.category[i] = -1 if features.category[i] is None else features.category[i]
+        self.difficulty[i] = features.difficulty[i]
+        self.numeric[i] = [np.nan if value is None else value for value in features.numeric[i]]
+
+    def remove(self, i, last):
+        """То же перемещение, что в Features.remove()."""
+        for array in (self.tags, self.category, self.difficulty, self.numeric):
+            array[i] = array[last]
+        self.tags, self.category = self.tags[:last], self.category[:last]
+        self.difficulty, self.numeric = self.difficulty[:last], self.numeric[:last]
+
+
+def _numeric_similarity(column, rows):
+    similarity = 1 - np.abs(column[rows, None] - column[None, :])
+    return np.nan_to_num(similarity, nan=0.0)
+
+
+def _score_rows(matrices, rows, weights):
+    rows = np.asarray(rows)
+    score = weights['tags'] * (matrices.tags[rows] @ matrices.tags.T)
+    category = matrices.category
+    score += weights['category'] * ((category[rows, None] == category[None, :]) & (category[rows, None] >= 0))
+    score += weights['difficulty'] * (1 - np.abs(matrices.difficulty[rows, None] - matrices.difficulty[None, :]))
+    width, height, colors = (matrices.numeric[:, position] for position in range(len(NUMERIC_FIELDS)))
+    # Размер учитывается, только если у обеих схем есть и ширина, и высота
+    size = (_numeric_similarity(width, rows) + _numeric_similarity(height, rows)) / 2
+    has_size = ~(np.isnan(width) | np.isnan(height))
+    score += weights['size'] * size * (has_size[rows, None] & has_size[None, :])
+    score += weights['colors'] * _numeric_similarity(colors, rows)
+    return score / (sum(weights.values()) or 1)
+
+
+class Scorer:
+    """Считает строки матрицы сходства и выбирает из них K лучших соседей."""
+
+    def __init__(self, features, weights):
+        self.features = features
+        self.weights = weights
+        self.matrices = _Matrices(features)
+
+    def set_row(self, row, tags):
+        i = self.features.set_row(row, tags)
+        self.matrices.set_row(self.features, i)
+        return i
+
+    def remove(self, scheme_id):
+        moved = self.features.remove(scheme_id)
+        if moved is not None:
+            self.matrices.remove(*moved)
+
+    def score_rows(self, rows):
+        return _score_rows(self.matrices, rows, self.weights)
+
+    def top_k(self, row, scores, k):
+        """K лучших соседей строки `row`: [(id схемы, сходство), ...] по убыванию сходства."""
+        scores = np.array(scores, dtype=np.float64)
+        scores[row] = -np.inf
+        count = min(k, len(scores) - 1)
+        if count <= 0:
+            return []
+        best = np.argpartition(-scores, count - 1)[:count]
+        # По убыванию сходства, при равенстве — по id
+        ids = np.array([self.features.ids[j] for j in best])
+        best = best[np.lexsort((ids, -scores[best]))]
+        return [(self.features.ids[j], float(scores[j])) for j in best]
+
+
+# --- Кэш признаков для инкрементального пересчета ---
+
+_scorer = None
+_scorer_loaded_at = 0.0
+# Пересчеты в потоках (режим 'thread' в api/jobs.py) меняют общий кэш по очереди
+_scorer_lock = threading.Lock()
+
+
+def get_scorer(config):
+    """Закэшированный в процессе Scorer; вызывается под _scorer_lock."""
+    global _scorer, _scorer_loaded_at
+    if _scorer is None or time.monotonic() - _scorer_loaded_at > config['FEATURES_TTL']:
+        _scorer = Scorer(load_features(), config['WEIGHTS'])
+        _scorer_loaded_at = time.monotonic()
+    return _scorer
+
+
+def clear_features_cache():
+    global _scorer
+    with _scorer_lock:
+        _scorer = None
+
+
+@receiver(setting_changed)
+def _reset_features_cache(setting, **kwargs):
+    if setting == 'SIMILAR_SCHEMES':
+        clear_features_cache()
+
+
+# --- Таблица соседей ---
+
+def rebuild_neighbors():
+    """Полный пересчет таблицы соседей. Возвращает количество записанных пар."""
+    global _scorer, _scorer_loaded_at
+    config = get_similarity_settings()
+    features = load_features()
+    scorer = Scorer(features, config['WEIGHTS'])
+    with _scorer_lock:
+        # Свежие признаки пригодятся инкрементальному пересчету
+        _scorer, _scorer_loaded_at = scorer, time.monotonic()
+    neighbors = []
+    for start in range(0, len(features), config['CHUNK_SIZE']):
+        rows = list(range(start, min(start + config['CHUNK_SIZE'], len(features))))
+        for row, scores in zip(rows, scorer.score_rows(rows)):
+            scheme_id = features.ids[row]
+            neighbors.extend(
+                SimilarScheme(scheme_id=scheme_id, similar_id=similar_id, score=score)
+                for similar_id, score in scorer.top_k(row, scores, config['K'])
+            )
+    with transaction.atomic():
+        SimilarScheme.objects.all().delete()
+        SimilarScheme.objects.bulk_create(neighbors, batch_size=1000)
+    return len(neighbors)
+
+
+def update_neighbors(scheme_id):
+    """
+    Инкрементальный пересчет после изменения схемы (см. описание модуля).
+    Возвращает количество записанных пар.
+    """
+    config = get_similarity_settings()
+    k = config['K']
+    scheme = load_scheme(scheme_id)
+    referrers = set(SimilarScheme.objects.filter(similar_id=scheme_id).values_list('scheme_id', flat=True))
+
+    own, candidates, refilled = [], {}, {}
+    with _scorer_lock:
+        scorer = get_scorer(config)
+        if scheme is None:
+            # Схема скрыта или удалена — в рекомендациях ее больше нет
+            scorer.remove(scheme_id)
+        else:
+            row = scorer.set_row(*scheme)
+            scores = scorer.score_rows([row])[0]
+            own = scorer.top_k(row, scores, k)
+            candidates = {
+                other_id: score for other_id, score in scorer.top_k(row, scores, config['CANDIDATES'])
+                if other_id not in referrers
+            }
+        rows = [scorer.features.index[other_id] for other_id in referrers if other_id in scorer.features.index]
+        for start in range(0, len(rows), config['CHUNK_SIZE']):
+            chunk = rows[start:start + config['CHUNK_SIZE']]
+            for other, scores in zip(chunk, scorer.score_rows(chunk)):
+                refilled[scorer.features.ids[other]] = scorer.top_k(other, scores, k)
+
+    # Кэш мог не узнать о схемах, скрытых или удаленных в других процессах
+    mentioned = {*candidates, *refilled, *(pair[0] for pairs in (own, *refilled.values()) for pair in pairs)}
+    public = set(EmbroideryScheme.objects.filter(
+        pk__in=mentioned, visibility=EmbroideryScheme.Visibility.PUBLIC
+    ).values_list('pk', flat=True))
+    if mentioned - public:
+        with _scorer_lock:
+            for stale_id in mentioned - public:
+                scorer.remove(stale_id)
+
+    neighbors = [
+        SimilarScheme(scheme_id=owner_id, similar_id=similar_id, score=score)
+        for owner_id, pairs in ((scheme_id, own), *refilled.items()) if owner_id == scheme_id or owner_id in public
+        for similar_id, score in pairs if similar_id in public
+    ]
+    with transaction.atomic():
+        SimilarScheme.objects.filter(
+            Q(scheme_id=scheme_id) | Q(similar_id=scheme_id) | Q(scheme_id__in=refilled)
+        ).delete()
+        # Сходство симметрично: схема попадает в списки похожих, если лучше их K-го соседа
+        lists = defaultdict(list)
+        for pk, owner_id, similar_id, score in SimilarScheme.objects.filter(
+            scheme_id__in=[other_id for other_id in candidates if other_id in public]
+        ).values_list('pk', 'scheme_id', 'similar_id', 'score'):
+            lists[owner_id].append((score, similar_id, pk))
+        trimmed = []
+        for other_id, score in candidates.items():
+            if other_id not in public:
+                continue
+            items = sorted([*lists[other_id], (score, scheme_id, None)], key=lambda item: (-item[0], item[1]))
+            # Заодно урезаем до K списки, которые успели его превысить
+            trimmed.extend(pk for _, _, pk in items[k:] if pk is not None)
+            if any(pk is None for _, _, pk in items[:k]):
+                neighbors.append(SimilarScheme(scheme_id=other_id, similar_id=scheme_id, score=float(score)))
+        SimilarScheme.objects.filter(pk__in=trimmed).delete()
+        SimilarScheme.objects.bulk_create(neighbors, batch_size=1000)
+    return len(neighbors)
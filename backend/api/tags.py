@@ -0,0 +1,77 @@
+# backend/api/tags.py
+"""
+Разбор строки тегов ("Цветы, пионы, ...") и пакетное получение объектов Tag.
+
+Теги сравниваются по нормализованному имени (Tag.normalized_name: схлопнутые пробелы
+и casefold). Оно считается в Python, потому что lower() в SQLite не понимает
+кириллицу, а уникальный индекс по колонке одинаково работает во всех СУБД.
+
+resolve_tags() укладывается в фиксированное число запросов независимо от количества тегов:
+один SELECT существующих, один INSERT недостающих (с игнорированием конфликтов —
+параллельный запрос мог создать тот же тег) и один SELECT созданных.
+"""
+from django.utils.text import slugify
+
+from .cache import bump_version
+
+
+def normalize_tag_name(name):
+    return ' '.join(name.split()).casefold()
+
+
+def split_tag_names(tags_string):
+    """Имена тегов из строки через запятую: без пустых и без повторов (с учетом регистра)."""
+    names = {}
+    for name in (tags_string or '').split(','):
+        name = ' '.join(name.split())
+        if name:
+            names.setdefault(normalize_tag_name(name), name)
+    return list(names.values())
+
+
+def _unique_slug(name):
+    from .models import Tag
+
+    base = slugify(name, allow_unicode=True) or 'tag'
+    slug, suffix = base, 2
+    while Tag.objects.filter(slug=slug).exists():
+        slug, suffix = f'{base}-{suffix}', suffix + 1
+    return slug
+
+
+def resolve_tags(names):
+    """
+    Возвращает теги для списка имен в том же порядке, создавая недостающие.
+    Новым тегам сигналы post_save не отправляются (bulk_create), поэтому кэш
+    каталога тегов инвалидируется здесь.
+    """
+    from .models import Tag
+
+    keyed = {}
+    for name in names:
+        keyed.setdefault(normalize_tag_name(name), name)
+    names = keyed
+    if not names:
+        return []
+    tags = {tag.normalized_name: tag for tag in Tag.objects.filter(normalized_name__in=names)}
+
+    missing = [key for key in names if key not in tags]
+    if missing:
+        Tag.objects.bulk_create(
+            [
+                Tag(name=names[key], normalized_name=key, slug=slugify(names[key], allow_unicode=True))
+                for key in missing
+            ],
+            ignore_conflicts=True
+        )
+        tags.update({tag.normalized_name: tag for tag in Tag.objects.filter(normalized_name__in=missing)})
+        # Остаются только теги, чей slug совпал с уже существующим ("Roses!" и "roses"):
+        # создаем их по одному с уникальным slug — это редкий случай
+        for key in missing:
+            if key not in tags:
+                tags[key], _ = Tag.objects.get_or_create(
+                    normalized_name=key, defaults={'name': names[key], 'slug': _unique_slug(names[key])}
+                )
+        bump_version('tags', 'schemes')
+
+    return [tags[key] for key in names]
@@ -0,0 +1,83 @@
+# backend/api/tasks.py
+"""
+Фоновые задачи обработки загруженных материалов (очередь — api/jobs.py).
+
+Ставятся в очередь из api/signals.py при создании SchemeFile и SchemeImage,
+смене главного изображения и изменении схемы, а также из сериализаторов для картинок галереи, созданных через bulk_create.
+Задача получает id и сама загружает запись: к моменту выполнения ее могли удалить.
+Пересчет лент 'feed.build' ставится в очередь по расписанию: enqueue('feed.build').
+"""
+import os
+
+from .cache import invalidate_schemes
+from .feed import build_feed
+from .images import update_gallery_image_variants, update_scheme_variants
+from .jobs import task
+from .models import EmbroideryScheme, SchemeFile, SchemeImage
+from .similarity import update_neighbors
+
+# Первые байты файла -> тип
+SIGNATURES = (
+    (b'%PDF', SchemeFile.FileType.PDF),
+    (b'\x89PNG\r\n\x1a\n', SchemeFile.FileType.IMAGE),
+    (b'\xff\xd8\xff', SchemeFile.FileType.IMAGE),
+)
+EXTENSIONS = {
+    'pdf': SchemeFile.FileType.PDF,
+    'xsd': SchemeFile.FileType.XSD,
+    'saga': SchemeFile.FileType.SAGA,
+    'png': SchemeFile.FileType.IMAGE,
+    'jpg': SchemeFile.FileType.IMAGE,
+    'jpeg': SchemeFile.FileType.IMAGE,
+}
+
+
+def detect_file_type(field_file):
+    with field_file.open('rb') as stream:
+        head = stream.read(16)
+    for signature, file_type in SIGNATURES:
+        if head.startswith(signature):
+            return file_type
+    extension = os.path.splitext(field_file.name)[1].lstrip('.').lower()
+    return EXTENSIONS.get(extension, SchemeFile.FileType.OTHER)
+
+
+@task('scheme_file.process')
+def process_scheme_file(file_id):
+    """Определяет тип файла схемы по содержимому, если он не задан вручную."""
+    scheme_file = SchemeFile.objects.filter(pk=file_id).first()
+    if scheme_file is None or scheme_file.file_type != SchemeFile.FileType.OTHER:
+        return
+    # Отсутствующий файл — исключение, и задача будет повторена
+    file_type = detect_file_type(scheme_file.file)
+    if file_type != SchemeFile.FileType.OTHER:
+        SchemeFile.objects.filter(pk=file_id).update(file_type=file_type)
+
+
+@task('scheme.image_variants')
+def main_image_variants(scheme_id):
+    """Уменьшенные копии главного изображения схемы (api/images.py)."""
+    scheme = EmbroideryScheme.objects.filter(pk=scheme_id).only('main_image', 'main_image_variants').first()
+    if scheme is not None and update_scheme_variants(scheme):
+        # Миниатюры есть в списках и на детальной странице, а пишутся UPDATE без сигналов
+        invalidate_schemes(scheme_id)
+
+
+@task('scheme_image.variants')
+def gallery_image_variants(image_id):
+    """Уменьшенные копии картинки галереи (api/images.py)."""
+    image = SchemeImage.objects.filter(pk=image_id).first()
+    if image is not None:
+        update_gallery_image_variants(image)
+
+
+@task('scheme.similar')
+def similar_schemes(scheme_id):
+    """Пересчет похожих схем после изменения схемы (api/similarity.py)."""
+    update_neighbors(scheme_id)
+
+
+@task('feed.build')
+def rebuild_feed():
+    """Полный пересчет персональных лент (api/feed.py); статистика пишется в лог."""
+    build_feed()
@@ -1,3 +1,1389 @@
-from django.test import TestCase
+import hashlib
+import json
+import multiprocessing
+import os
+import shutil
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from datetime import timedelta
+from io import BytesIO, StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import Group
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.db.models import Count
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from PIL import Image
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from users.models import User
+from . import counters, feed, similarity, uploads
+from .cache import get_version
+from .images import MAIN_IMAGE_VARIANTS, render_job
+from .management.commands import generate_thumbnails
+from .ranking import ORDERINGS, update_scores
+from .relations import clear_user_relations
+from .models import (
+    License, Category, Tag, EmbroideryScheme, SchemeFile, SchemeImage, Like, Comment, ChunkedUpload, Job,
+    SimilarScheme, Recommendation
+)
+
+
+class SchemeTestMixin:
+    """Общие фикстуры для тестов API схем."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.license = License.objects.create(name='Test license', short_name='TL', url='https://example.com/tl')
+        cls.category = Category.objects.create(name='Цветы', slug='flowers')
+        cls.author = User.objects.create_user(email='author@example.com', username='author', password='pass12345')
+        cls.reader = User.objects.create_user(email='reader@example.com', username='reader', password='pass12345')
+
+    def setUp(self):
+        # Кэш в памяти общий для всех тестов, а база откатывается после каждого
+        cache.clear()
+        clear_user_relations()
+        similarity.clear_features_cache()
+
+    def make_scheme(self, **kwargs):
+        kwargs.setdefault('title', 'Scheme')
+        kwargs.setdefault('author', self.author)
+        kwargs.setdefault('license', self.license)
+        kwargs.setdefault('category', self.category)
+        return EmbroideryScheme.objects.create(**kwargs)
+
+
+class MediaRootMixin:
+    """Временный MEDIA_ROOT на каждый тест: загруженные файлы удаляются вместе с каталогом."""
+
+    def setUp(self):
+        super().setUp()
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        override = override_settings(MEDIA_ROOT=self.media_root)
+        override.enable()
+        self.addCleanup(override.disable)
+
+
+# Файлы заданы путями без содержимого: задачи их обработки только ставятся в очередь
+@override_settings(BACKGROUND_JOBS={'MODE': 'database'})
+class SchemeListQueryCountTests(SchemeTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        tag = Tag.objects.create(name='roses', slug='roses')
+        for i in range(12):
+            scheme = self.make_scheme(title=f'Scheme {i}')
+            scheme.tags.add(tag)
+            scheme.favorited_by.add(self.reader)
+            Like.objects.create(user=self.reader, scheme=scheme)
+            SchemeFile.objects.create(scheme=scheme, file='schemes/files/test.pdf')
+        EmbroideryScheme.objects.recount_stats()
+
+    def test_list_query_count_does_not_depend_on_page_size(self):
+        # COUNT для пагинации + страница схем + prefetch тегов (ETag — из версии кэша)
+        with self.assertNumQueries(3):
+            response = self.client.get(reverse('schemes-list'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['results']), 10)
+
+    def test_list_annotations_for_authenticated_user(self):
+        self.client.force_authenticate(self.reader)
+        with self.assertNumQueries(3):
+            response = self.client.get(reverse('schemes-list'))
+        row = response.data['results'][0]
+        self.assertTrue(row['is_liked'])
+        self.assertTrue(row['is_favorited'])
+        self.assertEqual(row['likes_count'], 1)
+        self.assertEqual(row['favorites_count'], 1)
+        self.assertEqual(row['total_downloads_count'], 0)
+
+
+# Файлы заданы путями без содержимого: задачи их обработки только ставятся в очередь
+@override_settings(BACKGROUND_JOBS={'MODE': 'database'})
+class SchemeCountersTests(SchemeTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        self.client.force_authenticate(self.reader)
+        self.scheme = self.make_scheme()
+
+    def test_like_and_favorite_update_counters(self):
+        self.client.post(reverse('schemes-like', args=[self.scheme.pk]))
+        self.client.post(reverse('schemes-favorite', args=[self.scheme.pk]))
+        self.scheme.refresh_from_db()
+        self.assertEqual((self.scheme.likes_count, self.scheme.favorites_count), (1, 1))
+
+        self.client.post(reverse('schemes-like', args=[self.scheme.pk]))
+        self.client.post(reverse('schemes-favorite', args=[self.scheme.pk]))
+        self.scheme.refresh_from_db()
+        self.assertEqual((self.scheme.likes_count, self.scheme.favorites_count), (0, 0))
+
+    def test_put_and_delete_are_idempotent(self):
+        like_url = reverse('schemes-like', args=[self.scheme.pk])
+        favorite_url = reverse('schemes-favorite', args=[self.scheme.pk])
+        for _ in range(2):
+            response = self.client.put(like_url)
+            self.assertEqual(response.data['likes_count'], 1)
+            self.assertTrue(response.data['is_liked'])
+            response = self.client.put(favorite_url)
+            self.assertEqual(response.data['favorites_count'], 1)
+        self.assertEqual(Like.objects.filter(scheme=self.scheme).count(), 1)
+
+        for _ in range(2):
+            response = self.client.delete(like_url)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual((response.data['likes_count'], response.data['is_liked']), (0, False))
+            response = self.client.delete(favorite_url)
+            self.assertEqual(response.data['favorites_count'], 0)
+        self.scheme.refresh_from_db()
+        self.assertEqual((self.scheme.likes_count, self.scheme.favorites_count), (0, 0))
+
+        # Изменение сразу видно в персональных полях
+        self.client.put(like_url)
+        response = self.client.get(reverse('schemes-relations'), {'ids': str(self.scheme.pk)})
+        self.assertTrue(response.data[str(self.scheme.pk)]['is_liked'])
+
+    def test_comment_create_updates_counter(self):
+        url = reverse('scheme-comments-list', kwargs={'scheme_pk': self.scheme.pk})
+        response = self.client.post(url, {'text': 'Красиво!'})
+        self.assertEqual(response.status_code, 201)
+        self.scheme.refresh_from_db()
+        self.assertEqual(self.scheme.comments_count, 1)
+
+    def test_recount_command_fixes_drift(self):
+        Like.objects.create(user=self.reader, scheme=self.scheme)
+        SchemeFile.objects.create(scheme=self.scheme, file='schemes/files/a.pdf', downloads_count=5)
+        EmbroideryScheme.objects.filter(pk=self.scheme.pk).update(likes_count=42)
+
+        call_command('recount_scheme_stats', stdout=StringIO())
+
+        self.scheme.refresh_from_db()
+        self.assertEqual(self.scheme.likes_count, 1)
+        self.assertEqual(self.scheme.downloads_count, 5)
+
+
+class BufferedCountersTests(SchemeTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        self.scheme = self.make_scheme()
+
+    @override_settings(SCHEME_COUNTERS={'MODE': 'buffered', 'BACKEND': 'memory', 'FLUSH_THRESHOLD': 1000})
+    def test_views_are_flushed_in_batch(self):
+        for _ in range(3):
+            response = self.client.get(reverse('schemes-detail', args=[self.scheme.pk]))
+            self.assertEqual(response.status_code, 200)
+        self.scheme.refresh_from_db()
+        self.assertEqual(self.scheme.views_count, 0)
+
+        with self.assertNumQueries(1):
+            counters.flush()
+        self.scheme.refresh_from_db()
+        self.assertEqual(self.scheme.views_count, 3)
+
+    @override_settings(SCHEME_COUNTERS={'MODE': 'buffered', 'BACKEND': 'cache', 'FLUSH_THRESHOLD': 1000})
+    def test_cache_backend_flush_command(self):
+        other = self.make_scheme(title='Other')
+        counters.increment(self.scheme, 'views_count')
+        counters.increment(self.scheme, 'views_count')
+        counters.increment(other, 'views_count')
+
+        call_command('flush_counters', stdout=StringIO())
+
+        self.scheme.refresh_from_db()
+        other.refresh_from_db()
+        self.assertEqual((self.scheme.views_count, other.views_count), (2, 1))
+
+    def test_cache_buffer_journal_survives_concurrent_workers(self):
+        other = self.make_scheme(title='Other')
+        # Два воркера с общим кэшем: у каждого свой буфер, записи журнала не перетирают друг друга
+        first = counters.CacheCounterBuffer(flush_interval=3600, flush_threshold=1000)
+        second = counters.CacheCounterBuffer(flush_interval=3600, flush_threshold=1000)
+        first.add(EmbroideryScheme._meta.label, 'views_count', self.scheme.pk)
+        second.add(EmbroideryScheme._meta.label, 'views_count', other.pk)
+        second.add(EmbroideryScheme._meta.label, 'downloads_count', other.pk, 2)
+
+        # Номер выдан, но запись в журнал еще не сделана: сброс останавливается перед ним
+        cache.incr(first._sequence_key())
+        first.add(EmbroideryScheme._meta.label, 'views_count', other.pk)
+        # Обновлено три строки: просмотры двух схем и скачивания одной
+        self.assertEqual(first.flush(), 3)
+        self.scheme.refresh_from_db()
+        other.refresh_from_db()
+        self.assertEqual((self.scheme.views_count, other.views_count, other.downloads_count), (1, 2, 2))
+
+        # Следующий сброс пропускает так и не записанный номер и дочитывает журнал
+        self.assertEqual(second.flush(), 0)
+        self.assertEqual(cache.get(second._cursor_key())[0], cache.get(second._sequence_key()))
+
+    def test_failed_flush_keeps_deltas_for_next_flush(self):
+        for buffer in (
+            counters.InMemoryCounterBuffer(flush_interval=3600, flush_threshold=1000),
+            counters.CacheCounterBuffer(flush_interval=3600, flush_threshold=1000),
+        ):
+            with self.subTest(buffer=type(buffer).__name__):
+                EmbroideryScheme.objects.filter(pk=self.scheme.pk).update(views_count=0, downloads_count=0)
+                buffer.add(EmbroideryScheme._meta.label, 'views_count', self.scheme.pk, 2)
+                buffer.add(EmbroideryScheme._meta.label, 'downloads_count', self.scheme.pk)
+
+                with mock.patch.object(counters, 'write_deltas', side_effect=RuntimeError('db is down')):
+                    with self.assertRaises(RuntimeError):
+                        buffer.flush()
+                self.assertEqual(buffer.flush(), 2)
+                self.scheme.refresh_from_db()
+                self.assertEqual((self.scheme.views_count, self.scheme.downloads_count), (2, 1))
+
+    def test_sync_mode_updates_immediately(self):
+        self.client.get(reverse('schemes-detail', args=[self.scheme.pk]))
+        self.scheme.refresh_from_db()
+        self.assertEqual(self.scheme.views_count, 1)
+
+
+class PaginationModesTests(SchemeTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        for i in range(15):
+            self.make_scheme(title=f'Scheme {i}')
+
+    def test_cursor_pagination_walks_all_pages_without_count(self):
+        url = reverse('schemes-list') + '?pagination=cursor'
+        seen = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertNotIn('count', response.data)
+            seen.extend(row['id'] for row in response.data['results'])
+            url = response.data['next']
+        self.assertEqual(len(seen), 15)
+        self.assertEqual(len(set(seen)), 15)
+
+    def test_page_numbers_do_not_overlap_when_dates_tie(self):
+        EmbroideryScheme.objects.update(created_at=timezone.now())
+        url = reverse('schemes-list')
+        pages = [self.client.get(url, {'page': page}).data['results'] for page in (1, 2)]
+        ids = [row['id'] for page in pages for row in page]
+        self.assertEqual(ids, sorted(EmbroideryScheme.objects.values_list('id', flat=True), reverse=True))
+
+    def test_cursor_is_stable_when_scores_tie_and_change(self):
+        # Все оценки равны: порядок внутри страницы и курсор держатся на id
+        EmbroideryScheme.objects.update(trending_score=1.0)
+        url = reverse('schemes-list') + '?pagination=cursor&ordering=trending'
+        first = self.client.get(url).data
+        shown = [row['id'] for row in first['results']]
+        # Между запросами показанная схема поднимается, а непоказанная опускается
+        EmbroideryScheme.objects.filter(pk=shown[-1]).update(trending_score=2.0)
+        unseen = EmbroideryScheme.objects.exclude(pk__in=shown).order_by('-id').first()
+        EmbroideryScheme.objects.filter(pk=unseen.pk).update(trending_score=0.5)
+
+        second = self.client.get(first['next']).data
+        ids = [row['id'] for row in second['results']]
+        self.assertFalse(set(ids) & set(shown))
+        self.assertEqual(len(set(shown) | set(ids)), 15)
+        self.assertEqual(ids[-1], unseen.pk)
+
+        previous = self.client.get(second['previous']).data
+        self.assertEqual({row['id'] for row in previous['results']}, set(shown))
+
+    def test_page_number_without_count(self):
+        response = self.client.get(reverse('schemes-list'), {'count': 'none'})
+        self.assertIsNone(response.data['count'])
+        self.assertIsNotNone(response.data['next'])
+
+        response = self.client.get(reverse('schemes-list'), {'count': 'none', 'page': 2})
+        self.assertEqual(len(response.data['results']), 5)
+        self.assertIsNone(response.data['next'])
+        self.assertIsNotNone(response.data['previous'])
+
+
+class SchemeSearchTests(SchemeTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        self.roses = self.make_scheme(title='Красные розы', description='Букет в вазе')
+        self.roses.tags.add(Tag.objects.create(name='пионы', slug='piony'))
+        self.cat = self.make_scheme(title='Кот на окне', description='Рыжий кот и розами на подоконнике')
+        self.boat = self.make_scheme(title='Кораблик', category=None)
+
+    def search(self, query):
+        response = self.client.get(reverse('schemes-list'), {'search': query})
+        return [row['id'] for row in response.data['results']]
+
+    def test_search_uses_morphology_and_ranks_title_higher(self):
+        # "роза" находит и "розы" в названии, и "розами" в описании; название весомее
+        self.assertEqual(self.search('роза'), [self.roses.pk, self.cat.pk])
+
+    def test_search_covers_tags_category_and_author(self):
+        self.assertEqual(self.search('пион'), [self.roses.pk])
+        self.assertEqual(set(self.search('Цветы author')), {self.roses.pk, self.cat.pk})
+
+    def test_index_follows_updates_and_rebuild(self):
+        self.boat.title = 'Парусник'
+        self.boat.save()
+        self.assertEqual(self.search('парусник'), [self.boat.pk])
+
+        call_command('rebuild_search_index', stdout=StringIO())
+        self.assertEqual(self.search('кораблик'), [])
+        self.assertEqual(self.search('парусник'), [self.boat.pk])
+
+
+class SchemeFacetsTests(SchemeTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        other_category = Category.objects.create(name='Животные', slug='animals')
+        roses = Tag.objects.create(name='розы', slug='rozy')
+        for i in range(3):
+            self.make_scheme(title=f'Flower {i}', difficulty='EA').tags.add(roses)
+        self.make_scheme(title='Cat', category=other_category, difficulty='HA')
+        self.make_scheme(title='Hidden', visibility='PRI')
+
+    def test_facets_counts_with_fixed_query_count(self):
+        with self.assertNumQueries(4):
+            response = self.client.get(reverse('schemes-facets'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [(row['name'], row['count']) for row in response.data['category']],
+            [('Животные', 1), ('Цветы', 3)]
+        )
+        self.assertEqual(
+            [(row['value'], row['count']) for row in response.data['difficulty']],
+            [('easy', 3), ('hard', 1)]
+        )
+        self.assertEqual(response.data['tags'], [{'id': Tag.objects.get().pk, 'name': 'розы', 'count': 3}])
+
+        # Повторный запрос с тем же (но иначе записанным) набором фильтров берется из кэша
+        with self.assertNumQueries(0):
+            self.client.get(reverse('schemes-facets'), {'search': ''})
+
+    def test_facets_follow_catalog_cache(self):
+        self.client.get(reverse('schemes-facets'))
+        self.make_scheme(title='Flower 3', difficulty='EA')
+        response = self.client.get(reverse('schemes-facets'))
+        self.assertEqual(response.data['category'][1], {'id': self.category.pk, 'name': 'Цветы', 'count': 4})
+
+        with self.settings(CATALOG_CACHE={'ENABLED': False}):
+            with self.assertNumQueries(4):
+                self.client.get(reverse('schemes-facets'))
+
+    def test_facet_ignores_its_own_filter(self):
+        response = self.client.get(reverse('schemes-facets'), {'category': self.category.pk})
+        self.assertEqual(len(response.data['category']), 2)
+        self.assertEqual([row['count'] for row in response.data['difficulty']], [3])
+
+    def test_invalid_filters_rejected_like_list(self):
+        for params in ({'difficulty': 'bogus'}, {'category': 999999}, {'license': 'x'}):
+            with self.subTest(params=params):
+                response = self.client.get(reverse('schemes-facets'), params)
+                self.assertEqual(response.status_code, 400)
+                self.assertEqual(response.data, self.client.get(reverse('schemes-list'), params).data)
+
+
+class CatalogCacheTests(SchemeTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        self.scheme = self.make_scheme(title='Cached')
+
+    def test_anonymous_list_is_served_from_cache(self):
+        self.client.get(reverse('schemes-list'))
+        # Ответ из кэша, ETag — из версии пространства имен
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse('schemes-list'))
+        self.assertEqual(response.data['results'][0]['title'], 'Cached')
+
+    def test_save_invalidates_cached_list(self):
+        self.client.get(reverse('schemes-list'))
+        self.scheme.title = 'Renamed'
+        self.scheme.save()
+        response = self.client.get(reverse('schemes-list'))
+        self.assertEqual(response.data['results'][0]['title'], 'Renamed')
+
+    def test_category_rename_invalidates_scheme_list(self):
+        self.client.get(reverse('schemes-list'))
+        self.category.name = 'Растения'
+        self.category.save()
+        response = self.client.get(reverse('schemes-list'))
+        self.assertEqual(response.data['results'][0]['category'], 'Растения')
+
+    def test_counter_changes_invalidate_cached_list(self):
+        url = reverse('schemes-list')
+        self.client.get(url)
+
+        self.client.force_authenticate(self.reader)
+        self.client.put(reverse('schemes-like', args=[self.scheme.pk]))
+        self.client.post(reverse('scheme-comments-list', args=[self.scheme.pk]), {'text': 'Красиво'})
+        self.client.force_authenticate(None)
+
+        row = self.client.get(url).data['results'][0]
+        self.assertEqual((row['likes_count'], row['comments_count']), (1, 1))
+
+    def test_counter_flush_invalidates_cached_list(self):
+        url = reverse('schemes-list')
+        with self.settings(SCHEME_COUNTERS={'MODE': 'buffered', 'FLUSH_THRESHOLD': 1000}):
+            self.client.get(url)
+            counters.increment(self.scheme, 'views_count')
+            self.assertEqual(self.client.get(url).data['results'][0]['views_count'], 0)
+            counters.flush()
+        self.assertEqual(self.client.get(url).data['results'][0]['views_count'], 1)
+
+    def test_authenticated_user_gets_personal_fields_merged(self):
+        Like.objects.create(user=self.reader, scheme=self.scheme)
+        self.client.get(reverse('schemes-list'))
+
+        self.client.force_authenticate(self.reader)
+        # Лайки и избранное пользователя
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse('schemes-list'))
+        self.assertTrue(response.data['results'][0]['is_liked'])
+
+        self.client.force_authenticate(None)
+        response = self.client.get(reverse('schemes-list'))
+        self.assertFalse(response.data['results'][0]['is_liked'])
+
+    def test_list_without_user_fields_and_relations_endpoint(self):
+        other = self.make_scheme(title='Other')
+        Like.objects.create(user=self.reader, scheme=self.scheme)
+        self.client.get(reverse('schemes-list'))
+
+        self.client.force_authenticate(self.reader)
+        # Общий закэшированный ответ без персональных полей
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse('schemes-list'), {'user_fields': '0'})
+        self.assertNotIn('is_liked', response.data['results'][0])
+
+        url = reverse('schemes-relations')
+        with self.assertNumQueries(2):
+            response = self.client.get(url, {'ids': f'{self.scheme.pk},{other.pk}'})
+        self.assertEqual(response.data[str(self.scheme.pk)], {'is_liked': True, 'is_favorited': False})
+        # Повторный запрос берет множества из кэша процесса
+        with self.assertNumQueries(0):
+            self.client.get(url, {'ids': str(other.pk)})
+
+        # Действие favorite сбрасывает кэш пользователя
+        self.client.post(reverse('schemes-favorite', args=[other.pk]))
+        response = self.client.get(url, {'ids': str(other.pk)})
+        self.assertTrue(response.data[str(other.pk)]['is_favorited'])
+
+
+class ConditionalGetTests(SchemeTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        self.scheme = self.make_scheme()
+
+    def assert_revalidates(self, url, change):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        etag = response['ETag']
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        change()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_scheme_detail(self):
+        def like():
+            self.client.force_authenticate(self.reader)
+            self.client.post(reverse('schemes-like', args=[self.scheme.pk]))
+            self.client.force_authenticate(None)
+        self.assert_revalidates(reverse('schemes-detail', args=[self.scheme.pk]), like)
+
+    def test_not_modified_detail_still_counts_view(self):
+        url = reverse('schemes-detail', args=[self.scheme.pk])
+        etag = self.client.get(url)['ETag']
+        self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.scheme.refresh_from_db()
+        self.assertEqual(self.scheme.views_count, 2)
+
+    def test_scheme_list(self):
+        self.assert_revalidates(reverse('schemes-list'), lambda: self.make_scheme(title='New'))
+
+    def test_scheme_list_etag_matches_cached_body(self):
+        def like():
+            self.client.force_authenticate(self.reader)
+            self.client.put(reverse('schemes-like', args=[self.scheme.pk]))
+            self.client.force_authenticate(None)
+        url = reverse('schemes-list')
+        self.assert_revalidates(url, like)
+        # Новый ETag выдается вместе со свежим телом, а не со старым из кэша
+        self.assertEqual(self.client.get(url).data['results'][0]['likes_count'], 1)
+
+    def test_comments(self):
+        url = reverse('scheme-comments-list', kwargs={'scheme_pk': self.scheme.pk})
+        self.assert_revalidates(url, lambda: Comment.objects.create(scheme=self.scheme, author=self.reader, text='!'))
+
+    def test_user_profile(self):
+        def edit_profile():
+            self.author.profile.bio = 'Вышиваю крестиком'
+            self.author.profile.save()
+        self.assert_revalidates(reverse('users-detail', args=[self.author.username]), edit_profile)
+
+
+def make_image_file(name='photo.png', size=(1600, 900)):
+    buffer = BytesIO()
+    Image.new('RGBA', size, (200, 30, 30, 255)).save(buffer, format='PNG')
+    return SimpleUploadedFile(name, buffer.getvalue(), content_type='image/png')
+
+
+@override_settings(BACKGROUND_JOBS={'MODE': 'sync'})
+class ImageVariantsTests(MediaRootMixin, SchemeTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+
+    def test_variants_generated_on_upload_and_exposed(self):
+        scheme = self.make_scheme(main_image=make_image_file())
+        scheme.refresh_from_db()
+        card = scheme.main_image_variants['card']
+        self.assertEqual((card['width'], card['height']), (400, 225))
+        self.assertTrue(os.path.exists(os.path.join(self.media_root, card['webp'])))
+
+        response = self.client.get(reverse('schemes-list'))
+        thumbnails = response.data['results'][0]['main_image_thumbnails']
+        self.assertEqual(set(thumbnails), {'card', 'detail'})
+        self.assertTrue(thumbnails['card']['webp'].endswith('.card.webp'))
+
+    def test_backfill_command(self):
+        scheme = self.make_scheme(main_image=make_image_file())
+        broken = self.make_scheme(main_image=make_image_file())
+        EmbroideryScheme.objects.update(main_image_variants={})
+        version = get_version('schemes')
+
+        # Неожиданная ошибка одного файла попадает в отчет, остальные обрабатываются
+        save_variants = generate_thumbnails.Command.save_variants
+
+        def fail_for_broken(self, model_label, pk, variants):
+            if pk == broken.pk:
+                raise ValueError('boom')
+            save_variants(self, model_label, pk, variants)
+
+        errors = StringIO()
+        with mock.patch.object(generate_thumbnails.Command, 'save_variants', fail_for_broken):
+            call_command('generate_thumbnails', '--workers=1', stdout=StringIO(), stderr=errors)
+
+        scheme.refresh_from_db()
+        self.assertEqual(scheme.main_image_variants['source'], scheme.main_image.name)
+        self.assertIn(f'scheme #{broken.pk}: ValueError: boom', errors.getvalue())
+        # Варианты пишутся UPDATE без сигналов — кэш списков и ETag сбрасывает команда
+        self.assertGreater(get_version('schemes'), version)
+
+    def test_render_job_reports_bad_files(self):
+        name = default_storage.save('schemes/main_images/broken.png', ContentFile(b'not an image'))
+        self.assertEqual(render_job(('scheme', 1, name, MAIN_IMAGE_VARIANTS))[2], None)
+        # Процесс, запущенный через spawn, импортирует только api.images — без django.setup()
+        with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context('spawn')) as executor:
+            label, pk, variants, error = executor.submit(render_job, ('scheme', 1, 'missing.png', ('card',))).result()
+        self.assertEqual((label, pk, variants), ('scheme', 1, None))
+        self.assertTrue(error)
+
+
+class ChunkedUploadTests(MediaRootMixin, SchemeTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        self.client.force_authenticate(self.author)
+        self.payload = os.urandom(150 * 1024)
+
+    def upload(self, payload, checksum=None, filename='scheme.pdf'):
+        response = self.client.post(reverse('uploads-list'), {
+            'filename': filename, 'size': len(payload),
+            'checksum': checksum or hashlib.sha256(payload).hexdigest(),
+        }, format='json')
+        self.assertEqual(response.status_code, 201)
+        return response.data['id']
+
+    def put_chunk(self, upload_id, offset, chunk):
+        return self.client.put(
+            reverse('uploads-detail', args=[upload_id]) + f'?offset={offset}',
+            data=chunk, content_type='application/octet-stream'
+        )
+
+    def test_resume_complete_and_attach(self):
+        upload_id = self.upload(self.payload)
+        self.assertEqual(self.put_chunk(upload_id, 0, self.payload[:100000]).data['offset'], 100000)
+        # Повтор части с устаревшим смещением — 409 и актуальный offset для продолжения
+        response = self.put_chunk(upload_id, 0, self.payload[:100000])
+        self.assertEqual((response.status_code, response.data['offset']), (409, 100000))
+        self.put_chunk(upload_id, 100000, self.payload[100000:])
+
+        response = self.client.post(reverse('uploads-complete', args=[upload_id]))
+        self.assertEqual(response.data['status'], ChunkedUpload.Status.COMPLETE)
+
+        scheme = self.make_scheme()
+        response = self.client.post(
+            reverse('uploads-attach', args=[upload_id]), {'scheme': scheme.pk, 'kind': 'file'}, format='json'
+        )
+        self.assertEqual(response.status_code, 201)
+        scheme_file = SchemeFile.objects.get(scheme=scheme)
+        with scheme_file.file.open('rb') as stored:
+            self.assertEqual(stored.read(), self.payload)
+        self.assertFalse(os.listdir(os.path.join(self.media_root, 'uploads', 'tmp')))
+
+    def test_concurrent_chunk_with_same_offset_does_not_corrupt_file(self):
+        upload_id = self.upload(self.payload)
+        write_chunk = uploads.write_chunk
+        winner = self.payload[:1000]
+
+        def write_and_race(upload, stream, offset):
+            # Пока этот запрос пишет свою часть, другой запрос с тем же offset успевает первым
+            result = write_chunk(upload, stream, offset)
+            with mock.patch.object(uploads, 'write_chunk', write_chunk):
+                self.assertEqual(self.put_chunk(upload_id, 0, winner).status_code, 200)
+            return result
+
+        with mock.patch.object(uploads, 'write_chunk', write_and_race):
+            response = self.put_chunk(upload_id, 0, b'x' * 2000)
+        self.assertEqual((response.status_code, response.data['offset']), (409, 1000))
+        with open(uploads.temp_path(ChunkedUpload.objects.get(pk=upload_id)), 'rb') as part:
+            self.assertEqual(part.read(), winner)
+        self.assertEqual(os.listdir(os.path.join(self.media_root, 'uploads', 'tmp')), [f'{upload_id}.part'])
+
+    def test_checksum_mismatch_restarts_upload(self):
+        upload_id = self.upload(self.payload, checksum='0' * 64)
+        self.put_chunk(upload_id, 0, self.payload)
+        response = self.client.post(reverse('uploads-complete', args=[upload_id]))
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(ChunkedUpload.objects.get(pk=upload_id).offset, 0)
+
+    def test_create_scheme_from_upload(self):
+        upload_id = self.upload(self.payload)
+        self.put_chunk(upload_id, 0, self.payload)
+        self.client.post(reverse('uploads-complete', args=[upload_id]))
+
+        response = self.client.post(reverse('schemes-list'), {
+            'title': 'Big scheme', 'description': 'd', 'license': self.license.pk,
+            'difficulty': EmbroideryScheme.Difficulty.EASY, 'main_image': make_image_file(),
+            'file_upload': upload_id,
+        }, format='multipart')
+        self.assertEqual(response.status_code, 201, response.data)
+        self.assertEqual(SchemeFile.objects.get(scheme_id=response.data['id']).file.size, len(self.payload))
+        self.assertEqual(ChunkedUpload.objects.get(pk=upload_id).status, ChunkedUpload.Status.ATTACHED)
+
+    def test_filename_is_sanitized(self):
+        for filename in ('../../etc/passwd', '..', ' '):
+            response = self.client.post(reverse('uploads-list'), {
+                'filename': filename, 'size': 10,
+            }, format='json')
+            self.assertEqual(response.status_code, 400, filename)
+            self.assertIn('filename', response.data)
+        upload_id = self.upload(self.payload, filename='my <scheme>.pdf')
+        self.assertEqual(ChunkedUpload.objects.get(pk=upload_id).filename, 'my_scheme.pdf')
+
+    def complete_upload(self, payload, filename):
+        upload_id = self.upload(payload, filename=filename)
+        self.put_chunk(upload_id, 0, payload)
+        self.client.post(reverse('uploads-complete', args=[upload_id]))
+        return upload_id
+
+    def test_only_real_images_attach_as_images(self):
+        scheme = self.make_scheme()
+        html = b'<html><script>alert(1)</script></html>'
+        fake_png = self.complete_upload(html, 'photo.png')
+        svg = self.complete_upload(b'<svg xmlns="http://www.w3.org/2000/svg"/>', 'photo.svg')
+        for upload_id in (fake_png, svg):
+            response = self.client.post(reverse('uploads-attach', args=[upload_id]), {'scheme': scheme.pk, 'kind': 'image'}, format='json')
+            self.assertEqual(response.status_code, 400)
+            self.assertEqual(ChunkedUpload.objects.get(pk=upload_id).status, ChunkedUpload.Status.COMPLETE)
+
+        # Тот же путь при создании схемы
+        response = self.client.post(reverse('schemes-list'), {
+            'title': 'XSS', 'description': 'd', 'license': self.license.pk,
+            'difficulty': EmbroideryScheme.Difficulty.EASY, 'main_image': make_image_file(),
+            'file_scheme': SimpleUploadedFile('s.pdf', b'pdf'), 'gallery_uploads': [fake_png],
+        }, format='multipart')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('gallery_uploads', response.data)
+        self.assertFalse(SchemeImage.objects.exists())
+
+        image = self.complete_upload(make_image_file().read(), 'photo.png')
+        response = self.client.post(reverse('uploads-attach', args=[image]), {'scheme': scheme.pk, 'kind': 'image'}, format='json')
+        self.assertEqual(response.status_code, 201, response.data)
+        self.assertTrue(SchemeImage.objects.get(scheme=scheme).image.name.endswith('.png'))
+
+
+class FileDeliveryTests(MediaRootMixin, SchemeTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        self.scheme = self.make_scheme()
+        self.file = SchemeFile.objects.create(
+            scheme=self.scheme, file=SimpleUploadedFile('scheme.pdf', b'0123456789' * 100)
+        )
+        self.url = reverse('schemes-download-file', args=[self.scheme.pk, self.file.pk])
+
+    def test_range_request(self):
+        response = self.client.get(self.url, HTTP_RANGE='bytes=10-19')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], 'bytes 10-19/1000')
+        self.assertEqual(b''.join(response.streaming_content), b'0123456789')
+        # Докачка не увеличивает счетчик скачиваний
+        self.file.refresh_from_db()
+        self.assertEqual(self.file.downloads_count, 0)
+
+        # If-Range с устаревшим ETag — отдаем файл целиком
+        response = self.client.get(self.url, HTTP_RANGE='bytes=10-19', HTTP_IF_RANGE='"stale"')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(b''.join(response.streaming_content)), 1000)
+        self.file.refresh_from_db()
+        self.assertEqual(self.file.downloads_count, 1)
+
+    @override_settings(FILE_DELIVERY={'BACKEND': 'x-accel', 'ACCEL_PREFIX': '/protected-media/'})
+    def test_x_accel_redirect_and_private_scheme(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response['X-Accel-Redirect'], '/protected-media/' + self.file.file.name)
+
+        EmbroideryScheme.objects.filter(pk=self.scheme.pk).update(visibility=EmbroideryScheme.Visibility.PRIVATE)
+        self.assertEqual(self.client.get(self.url).status_code, 404)
+        self.client.force_authenticate(self.author)
+        self.assertEqual(self.client.get(self.url).status_code, 200)
+
+
+# Обработка после сохранения (похожие схемы и т.п.) уходит в очередь и не влияет на число запросов
+@override_settings(BACKGROUND_JOBS={'MODE': 'database'})
+class BulkTagResolutionTests(MediaRootMixin, SchemeTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        self.client.force_authenticate(self.author)
+        Tag.objects.create(name='Пионы', slug='piony')
+
+    def create_scheme(self, tags_str):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(reverse('schemes-list'), {
+                'title': 'Scheme', 'description': 'd', 'license': self.license.pk,
+                'difficulty': EmbroideryScheme.Difficulty.EASY, 'tags_str': tags_str,
+                'main_image': make_image_file(size=(40, 30)),
+                'file_scheme': SimpleUploadedFile('scheme.pdf', b'%PDF'),
+            }, format='multipart')
+        self.assertEqual(response.status_code, 201, response.data)
+        return response, len(queries)
+
+    def test_tags_resolved_case_insensitively(self):
+        response, _ = self.create_scheme('пионы,  ПИОНЫ , Розы')
+        scheme = EmbroideryScheme.objects.get(pk=response.data['id'])
+        self.assertEqual(sorted(scheme.tags.values_list('name', flat=True)), ['Пионы', 'Розы'])
+        self.assertEqual(Tag.objects.count(), 2)
+
+    def test_query_count_does_not_depend_on_tag_count(self):
+        _, few = self.create_scheme('a1, a2')
+        _, many = self.create_scheme('b1, b2, b3, b4, b5, b6, Пионы')
+        self.assertEqual(few, many)
+
+
+class SchemeTransferCommandsTests(SchemeTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.workdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.workdir, ignore_errors=True)
+        self.media_root = os.path.join(self.workdir, 'media')
+        override = override_settings(MEDIA_ROOT=self.media_root)
+        override.enable()
+        self.addCleanup(override.disable)
+
+    def test_export_import_round_trip(self):
+        for fmt in ('jsonl', 'csv'):
+            with self.subTest(fmt=fmt):
+                EmbroideryScheme.objects.all().delete()
+                scheme = self.make_scheme(title='Пионы', visibility=EmbroideryScheme.Visibility.UNLISTED)
+                scheme.tags.set([Tag.objects.create(name=f'Цветы {fmt}', slug=f'flowers-{fmt}')])
+                SchemeFile.objects.create(scheme=scheme, file=SimpleUploadedFile('scheme.pdf', b'%PDF'))
+
+                path = os.path.join(self.workdir, f'schemes.{fmt}')
+                media_dir = os.path.join(self.workdir, f'export-{fmt}')
+                call_command('export_schemes', path, '--media-dir', media_dir, stdout=StringIO())
+                EmbroideryScheme.objects.all().delete()
+
+                call_command('import_schemes', path, '--media-dir', media_dir, '--batch-size', '1', stdout=StringIO())
+                imported = EmbroideryScheme.objects.get()
+                self.assertEqual(
+                    (imported.title, imported.author, imported.category, imported.visibility),
+                    ('Пионы', self.author, self.category, EmbroideryScheme.Visibility.UNLISTED)
+                )
+                self.assertEqual(list(imported.tags.values_list('name', flat=True)), [f'Цветы {fmt}'])
+                with imported.files.get().file.open('rb') as stored:
+                    self.assertEqual(stored.read(), b'%PDF')
+
+    def test_import_skips_invalid_rows_and_removes_files_of_failed_batch(self):
+        media_dir = os.path.join(self.workdir, 'export')
+        os.makedirs(os.path.join(media_dir, 'schemes', 'files'))
+        with open(os.path.join(media_dir, 'schemes', 'files', 'scheme.pdf'), 'wb') as source:
+            source.write(b'%PDF')
+        record = {'author': 'author', 'license': 'TL', 'files': ['schemes/files/scheme.pdf']}
+        path = os.path.join(self.workdir, 'schemes.jsonl')
+        with open(path, 'w', encoding='utf-8') as stream:
+            for extra in ({'title': 'Ok'}, {'title': 'Secret', 'visibility': 'SECRET'},
+                          {'title': 'Hard', 'difficulty': 'hard'}):
+                stream.write(json.dumps({**record, **extra}) + '\n')
+
+        errors = StringIO()
+        call_command('import_schemes', path, '--media-dir', media_dir, stdout=StringIO(), stderr=errors)
+        self.assertEqual(list(EmbroideryScheme.objects.values_list('title', flat=True)), ['Ok'])
+        self.assertIn("visibility='SECRET'", errors.getvalue())
+        self.assertIn("difficulty='hard'", errors.getvalue())
+
+        # Пачка откатилась — скопированные для нее файлы удалены
+        stored_files = os.path.join(self.media_root, 'schemes', 'files')
+        self.assertEqual(len(os.listdir(stored_files)), 1)
+        with mock.patch('api.management.commands.import_schemes.index_schemes', side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                call_command('import_schemes', path, '--media-dir', media_dir, stdout=StringIO(), stderr=StringIO())
+        self.assertEqual(EmbroideryScheme.objects.count(), 1)
+        self.assertEqual(len(os.listdir(stored_files)), 1)
+
+
+class QueryPlanTests(SchemeTestMixin, TestCase):
+    """Основные запросы каталога должны идти по индексам и без отдельной сортировки."""
+
+    def assertUsesIndex(self, queryset, index_name):
+        plan = queryset.explain()
+        self.assertIn(f'USING INDEX {index_name}', plan.replace('COVERING INDEX', 'INDEX'))
+        self.assertNotIn('USE TEMP B-TREE FOR ORDER BY', plan)
+
+    def setUp(self):
+        super().setUp()
+        if connection.vendor != 'sqlite':
+            self.skipTest('Формат EXPLAIN QUERY PLAN проверяется только для SQLite')
+        self.schemes = EmbroideryScheme.objects.select_related(
+            'author__profile', 'category', 'license'
+        ).with_list_stats(self.reader)
+
+    def test_catalog_list(self):
+        public = self.schemes.filter(visibility=EmbroideryScheme.Visibility.PUBLIC)
+        self.assertUsesIndex(public.order_by('-created_at', '-id')[:20], 'api_scheme_vis_created_idx')
+        self.assertUsesIndex(public.filter(category=self.category)[:20], 'api_scheme_pub_category_idx')
+        self.assertUsesIndex(public.filter(difficulty='EA')[:20], 'api_scheme_pub_difficulty_idx')
+        self.assertUsesIndex(public.filter(license=self.license)[:20], 'api_scheme_pub_license_idx')
+        self.assertUsesIndex(self.schemes.filter(author=self.author), 'api_scheme_author_created_idx')
+
+    def test_catalog_orderings(self):
+        public = self.schemes.filter(visibility=EmbroideryScheme.Visibility.PUBLIC)
+        indexes = {
+            'trending': 'api_scheme_vis_trending_idx',
+            'popular': 'api_scheme_vis_popular_idx',
+            'most_downloaded': 'api_scheme_vis_downloads_idx',
+        }
+        for ordering, index_name in indexes.items():
+            with self.subTest(ordering=ordering):
+                self.assertUsesIndex(public.order_by(*ORDERINGS[ordering])[:20], index_name)
+
+    def test_comments_and_likes(self):
+        self.assertUsesIndex(
+            Comment.objects.filter(scheme_id=1).order_by('created_at', 'id')[:20], 'api_comment_scheme_created_idx'
+        )
+        self.assertUsesIndex(Like.objects.filter(scheme_id=1, user=self.reader), 'api_like_user_id_scheme_id')
+        root = Comment(scheme_id=1, path='0000000001')
+        self.assertUsesIndex(Comment.objects.descendants_of(root)[:20], 'api_comment_scheme_path_idx')
+
+
+class SQLitePragmasTests(SimpleTestCase):
+    @override_settings(SQLITE_PRAGMAS={'journal_mode': 'WAL', 'synchronous': 'NORMAL', 'busy_timeout': 1234})
+    def test_pragmas_applied_on_new_connection(self):
+        from django.db.backends.sqlite3.base import DatabaseWrapper
+
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        settings_dict = {**connection.settings_dict, 'ENGINE': 'django.db.backends.sqlite3',
+                         'NAME': os.path.join(directory, 'db.sqlite3'), 'OPTIONS': {}}
+        wrapper = DatabaseWrapper(settings_dict, alias='pragmas-test')
+        self.addCleanup(wrapper.close)
+        with wrapper.cursor() as cursor:
+            cursor.execute('PRAGMA journal_mode')
+            self.assertEqual(cursor.fetchone()[0], 'wal')
+            cursor.execute('PRAGMA synchronous')
+            self.assertEqual(cursor.fetchone()[0], 1)
+            cursor.execute('PRAGMA busy_timeout')
+            self.assertEqual(cursor.fetchone()[0], 1234)
+
+
+@override_settings(REPLICA_ROUTING={'REPLICAS': ['replica'], 'STICKY_SECONDS': 10, 'COOKIE_NAME': 'db_primary'})
+class ReplicaRoutingTests(SimpleTestCase):
+    # SimpleTestCase: внутри транзакции TestCase роутер всегда выбирает основную базу
+    def setUp(self):
+        from .db import PrimaryReplicaRouter
+
+        cache.clear()
+        self.router = PrimaryReplicaRouter()
+        self.factory = RequestFactory()
+        self.reader, self.author = User(pk=1, username='reader'), User(pk=2, username='author')
+
+    def route(self, request, user=None):
+        """Прогоняет запрос через middleware и возвращает базу, выбранную для чтения внутри "view"."""
+        from .db import ReplicaRoutingMiddleware
+
+        decisions = []
+
+        def view(request):
+            if user is not None:
+                request.user = user  # как после аутентификации DRF
+            decisions.append(self.router.db_for_read(EmbroideryScheme))
+            return HttpResponse()
+
+        response = ReplicaRoutingMiddleware(view)(request)
+        return decisions[0], response
+
+    def test_reads_go_to_replica_until_user_writes(self):
+        self.assertEqual(self.route(self.factory.get('/api/v1/schemes/'))[0], 'replica')
+
+        db, response = self.route(self.factory.patch('/api/v1/users/me/'), user=self.reader)
+        self.assertEqual(db, 'default')
+        self.assertIn('db_primary', response.cookies)
+
+        # Тот же пользователь без cookie (JWT) — тоже с основной базы, другой — с реплики
+        self.assertEqual(self.route(self.factory.get('/api/v1/schemes/'), user=self.reader)[0], 'default')
+        self.assertEqual(self.route(self.factory.get('/api/v1/schemes/'), user=self.author)[0], 'replica')
+
+        request = self.factory.get('/api/v1/schemes/')
+        request.COOKIES['db_primary'] = '1'
+        self.assertEqual(self.route(request)[0], 'default')
+
+    def test_writes_and_migrations_stay_on_primary(self):
+        self.assertEqual(self.router.db_for_write(EmbroideryScheme), 'default')
+        self.assertIs(self.router.allow_migrate('replica', 'api'), False)
+        self.assertIsNone(self.router.db_for_read(Group))
+
+
+class AsyncReadViewsTests(SchemeTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.scheme = self.make_scheme(title='Async')
+        Comment.objects.create(scheme=self.scheme, author=self.reader, text='Nice')
+        self.make_scheme(title='Hidden', visibility=EmbroideryScheme.Visibility.PRIVATE)
+
+    def test_async_responses_match_sync_ones(self):
+        client = APIClient()
+        self.make_scheme(title='Older')
+        Like.objects.create(user=self.reader, scheme=self.scheme)
+        list_url = reverse('schemes-list')
+        for async_url, sync_url in (
+            (reverse('async-schemes-list'), list_url),
+            (reverse('async-schemes-list') + '?pagination=cursor', list_url + '?pagination=cursor'),
+            (reverse('async-schemes-list') + '?ordering=popular&count=none',
+             list_url + '?ordering=popular&count=none'),
+            (reverse('async-schemes-list') + '?user_fields=0', list_url + '?user_fields=0'),
+            (reverse('async-schemes-detail', args=[self.scheme.pk]), reverse('schemes-detail', args=[self.scheme.pk])),
+            (reverse('async-scheme-comments', args=[self.scheme.pk]),
+             reverse('scheme-comments-list', args=[self.scheme.pk])),
+            (reverse('async-users-detail', args=['author']), reverse('users-detail', args=['author'])),
+            (reverse('async-users-detail', args=['author']) + '?schemes=0',
+             reverse('users-detail', args=['author']) + '?schemes=0'),
+        ):
+            for user in (None, self.reader):
+                with self.subTest(url=async_url, user=user):
+                    client.force_authenticate(user)
+                    # Асинхронные view принимают только JWT, как и DRF-эндпоинты
+                    headers = {'HTTP_AUTHORIZATION': f'Bearer {AccessToken.for_user(user)}'} if user else {}
+                    response = self.client.get(async_url, **headers)
+                    self.assertEqual(response.status_code, 200)
+                    expected = client.get(sync_url)
+                    # Счетчик просмотров вырос на запрос к асинхронной версии
+                    self.assertEqual(response.json(), expected.json() | (
+                        {'views_count': response.json()['views_count']} if 'views_count' in expected.json() else {}
+                    ))
+                    self.assertEqual(response.get('ETag'), expected.get('ETag'))
+
+    def test_async_errors_and_conditional_requests_match_sync_ones(self):
+        hidden = EmbroideryScheme.objects.get(title='Hidden')
+        client = APIClient()
+        for async_url, sync_url, status_code in (
+            (reverse('async-schemes-list') + '?difficulty=bogus', reverse('schemes-list') + '?difficulty=bogus', 400),
+            (reverse('async-schemes-list') + '?cursor=bogus', reverse('schemes-list') + '?cursor=bogus', 404),
+            (reverse('async-schemes-list') + '?page=9', reverse('schemes-list') + '?page=9', 404),
+            (reverse('async-schemes-detail', args=[hidden.pk]), reverse('schemes-detail', args=[hidden.pk]), 404),
+        ):
+            with self.subTest(url=async_url):
+                response, expected = self.client.get(async_url), client.get(sync_url)
+                self.assertEqual((response.status_code, expected.status_code), (status_code, status_code))
+                self.assertEqual(response.json(), expected.json())
+
+        for url in (reverse('async-schemes-list'), reverse('async-schemes-detail', args=[self.scheme.pk])):
+            with self.subTest(url=url):
+                etag = self.client.get(url)['ETag']
+                self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+    def test_detail_counts_view_and_hides_private(self):
+        response = self.client.get(reverse('async-schemes-detail', args=[self.scheme.pk]))
+        self.assertEqual(response.json()['title'], 'Async')
+        self.scheme.refresh_from_db()
+        self.assertEqual(self.scheme.views_count, 1)
+        hidden = EmbroideryScheme.objects.get(title='Hidden')
+        self.assertEqual(self.client.get(reverse('async-schemes-detail', args=[hidden.pk])).status_code, 404)
+
+
+@override_settings(BACKGROUND_JOBS={'MODE': 'database', 'MAX_ATTEMPTS': 2, 'RETRY_DELAY': 0})
+class BackgroundJobsTests(MediaRootMixin, SchemeTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        self.scheme = self.make_scheme()
+        self.url = reverse('schemes-detail', args=[self.scheme.pk])
+
+    def test_uploads_processed_by_worker(self):
+        SchemeFile.objects.create(scheme=self.scheme, file=SimpleUploadedFile('pattern.bin', b'%PDF-1.4\n'))
+        SchemeImage.objects.create(scheme=self.scheme, image=make_image_file())
+
+        response = self.client.get(self.url)
+        self.assertEqual(response.data['processing'], {'status': 'pending', 'pending': 2, 'failed': 0})
+        self.assertEqual(response.data['images'][0]['image_variants'], {})
+
+        call_command('run_jobs', '--once', stdout=StringIO())
+
+        response = self.client.get(self.url)
+        self.assertEqual(response.data['processing']['status'], 'done')
+        self.assertEqual(response.data['files'][0]['get_file_type_display'], 'PDF Document')
+        self.assertIn('card', response.data['images'][0]['image_variants'])
+
+    def test_main_image_variants_are_queued(self):
+        self.scheme.main_image = make_image_file()
+        self.scheme.save()
+        self.assertEqual(self.client.get(self.url).data['main_image_thumbnails'], {})
+
+        call_command('run_jobs', '--once', stdout=StringIO())
+
+        response = self.client.get(self.url)
+        self.assertEqual(response.data['processing']['status'], 'done')
+        self.assertEqual(set(response.data['main_image_thumbnails']), {'card', 'detail'})
+
+    def test_failed_job_is_retried_then_marked_failed(self):
+        SchemeFile.objects.create(scheme=self.scheme, file='schemes/files/missing.pdf')
+
+        with self.assertLogs('api.jobs', 'ERROR'):
+            call_command('run_jobs', '--once', stdout=StringIO())
+
+        job = Job.objects.get(scheme=self.scheme)
+        self.assertEqual((job.status, job.attempts), (Job.Status.FAILED, 2))
+        self.assertIn('FileNotFoundError', job.last_error)
+        self.assertEqual(self.client.get(self.url).data['processing']['status'], 'failed')
+
+
+class SchemeRankingTests(SchemeTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        self.old_hit = self.make_scheme(title='Old hit', likes_count=20, views_count=100)
+        self.rising = self.make_scheme(title='Rising', likes_count=2)
+        self.downloaded = self.make_scheme(title='Downloaded', downloads_count=40)
+
+    def titles(self, ordering, **params):
+        response = self.client.get(reverse('schemes-list'), {'ordering': ordering, **params})
+        self.assertEqual(response.status_code, 200)
+        return [row['title'] for row in response.data['results']]
+
+    def test_orderings(self):
+        now = timezone.now()
+        update_scores(now=now - timedelta(days=10))
+        self.assertEqual(self.titles('popular'), ['Old hit', 'Downloaded', 'Rising'])
+        self.assertEqual(self.titles('most_downloaded')[0], 'Downloaded')
+        self.assertEqual(self.titles('newest')[0], 'Downloaded')
+
+        # Через 10 дней (5 периодов полураспада) старая активность почти забыта,
+        # а свежие лайки выводят схему в тренд, не меняя общий рейтинг
+        EmbroideryScheme.objects.filter(pk=self.rising.pk).adjust_counters(likes_count=50)
+        update_scores(now=now)
+        self.assertEqual(self.titles('trending')[0], 'Rising')
+        self.assertEqual(self.titles('popular')[0], 'Rising')
+        self.old_hit.refresh_from_db()
+        self.assertAlmostEqual(self.old_hit.trending_score, 200 / 32)
+
+        # Курсорная пагинация листает в том же порядке
+        response = self.client.get(reverse('schemes-list'), {'ordering': 'trending', 'pagination': 'cursor'})
+        self.assertEqual(response.data['results'][0]['title'], 'Rising')
+
+    def test_unknown_ordering_is_rejected(self):
+        response = self.client.get(reverse('schemes-list'), {'ordering': 'random'})
+        self.assertEqual(response.status_code, 400)
+
+
+class SimilarSchemesTests(SchemeTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        roses = Tag.objects.create(name='Розы', slug='roses')
+        peonies = Tag.objects.create(name='Пионы', slug='peonies')
+        other_category = Category.objects.create(name='Пейзажи', slug='landscapes')
+        size = {'size_stitches_width': 100, 'size_stitches_height': 120, 'number_of_colors': 12}
+        self.base = self.make_scheme(title='Base', **size)
+        self.close = self.make_scheme(title='Close', **size)
+        self.middle = self.make_scheme(title='Middle', difficulty=EmbroideryScheme.Difficulty.EASY)
+        self.far = self.make_scheme(
+            title='Far', category=other_category, difficulty=EmbroideryScheme.Difficulty.EXPERT,
+            size_stitches_width=900, size_stitches_height=900, number_of_colors=80
+        )
+        self.hidden = self.make_scheme(title='Hidden', visibility=EmbroideryScheme.Visibility.PRIVATE, **size)
+        for scheme in (self.base, self.close, self.hidden):
+            scheme.tags.add(roses, peonies)
+        self.url = reverse('schemes-similar', args=[self.base.pk])
+
+    def titles(self):
+        return [row['title'] for row in self.client.get(self.url).data]
+
+    def test_rebuild_and_endpoint(self):
+        call_command('build_similar_schemes', stdout=StringIO())
+        # Сам объект, соседи по индексу, схемы и их теги
+        with self.assertNumQueries(4):
+            response = self.client.get(self.url)
+        self.assertEqual([row['title'] for row in response.data], ['Close', 'Middle', 'Far'])
+        self.assertEqual(SimilarScheme.objects.filter(similar=self.hidden).count(), 0)
+
+    @override_settings(SIMILAR_SCHEMES={'K': 2})
+    def test_incremental_update(self):
+        call_command('build_similar_schemes', stdout=StringIO())
+        self.assertEqual(self.titles(), ['Close', 'Middle'])
+
+        self.close.visibility = EmbroideryScheme.Visibility.PRIVATE
+        self.close.save()
+        # Освободившееся место в списке занимает следующий по сходству
+        self.assertEqual(self.titles(), ['Middle', 'Far'])
+
+        self.far.category = self.category
+        self.far.save()
+        self.far.tags.add(*self.base.tags.all())
+        self.assertEqual(self.titles()[0], 'Far')
+        # Ни один список не длиннее K
+        self.assertLessEqual(
+            max(SimilarScheme.objects.values('scheme').annotate(n=Count('pk')).values_list('n', flat=True)), 2
+        )
+
+    @override_settings(SIMILAR_SCHEMES={'K': 2})
+    def test_incremental_update_matches_rebuild(self):
+        call_command('build_similar_schemes', stdout=StringIO())
+        self.far.category = self.category
+        self.far.save()
+        self.middle.tags.add(*self.base.tags.all())
+        incremental = set(SimilarScheme.objects.values_list('scheme', 'similar'))
+        call_command('build_similar_schemes', stdout=StringIO())
+        self.assertEqual(incremental, set(SimilarScheme.objects.values_list('scheme', 'similar')))
+
+    @override_settings(BACKGROUND_JOBS={'MODE': 'database'})
+    def test_changes_are_debounced_into_one_job(self):
+        self.base.title = 'Renamed'
+        self.base.save()
+        self.base.tags.clear()
+        self.base.save(update_fields=['views_count'])
+        self.assertEqual(Job.objects.filter(name='scheme.similar', args=[self.base.pk]).count(), 1)
+
+    def test_cached_rows_match_rebuilt_ones(self):
+        weights = similarity.get_similarity_settings()['WEIGHTS']
+        scorer = similarity.Scorer(similarity.load_features(), weights)
+        # Строки кэша, обновленные на месте, дают то же, что и построенные заново
+        self.middle.tags.add(*self.base.tags.all())
+        scorer.set_row(*similarity.load_scheme(self.middle.pk))
+        scorer.remove(self.close.pk)
+        scorer.set_row(*similarity.load_scheme(self.close.pk))
+        rebuilt = similarity.Scorer(similarity.load_features(), weights)
+        self.assertCountEqual(scorer.features.ids, rebuilt.features.ids)
+
+        def by_id(current):
+            ids = current.features.ids
+            scores = current.score_rows(list(range(len(ids))))
+            return {(a, b): scores[i, j] for i, a in enumerate(ids) for j, b in enumerate(ids)}
+
+        expected = by_id(rebuilt)
+        for pair, value in by_id(scorer).items():
+            self.assertAlmostEqual(value, expected[pair])
+
+
+class PersonalFeedTests(SchemeTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        self.url = reverse('users-feed')
+        self.first, self.second, self.third, self.fourth = (
+            self.make_scheme(title=title) for title in ('First', 'Second', 'Third', 'Fourth')
+        )
+        self.fan = User.objects.create_user(email='fan@example.com', username='fan', password='pass12345')
+        self.collector = User.objects.create_user(
+            email='collector@example.com', username='collector', password='pass12345'
+        )
+        Like.objects.create(user=self.reader, scheme=self.first)
+        Like.objects.create(user=self.fan, scheme=self.first)
+        Like.objects.create(user=self.fan, scheme=self.second)
+        self.first.favorited_by.add(self.collector)
+        self.third.favorited_by.add(self.collector)
+
+    def feed(self, user):
+        self.client.force_authenticate(user)
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        return response.data['source'], [row['title'] for row in response.data['results']]
+
+    def test_build_and_read_feed(self):
+        out = StringIO()
+        call_command('build_feed', stdout=out)
+        self.assertIn('Пиковая память', out.getvalue())
+
+        # Избранное весит больше лайка: Third ближе к First, чем Second
+        self.client.force_authenticate(self.reader)
+        with self.assertNumQueries(3):
+            response = self.client.get(self.url)
+        self.assertEqual(response.data['source'], 'personal')
+        self.assertEqual([row['title'] for row in response.data['results']], ['Third', 'Second'])
+        self.assertTrue(all(not row['is_liked'] for row in response.data['results']))
+
+        # Уже отмеченное в ленту не попадает
+        source, titles = self.feed(self.fan)
+        self.assertEqual((source, titles), ('personal', ['Third']))
+
+    def test_fallback_to_trending_and_stale_rows(self):
+        EmbroideryScheme.objects.filter(pk=self.fourth.pk).update(trending_score=10)
+        call_command('build_feed', stdout=StringIO())
+        outsider = User.objects.create_user(email='new@example.com', username='new', password='pass12345')
+        source, titles = self.feed(outsider)
+        self.assertEqual((source, titles[0]), ('trending', 'Fourth'))
+
+        # Пользователь без лайков после пересчета теряет рекомендации
+        Like.objects.filter(user=self.reader).delete()
+        call_command('build_feed', stdout=StringIO())
+        self.assertFalse(Recommendation.objects.filter(user=self.reader).exists())
+        self.assertEqual(self.feed(self.reader)[0], 'trending')
+
+    @override_settings(FEED={'CHUNK_SIZE': 2, 'NEIGHBORS': 3})
+    def test_sparse_engine_matches_python_engine(self):
+        # Побольше взаимодействий, чтобы блоки и обрезка соседей что-то решали
+        extra = [self.make_scheme(title=f'Extra {n}') for n in range(4)]
+        schemes = [self.first, self.second, self.third, self.fourth, *extra]
+        for n in range(6):
+            user = User.objects.create_user(email=f'u{n}@example.com', username=f'u{n}', password='pass12345')
+            for k, scheme in enumerate(schemes):
+                if (n + 1) * (k + 2) % 3 == 0:
+                    Like.objects.create(user=user, scheme=scheme)
+                if (n + k) % 4 == 0:
+                    scheme.favorited_by.add(user)
+
+        def build(engine):
+            with mock.patch.object(feed, 'get_engine', engine):
+                stats = feed.build_feed()
+            rows = Recommendation.objects.order_by('user_id', '-score', 'scheme_id')
+            return stats['engine'], list(rows.values_list('user_id', 'scheme_id', 'score'))
+
+        sparse_engine, sparse_rows = build(feed._SparseEngine)
+        python_engine, python_rows = build(feed._PythonEngine)
+        self.assertEqual((sparse_engine, python_engine), ('scipy', 'python'))
+        self.assertGreater(len(sparse_rows), 10)
+        self.assertEqual([row[:2] for row in sparse_rows], [row[:2] for row in python_rows])
+        for (*_, sparse_score), (*_, python_score) in zip(sparse_rows, python_rows):
+            self.assertAlmostEqual(sparse_score, python_score, places=9)
+
+    def test_feed_requires_authentication(self):
+        self.assertEqual(self.client.get(self.url).status_code, 401)
+
+
+class CommentThreadTests(SchemeTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        self.client.force_authenticate(self.reader)
+        self.scheme = self.make_scheme()
+        self.url = reverse('scheme-comments-list', kwargs={'scheme_pk': self.scheme.pk})
+
+    def post(self, text, parent=None):
+        response = self.client.post(self.url, {'text': text, 'parent': parent.pk if parent else ''})
+        self.assertEqual(response.status_code, 201, response.data)
+        return Comment.objects.get(pk=response.data['id'])
+
+    def add_thread(self, replies):
+        root = self.post('Вопрос')
+        parent = root
+        for number in range(replies):
+            username = f'user{root.pk}-{number}'
+            author = User.objects.create_user(email=f'{username}@example.com', username=username, password='pass12345')
+            parent = Comment.objects.create(scheme=self.scheme, author=author, parent=parent, text=str(number))
+        return root
+
+    def test_replies_form_tree(self):
+        root = self.post('Вопрос')
+        answer = self.post('Ответ', parent=root)
+        nested = self.post('Уточнение', parent=answer)
+        second = self.post('Еще ответ', parent=root)
+        self.assertEqual(nested.path, f'{root.pk:010d}.{answer.pk:010d}.{nested.pk:010d}')
+
+        response = self.client.get(self.url)
+        self.assertEqual([(row['id'], row['replies_count']) for row in response.data['results']], [(root.pk, 3)])
+
+        response = self.client.get(reverse('scheme-comments-replies', args=[self.scheme.pk, root.pk]))
+        self.assertEqual(
+            [(row['id'], row['depth']) for row in response.data['results']],
+            [(answer.pk, 1), (nested.pk, 2), (second.pk, 1)]
+        )
+
+        # Удаление ветки уменьшает счетчик схемы на все удаленные комментарии
+        self.client.delete(reverse('scheme-comments-detail', args=[self.scheme.pk, answer.pk]))
+        self.scheme.refresh_from_db()
+        self.assertEqual(self.scheme.comments_count, 2)
+
+    def test_reply_to_other_scheme_is_rejected(self):
+        other = Comment.objects.create(scheme=self.make_scheme(), author=self.author, text='Чужая')
+        response = self.client.post(self.url, {'text': 'Ответ', 'parent': other.pk})
+        self.assertEqual(response.status_code, 400)
+
+    @override_settings(CATALOG_CACHE={'ENABLED': False})
+    def test_query_count_does_not_depend_on_thread_size(self):
+        root = self.add_thread(replies=2)
+        replies_url = reverse('scheme-comments-replies', args=[self.scheme.pk, root.pk])
+        counts = []
+        for url in (self.url, replies_url):
+            with CaptureQueriesContext(connection) as queries:
+                self.client.get(url)
+            counts.append(len(queries))
+
+        root = self.add_thread(replies=10)
+        replies_url = reverse('scheme-comments-replies', args=[self.scheme.pk, root.pk])
+        with self.assertNumQueries(counts[0]):
+            self.client.get(self.url)
+        with self.assertNumQueries(counts[1]):
+            response = self.client.get(replies_url)
+        self.assertEqual(len(response.data['results']), 10)
+
+    def test_first_page_is_cached_until_comment_changes(self):
+        root = self.post('Вопрос')
+        self.client.get(self.url)
+        # Из кэша, ETag — из версий кэша: к базе не обращаемся
+        with self.assertNumQueries(0):
+            response = self.client.get(self.url)
+        self.assertEqual(response.data['results'][0]['replies_count'], 0)
+
+        self.post('Ответ', parent=root)
+        self.assertEqual(self.client.get(self.url).data['results'][0]['replies_count'], 1)
+
+
+class UserProfileTests(SchemeTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        self.make_scheme(title='Roses', likes_count=3, downloads_count=10)
+        self.make_scheme(title='Peonies', likes_count=2, favorites_count=1)
+        self.make_scheme(title='Draft', likes_count=50, visibility=EmbroideryScheme.Visibility.PRIVATE)
+
+    def test_summary_mode(self):
+        url = reverse('users-detail', args=['author'])
+        # Строка для ETag, одна сводка по схемам (сколько бы их ни было) и пользователь с профилем
+        with self.assertNumQueries(3):
+            response = self.client.get(url, {'schemes': '0'})
+        self.assertNotIn('schemes', response.data)
+        self.assertEqual(response.data['stats'], {
+            'schemes_count': 2, 'likes_count': 5, 'favorites_count': 1, 'downloads_count': 10
+        })
+        # Без параметра — прежний ответ со встроенным списком
+        self.assertEqual(len(self.client.get(url).data['schemes']), 2)
+
+    def test_paginated_schemes(self):
+        url = reverse('users-schemes', args=['author'])
+        response = self.client.get(url, {'ordering': 'newest', 'pagination': 'cursor'})
+        self.assertEqual([row['title'] for row in response.data['results']], ['Peonies', 'Roses'])
+        response = self.client.get(url, {'count': 'none'})
+        self.assertIsNone(response.data['count'])
+        self.assertEqual(self.client.get(reverse('users-schemes', args=['nobody'])).status_code, 404)
@@ -0,0 +1,111 @@
+# backend/api/transfer.py
+"""
+Формат выгрузки схем для команд import_schemes / export_schemes.
+
+Одна схема — одна запись (строка JSONL или строка CSV):
+
+    {"title": ..., "description": ..., "author": "username", "category": "slug",
+     "license": "CC-BY", "difficulty": "EA", "visibility": "PUB",
+     "size_stitches_width": 120, ..., "tags": ["пионы", "розы"],
+     "main_image": "schemes/main_images/...", "files": [...], "images": [...]}
+
+Пути файлов указываются относительно каталога медиа (--media-dir при импорте и
+экспорте, иначе MEDIA_ROOT). В CSV списки хранятся в одной ячейке:
+теги через запятую, пути файлов через '|'.
+
+Чтение и запись идут потоком, запись за записью, — память не зависит от размера выгрузки.
+"""
+import csv
+import json
+import os
+import sys
+from contextlib import contextmanager
+
+SCALAR_FIELDS = (
+    'title', 'description', 'difficulty', 'visibility',
+    'size_stitches_width', 'size_stitches_height', 'number_of_colors',
+    'recommended_canvas', 'recommended_threads',
+)
+INTEGER_FIELDS = ('size_stitches_width', 'size_stitches_height', 'number_of_colors')
+LIST_FIELDS = {'tags': ',', 'files': '|', 'images': '|'}
+FIELDS = ('id',) + SCALAR_FIELDS + ('author', 'category', 'license', 'main_image') + tuple(LIST_FIELDS)
+
+FORMATS = ('jsonl', 'csv')
+
+
+def detect_format(path, fmt=None):
+    if fmt:
+        return fmt
+    return 'csv' if path.lower().endswith('.csv') else 'jsonl'
+
+
+@contextmanager
+def open_stream(path, mode):
+    """Открывает файл; '-' означает stdin/stdout."""
+    if path == '-':
+        yield sys.stdin if mode == 'r' else sys.stdout
+        return
+    with open(path, mode, encoding='utf-8', newline='') as stream:
+        yield stream
+
+
+def _from_csv_row(row):
+    record = {}
+    for name, value in row.items():
+        if name in LIST_FIELDS:
+            record[name] = [item.strip() for item in (value or '').split(LIST_FIELDS[name]) if item.strip()]
+        elif name in INTEGER_FIELDS:
+            record[name] = int(value) if value else None
+        else:
+            record[name] = value or ''
+    return record
+
+
+def read_records(stream, fmt):
+    """Генератор записей (словарей) из потока JSONL или CSV."""
+    if fmt == 'csv':
+        for row in csv.DictReader(stream):
+            yield _from_csv_row(row)
+        return
+    for line in stream:
+        line = line.strip()
+        if line:
+            yield json.loads(line)
+
+
+class RecordWriter:
+    def __init__(self, stream, fmt):
+        self.stream = stream
+        self.fmt = fmt
+        if fmt == 'csv':
+            self.writer = csv.DictWriter(stream, fieldnames=FIELDS)
+            self.writer.writeheader()
+
+    def write(self, record):
+        if self.fmt == 'csv':
+            row = dict(record)
+            for name, separator in LIST_FIELDS.items():
+                row[name] = separator.join(row.get(name) or [])
+            self.writer.writerow({name: '' if row.get(name) is None else row[name] for name in FIELDS})
+        else:
+            self.stream.write(json.dumps(record, ensure_ascii=False) + '\n')
+
+
+def scheme_record(scheme):
+    """Запись для выгрузки. Теги, файлы и изображения должны быть предзагружены."""
+    record = {'id': scheme.pk}
+    record.update({name: getattr(scheme, name) for name in SCALAR_FIELDS})
+    record.update({
+        'author': scheme.author.username,
+        'category': scheme.category.slug if scheme.category else '',
+        'license': scheme.license.short_name,
+        'main_image': scheme.main_image.name if scheme.main_image else '',
+        'tags': [tag.name for tag in scheme.tags.all()],
+        'files': [scheme_file.file.name for scheme_file in scheme.files.all()],
+        'images': [image.image.name for image in scheme.images.all()],
+    })
+    return record
+
+
+def media_source(media_dir, name):
+    return os.path.join(media_dir, *name.split('/'))
@@ -0,0 +1,197 @@
+# backend/api/uploads.py
+"""
+Загрузка больших файлов по частям.
+
+    POST /api/v1/uploads/                 {filename, size, checksum?} -> {id, offset}
+    PUT  /api/v1/uploads/{id}/?offset=N   тело запроса — байты части
+    GET  /api/v1/uploads/{id}/            текущий offset (для продолжения после обрыва)
+    POST /api/v1/uploads/{id}/complete/   {checksum?} — проверка размера и SHA-256
+    POST /api/v1/uploads/{id}/attach/     {scheme, kind: file|image} — прикрепить к схеме
+
+Части пишутся потоком во временные файлы, память не зависит от размера файла. Каждая часть
+сначала пишется в свой файл и переносится в общий только после условного обновления offset,
+поэтому параллельные запросы с одинаковым offset не портят данные.
+Завершенную загрузку можно также передать при создании схемы (file_upload, gallery_uploads).
+
+Настройки (settings.CHUNKED_UPLOADS):
+    TEMP_DIR     каталог временных файлов относительно MEDIA_ROOT
+    MAX_SIZE     максимальный размер файла в байтах
+    EXPIRE_HOURS через сколько часов незавершенные загрузки удаляет cleanup_uploads
+"""
+import glob
+import hashlib
+import os
+import shutil
+import tempfile
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation, ValidationError
+from django.core.files import File
+from django.core.files.utils import validate_file_name
+from django.utils.text import get_valid_filename
+from PIL import Image
+
+from .images import IMAGE_ERRORS
+
+DEFAULTS = {
+    'TEMP_DIR': 'uploads/tmp',
+    'MAX_SIZE': 200 * 1024 * 1024,
+    'EXPIRE_HOURS': 24,
+}
+
+READ_BLOCK_SIZE = 64 * 1024
+
+# Расширение файла -> формат Pillow, которые принимаются как изображения галереи.
+# Остальное (svg, html и т. п.) отдавалось бы браузеру как есть — это хранимый XSS
+IMAGE_EXTENSIONS = {
+    '.jpg': 'JPEG',
+    '.jpeg': 'JPEG',
+    '.png': 'PNG',
+    '.gif': 'GIF',
+    '.webp': 'WEBP',
+}
+
+
+def get_upload_settings():
+    return {**DEFAULTS, **getattr(settings, 'CHUNKED_UPLOADS', {})}
+
+
+def temp_path(upload):
+    directory = os.path.join(settings.MEDIA_ROOT, get_upload_settings()['TEMP_DIR'])
+    os.makedirs(directory, exist_ok=True)
+    return os.path.join(directory, f'{upload.pk}.part')
+
+
+def clean_filename(value):
+    """
+    Приводит имя файла от клиента к безопасному виду (без каталогов и спецсимволов).
+    Бросает ValidationError, если имя получить нельзя.
+    """
+    try:
+        return get_valid_filename(validate_file_name(value))
+    except SuspiciousFileOperation:
+        raise ValidationError('Недопустимое имя файла.')
+
+
+def validate_image_upload(upload):
+    """
+    Проверяет, что завершенная загрузка — изображение: расширение из IMAGE_EXTENSIONS
+    и содержимое, которое Pillow открывает в том же семействе форматов.
+    Бросает ValidationError.
+    """
+    extension = os.path.splitext(upload.filename)[1].lower()
+    if extension not in IMAGE_EXTENSIONS:
+        raise ValidationError(
+            'Изображение должно иметь одно из расширений: %s.' % ', '.join(IMAGE_EXTENSIONS)
+        )
+    try:
+        with Image.open(temp_path(upload)) as image:
+            image_format = image.format
+            image.verify()
+    except IMAGE_ERRORS:
+        raise ValidationError('Файл не является изображением или поврежден.')
+    if image_format not in set(IMAGE_EXTENSIONS.values()):
+        raise ValidationError('Формат изображения не поддерживается.')
+
+
+def write_chunk(upload, stream, offset):
+    """
+    Пишет байты из `stream` в отдельный файл части (не в общий временный файл:
+    параллельные запросы с тем же offset не должны портить друг другу данные).
+    Читает не больше, чем осталось до заявленного размера (+1 байт, чтобы заметить лишнее).
+    Возвращает (путь к файлу части, количество записанных байт).
+    """
+    directory = os.path.dirname(temp_path(upload))
+    limit = upload.size - offset + 1
+    written = 0
+    descriptor, chunk_path = tempfile.mkstemp(prefix=f'{upload.pk}.{offset}.', suffix='.chunk', dir=directory)
+    with os.fdopen(descriptor, 'wb') as target:
+        while written < limit:
+            block = stream.read(min(READ_BLOCK_SIZE, limit - written))
+            if not block:
+                break
+            target.write(block)
+            written += len(block)
+    return chunk_path, written
+
+
+def append_chunk(upload, chunk_path, offset):
+    """
+    Переносит часть в общий временный файл начиная с `offset` и удаляет файл части.
+    Вызывается только после того, как запрос выиграл условное обновление offset.
+    """
+    path = temp_path(upload)
+    with open(path, 'r+b' if os.path.exists(path) else 'wb') as target, open(chunk_path, 'rb') as source:
+        target.seek(offset)
+        shutil.copyfileobj(source, target, READ_BLOCK_SIZE)
+        target.truncate()
+    discard_chunk(chunk_path)
+
+
+def discard_chunk(chunk_path):
+    if os.path.exists(chunk_path):
+        os.remove(chunk_path)
+
+
+def file_checksum(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as source:
+        for block in iter(lambda: source.read(READ_BLOCK_SIZE), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class TemporaryFile(File):
+    """
+    Временный файл загрузки. Наличие temporary_file_path() позволяет
+    FileSystemStorage переместить файл, а не копировать его.
+    """
+
+    def temporary_file_path(self):
+        return self.file.name
+
+
+def attach_upload(upload, instance, field_name):
+    """
+    Переносит завершенную загрузку в поле `field_name` объекта (по upload_to этого поля).
+    Объект не сохраняется — это делает вызывающий код.
+    """
+    field = instance._meta.get_field(field_name)
+    name = field.generate_filename(instance, upload.filename)
+    path = temp_path(upload)
+    with open(path, 'rb') as source:
+        stored_name = field.storage.save(name, TemporaryFile(source, name=upload.filename))
+    if os.path.exists(path):
+        os.remove(path)
+    setattr(instance, field_name, stored_name)
+    return stored_name
+
+
+def attach_to_scheme(upload, scheme, kind, **fields):
+    """
+    Создает SchemeFile (kind='file') или SchemeImage (kind='image') из завершенной загрузки
+    и помечает загрузку как использованную. `fields` — дополнительные поля (description, caption).
+    Изображение предварительно проверяется (validate_image_upload); сериализаторы
+    проверяют его раньше, чтобы ответить 400.
+    """
+    from .models import ChunkedUpload, SchemeFile, SchemeImage
+
+    if kind == 'image':
+        validate_image_upload(upload)
+    model, field_name = (SchemeImage, 'image') if kind == 'image' else (SchemeFile, 'file')
+    instance = model(scheme=scheme, **fields)
+    attach_upload(upload, instance, field_name)
+    instance.save()
+    ChunkedUpload.objects.filter(pk=upload.pk).update(status=ChunkedUpload.Status.ATTACHED)
+    upload.status = ChunkedUpload.Status.ATTACHED
+    return instance
+
+
+def delete_upload(upload):
+    """Удаляет загрузку вместе с временным файлом и оставшимися файлами частей."""
+    path = temp_path(upload)
+    if os.path.exists(path):
+        os.remove(path)
+    for chunk_path in glob.glob(os.path.join(os.path.dirname(path), f'{upload.pk}.*.chunk')):
+        discard_chunk(chunk_path)
+    upload.delete()
@@ -7,9 +7,11 @@ from .views import (
     CategoryViewSet,
     TagViewSet,
     EmbroiderySchemeViewSet,
-    CommentViewSet
+    CommentViewSet,
+    ChunkedUploadViewSet
 )
 from users.views import UserViewSet
+from . import async_views
 from rest_framework_nested import routers
 
 router_v1 = DefaultRouter()
@@ -19,13 +21,23 @@ router_v1.register(r'categories', CategoryViewSet, basename='categories')
 router_v1.register(r'tags', TagViewSet, basename='tags')
 router_v1.register(r'schemes', EmbroiderySchemeViewSet, basename='schemes')
 router_v1.register(r'users', UserViewSet, basename='users')
+router_v1.register(r'uploads', ChunkedUploadViewSet, basename='uploads')
 
 comments_router = routers.NestedSimpleRouter(router_v1, r'schemes', lookup='scheme')
 comments_router.register(r'comments', CommentViewSet, basename='scheme-comments')
 
 
 
+# Асинхронные версии эндпоинтов чтения для запуска под ASGI (см. api/async_views.py)
+async_urlpatterns = [
+    path('schemes/', async_views.scheme_list, name='async-schemes-list'),
+    path('schemes/<int:pk>/', async_views.scheme_detail, name='async-schemes-detail'),
+    path('schemes/<int:scheme_pk>/comments/', async_views.scheme_comments, name='async-scheme-comments'),
+    path('users/<str:username>/', async_views.user_profile, name='async-users-detail'),
+]
+
 urlpatterns = [
     path('', include(router_v1.urls)),
     path('', include(comments_router.urls)),
+    path('async/', include(async_urlpatterns)),
 ]
@@ -1,10 +1,10 @@
 # api/views.py
-from rest_framework import viewsets, permissions, status
+from rest_framework import viewsets, permissions, status, mixins
 from rest_framework.permissions import IsAuthenticatedOrReadOnly
 from rest_framework.response import Response
 from rest_framework.decorators import action
 from .permissions import IsAuthorOrReadOnly
-from .models import License, Category, Tag, EmbroideryScheme, Comment, Like
+from .models import License, Category, Tag, EmbroideryScheme, Comment
 from .serializers import (
     LicenseSerializer,
     CategorySerializer,
@@ -13,64 +13,154 @@ from .serializers import (
     EmbroiderySchemeDetailSerializer,
     EmbroiderySchemeCreateSerializer,
     EmbroiderySchemeUpdateSerializer,
-    CommentSerializer
+    CommentSerializer,
+    SchemeFileSerializer,
+    SchemeImageSerializer,
+    ChunkedUploadSerializer,
+    UploadAttachSerializer
 )
 
 from django_filters.rest_framework import DjangoFilterBackend
 from django.shortcuts import get_object_or_404
 from .filters import SchemeFilter
+from .pagination import OptInCursorPagination
+from .facets import get_facets
+from .cache import (
+    CatalogCacheMixin, build_key, get_version, invalidate_schemes, normalize_query, scheme_namespace,
+    wants_user_fields
+)
+from .ranking import get_ordering
+from .similarity import get_similarity_settings
+from .relations import get_relations_settings, get_user_relations, set_favorite, set_like
+from .conditional import ConditionalGetMixin, make_etag
+from . import counters
+from . import uploads
+from . import delivery
 
-from .models import License, Category, Tag, EmbroideryScheme, Comment, SchemeFile
-from django.db.models import F
-from django.http import HttpResponseRedirect
+from .models import License, Category, Tag, EmbroideryScheme, Comment, SchemeFile, ChunkedUpload, SimilarScheme
+from django.db import transaction
+from django.http import Http404
+from django.utils import timezone
 
 
-class LicenseViewSet(viewsets.ModelViewSet):
+class LicenseViewSet(CatalogCacheMixin, viewsets.ModelViewSet):
+    cache_namespace = 'licenses'
     queryset = License.objects.all()
     serializer_class = LicenseSerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
 
 
-class CategoryViewSet(viewsets.ModelViewSet):
+class CategoryViewSet(CatalogCacheMixin, viewsets.ModelViewSet):
+    cache_namespace = 'categories'
     queryset = Category.objects.all()
     serializer_class = CategorySerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
     pagination_class = None
 
 
-class TagViewSet(viewsets.ModelViewSet):
+class TagViewSet(CatalogCacheMixin, viewsets.ModelViewSet):
+    cache_namespace = 'tags'
     queryset = Tag.objects.all()
     serializer_class = TagSerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
     pagination_class = None
 
 
-class CommentViewSet(viewsets.ModelViewSet):
+class CommentViewSet(ConditionalGetMixin, CatalogCacheMixin, viewsets.ModelViewSet):
+    """
+    Обсуждение схемы: список — корневые комментарии с количеством ответов в ветке,
+    /comments/{id}/replies/ — вся ветка ответов в порядке дерева (см. Comment.path).
+    Авторы с профилями загружаются тем же запросом, поэтому число запросов
+    не зависит ни от размера страницы, ни от глубины веток.
+    Первая страница списка кэшируется для каждой схемы и сбрасывается при любом изменении комментариев.
+    """
+    cache_namespace = 'comments'
     queryset = Comment.objects.all()
     serializer_class = CommentSerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
+    pagination_class = OptInCursorPagination
+
+    @property
+    def cursor_ordering(self):
+        return ('path',) if self.action == 'replies' else ('created_at', 'id')
 
     def get_queryset(self):
         scheme_pk = self.kwargs.get('scheme_pk')
-        return Comment.objects.filter(scheme_id=scheme_pk)
+        queryset = Comment.objects.filter(scheme_id=scheme_pk).select_related('author__profile')
+        if self.action in ('list', 'retrieve', 'replies'):
+            queryset = queryset.with_replies_count()
+        if self.action == 'list':
+            return queryset.roots().order_by('created_at', 'id')
+        return queryset
+
+    def get_cache_key(self, request):
+        # Авторы вложены в ответ: переименование пользователя тоже сбрасывает кэш
+        return build_key(f"comments:{self.kwargs.get('scheme_pk')}", request, depends_on=('users',))
+
+    def is_cacheable(self, request):
+        # Только первая страница: дальше листают немногие, а инвалидация одна на схему
+        params = request.query_params
+        return params.get('page', '1') == '1' and 'cursor' not in params
+
+    def get_etag(self):
+        if self.action != 'list':
+            return None
+        # Версии меняются при любом изменении обсуждения (api/signals.py) — запросов к базе нет
+        return make_etag(
+            get_version(f"comments:{self.kwargs.get('scheme_pk')}"), get_version('users'),
+            normalize_query(self.request.query_params)
+        )
+
+    @action(detail=True, methods=['get'])
+    def replies(self, request, *args, **kwargs):
+        """Все ответы в ветке комментария: один запрос по диапазону путей."""
+        comment = get_object_or_404(
+            Comment.objects.only('scheme_id', 'path'), pk=kwargs['pk'], scheme_id=kwargs['scheme_pk']
+        )
+        queryset = self.get_queryset().descendants_of(comment)
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(self.get_serializer(page, many=True).data)
+        return Response(self.get_serializer(queryset, many=True).data)
 
     def perform_create(self, serializer):
         scheme_pk = self.kwargs.get('scheme_pk')
-        scheme = get_object_or_404(EmbroideryScheme, pk=scheme_pk)
-        serializer.save(author=self.request.user, scheme=scheme)
+        with transaction.atomic():
+            # Схема нужна только как id: UPDATE счетчика заодно проверяет, что она существует
+            if not EmbroideryScheme.objects.filter(pk=scheme_pk).adjust_counters(comments_count=1):
+                raise Http404
+            serializer.save(author=self.request.user, scheme_id=scheme_pk)
+        invalidate_schemes(scheme_pk)
+
+    def perform_destroy(self, instance):
+        with transaction.atomic():
+            # Вместе с комментарием каскадно удаляется вся ветка ответов
+            _, deleted = instance.delete()
+            EmbroideryScheme.objects.filter(pk=instance.scheme_id).adjust_counters(
+                comments_count=-deleted.get(Comment._meta.label, 1)
+            )
+        invalidate_schemes(instance.scheme_id)
 
 
-class EmbroiderySchemeViewSet(viewsets.ModelViewSet):
+class EmbroiderySchemeViewSet(ConditionalGetMixin, CatalogCacheMixin, viewsets.ModelViewSet):
+    cache_namespace = 'schemes'
+    cache_user_fields = True  # is_liked/is_favorited подставляются для каждого пользователя
     filter_backends = (DjangoFilterBackend,)
     filterset_class = SchemeFilter
+    pagination_class = OptInCursorPagination
 
     queryset = EmbroideryScheme.objects.select_related(
-        'author', 'category', 'license'
+        'author__profile', 'category', 'license'
     ).prefetch_related(
-        'tags', 'files', 'images', 'favorited_by', 'likes'
-    ).all().order_by('-created_at')
+        'tags'
+    ).all().order_by('-created_at', '-id')  # id — чтобы страницы не перекрывались при равных датах
     permission_classes = [IsAuthenticatedOrReadOnly, IsAuthorOrReadOnly]
 
+    @property
+    def cursor_ordering(self):
+        # Курсорная пагинация листает в порядке ?ordering= (api/ranking.py), по умолчанию — новые сверху
+        return get_ordering(self.request.query_params.get('ordering'))
+
     def get_serializer_class(self):
         if self.action == 'list':
             return EmbroiderySchemeListSerializer
@@ -78,7 +168,7 @@ class EmbroiderySchemeViewSet(viewsets.ModelViewSet):
             return EmbroiderySchemeCreateSerializer
         if self.action == 'update' or self.action == 'partial_update':
             return EmbroiderySchemeUpdateSerializer
-        if self.action == 'my' or self.action == 'favorited':
+        if self.action in ('my', 'favorited', 'similar'):
             return EmbroiderySchemeListSerializer
         return EmbroiderySchemeDetailSerializer
 
@@ -86,18 +176,61 @@ class EmbroiderySchemeViewSet(viewsets.ModelViewSet):
         # Передаем request в контекст, чтобы сериализаторы имели к нему доступ
         return {'request': self.request}
 
+    def get_etag(self):
+        """
+        ETag без сериализации: для детальной страницы — updated_at и счетчики одной строки,
+        для списка — версия пространства имен 'schemes' и нормализованный запрос. Версию
+        увеличивает любое изменение схем, их счетчиков, тегов, категорий, лицензий и авторов.
+        """
+        user_id = self.request.user.pk if wants_user_fields(self.request) else None
+        if self.action == 'retrieve':
+            row = EmbroideryScheme.objects.filter(pk=self.kwargs.get('pk')).values(
+                'visibility', 'author_id',
+                'updated_at', 'likes_count', 'favorites_count', 'comments_count', 'downloads_count'
+            ).first()
+            # Чужой приватной схеме ETag не нужен: retrieve ответит 404
+            if row is None or not self.is_visible(EmbroideryScheme(
+                visibility=row.pop('visibility'), author_id=row.pop('author_id')
+            )):
+                return None
+            return make_etag(
+                row, get_version('schemes'), get_version(scheme_namespace(self.kwargs['pk'])), user_id
+            )
+        if self.action == 'list':
+            # Тот же ключ, что у закэшированного ответа (api/cache.py): пока версия не сменилась,
+            # тело из кэша и ETag согласованы, а агрегат по всей выборке не нужен
+            return make_etag(get_version('schemes'), normalize_query(self.request.query_params), user_id)
+        return None
+
     def retrieve(self, request, *args, **kwargs):
         """
         Переопределяем метод для получения одного объекта.
         При каждом запросе к детальной странице будем увеличивать счетчик просмотров.
         """
+        not_modified = self.check_not_modified(request)
+        if not_modified is not None:
+            # Просмотр все равно засчитываем, но схему целиком не загружаем
+            self.count_view()
+            return not_modified
+
         instance = self.get_object()
-        instance.views_count = F('views_count') + 1
-        instance.save(update_fields=['views_count'])
-        instance.refresh_from_db()
+        if not self.is_visible(instance):
+            raise Http404
+        self.count_view(instance)
         serializer = self.get_serializer(instance)
         return Response(serializer.data)
 
+    def is_visible(self, scheme):
+        """Приватную схему видит только автор (так же проверяет и api/async_views.py)."""
+        return scheme.is_visible_to(self.request.user)
+
+    def count_view(self, scheme=None):
+        # В зависимости от settings.SCHEME_COUNTERS['MODE'] пишет сразу или копит в буфере;
+        # для ответа 304 схема не загружается, хватает ее id
+        if scheme is None:
+            scheme = EmbroideryScheme(pk=int(self.kwargs['pk']), views_count=0)
+        counters.increment(scheme, 'views_count')
+
     @action(
         detail=True,
         methods=['get'],
@@ -106,62 +239,132 @@ class EmbroiderySchemeViewSet(viewsets.ModelViewSet):
     )
     def download_file(self, request, pk=None, file_pk=None):
         """
-        Увеличивает счетчик скачиваний файла и перенаправляет на сам файл.
+        Увеличивает счетчик скачиваний файла и отдает сам файл (см. api/delivery.py).
         """
         scheme = self.get_object()
+        # Права проверяем до передачи файла веб-серверу: приватные схемы — только автору
+        if not scheme.is_visible_to(request.user):
+            raise Http404
         file_to_download = get_object_or_404(SchemeFile, pk=file_pk, scheme=scheme)
 
-        # Увеличиваем счетчик скачиваний
-        file_to_download.downloads_count = F('downloads_count') + 1
-        file_to_download.save(update_fields=['downloads_count'])
+        # Докачка с середины файла (Range) не считается новым скачиванием
+        byte_range = delivery.requested_range(request, file_to_download.file)
+        if not byte_range or byte_range[0] == 0:
+            # Увеличиваем счетчик скачиваний файла и общий счетчик схемы
+            with transaction.atomic():
+                counters.increment(file_to_download, 'downloads_count')
+                counters.increment(scheme, 'downloads_count')
+
+        return delivery.serve_file(request, file_to_download.file)
 
-        # Перенаправляем пользователя на URL файла
-        return HttpResponseRedirect(redirect_to=file_to_download.file.url)
+    def set_relation(self, request, setter, field, labels, created_status=status.HTTP_200_OK):
+        """
+        PUT ставит отметку, DELETE снимает (оба идемпотентны), POST переключает:
+        пробует поставить, а если отметка уже была — снимает.
+        В ответе — новое состояние и счетчики схемы.
+        """
+        scheme = self.get_object()
+        if request.method == 'POST':
+            value = True
+            changed, counts = setter(request.user, scheme.pk, True)
+            if not changed:
+                value = False
+                changed, counts = setter(request.user, scheme.pk, False)
+        else:
+            value = request.method == 'PUT'
+            changed, counts = setter(request.user, scheme.pk, value)
+        return Response(
+            {'status': labels[value], field: value, **counts},
+            status=created_status if value and changed else status.HTTP_200_OK
+        )
 
     @action(
         detail=True,
-        methods=['post'],
+        methods=['post', 'put', 'delete'],
         permission_classes=[permissions.IsAuthenticated]
     )
     def favorite(self, request, pk=None):
-        scheme = self.get_object()
-        user = request.user
-        if user in scheme.favorited_by.all():
-            scheme.favorited_by.remove(user)
-            return Response({'status': 'removed from favorites'}, status=status.HTTP_200_OK)
-        else:
-            scheme.favorited_by.add(user)
-            return Response({'status': 'added to favorites'}, status=status.HTTP_200_OK)
+        """Добавить в избранное (PUT), убрать (DELETE) или переключить (POST)."""
+        return self.set_relation(
+            request, set_favorite, 'is_favorited', {True: 'added to favorites', False: 'removed from favorites'}
+        )
 
     @action(
         detail=True,
-        methods=['post'],
+        methods=['post', 'put', 'delete'],
         permission_classes=[permissions.IsAuthenticated]
     )
     def like(self, request, pk=None):
-        """Поставить или убрать лайк."""
-        scheme = self.get_object()
-        user = request.user
-        like, created = Like.objects.get_or_create(user=user, scheme=scheme)
-
-        if not created:
-            # Лайк уже существовал, значит, пользователь его снимает
-            like.delete()
-            return Response({'status': 'unliked'}, status=status.HTTP_200_OK)
-        else:
-            # Лайк только что создан
-            return Response({'status': 'liked'}, status=status.HTTP_201_CREATED)
+        """Поставить (PUT), убрать (DELETE) или переключить (POST) лайк."""
+        return self.set_relation(
+            request, set_like, 'is_liked', {True: 'liked', False: 'unliked'}, created_status=status.HTTP_201_CREATED
+        )
 
     def get_queryset(self):
         # На `list` мы по-прежнему хотим видеть только публичные схемы
         base_queryset = super().get_queryset()
+        if self.action in ('list', 'retrieve', 'my', 'favorited', 'similar'):
+            # Счетчики и флаги пользователя считаем подзапросами, а не по запросу на строку.
+            # С ?user_fields=0 флаги не нужны — подзапросы EXISTS не добавляются
+            user = self.request.user if wants_user_fields(self.request) else None
+            base_queryset = base_queryset.with_list_stats(user)
+        if self.action == 'retrieve':
+            # Файлы и галерея нужны только детальной странице
+            base_queryset = base_queryset.prefetch_related('files', 'images').with_processing()
         if self.action == 'list':
             return base_queryset.filter(visibility='PUB')
         return base_queryset
 
+    @action(detail=False, methods=['get'], permission_classes=[permissions.AllowAny])
+    def relations(self, request):
+        """
+        Лайки и избранное текущего пользователя для набора схем: ?ids=1,2,3.
+        Вместе со списком в режиме ?user_fields=0 позволяет отдавать всем один кэшируемый ответ.
+        """
+        try:
+            ids = [int(value) for value in request.query_params.get('ids', '').split(',') if value.strip()]
+        except ValueError:
+            return Response({'detail': 'ids — список чисел через запятую.'}, status=status.HTTP_400_BAD_REQUEST)
+        max_ids = get_relations_settings()['MAX_IDS']
+        if len(ids) > max_ids:
+            return Response({'detail': f'Не больше {max_ids} id за запрос.'}, status=status.HTTP_400_BAD_REQUEST)
+        liked, favorited = get_user_relations(request.user, ids)
+        return Response({
+            str(scheme_id): {'is_liked': scheme_id in liked, 'is_favorited': scheme_id in favorited}
+            for scheme_id in ids
+        })
+
+    @action(detail=True, methods=['get'], permission_classes=[permissions.AllowAny])
+    def similar(self, request, pk=None):
+        """
+        Похожие публичные схемы из заранее посчитанной таблицы соседей (api/similarity.py):
+        чтение K строк по индексу и одна выборка самих схем.
+        """
+        # Для проверки доступа хватает двух полей — без join'ов и тегов, как в get_object()
+        scheme = get_object_or_404(EmbroideryScheme.objects.only('visibility', 'author_id'), pk=pk)
+        if not scheme.is_visible_to(request.user):
+            raise Http404
+        neighbors = dict(
+            SimilarScheme.objects.filter(scheme=scheme).order_by('-score').values_list(
+                'similar_id', 'score'
+            )[:get_similarity_settings()['K']]
+        )
+        schemes = self.get_queryset().filter(pk__in=neighbors, visibility=EmbroideryScheme.Visibility.PUBLIC)
+        ordered = sorted(schemes, key=lambda item: -neighbors[item.pk])
+        return Response(self.get_serializer(ordered, many=True).data)
+
+    @action(detail=False, methods=['get'], permission_classes=[permissions.AllowAny])
+    def facets(self, request):
+        """
+        Количество публичных схем по категориям, сложности, лицензиям и популярным тегам
+        для текущего набора фильтров (те же параметры, что и у списка).
+        """
+        base_queryset = EmbroideryScheme.objects.filter(visibility='PUB')
+        return Response(get_facets(base_queryset, request.query_params, request))
+
     @action(detail=False, methods=['get'], permission_classes=[permissions.IsAuthenticated])
     def favorited(self, request):
-        favorited_schemes = EmbroideryScheme.objects.filter(favorited_by=request.user)
+        favorited_schemes = self.get_queryset().filter(favorited_by=request.user)
         page = self.paginate_queryset(favorited_schemes)
         if page is not None:
             serializer = self.get_serializer(page, many=True)
@@ -176,4 +379,122 @@ class EmbroiderySchemeViewSet(viewsets.ModelViewSet):
         return Response(serializer.data)
 
     def perform_create(self, serializer):
-        serializer.save(author=self.request.user)
\ No newline at end of file
+        serializer.save(author=self.request.user)
+
+class ChunkedUploadViewSet(mixins.CreateModelMixin,
+                           mixins.RetrieveModelMixin,
+                           mixins.DestroyModelMixin,
+                           viewsets.GenericViewSet):
+    """
+    Загрузка больших файлов по частям с возможностью продолжения (см. api/uploads.py).
+    """
+    serializer_class = ChunkedUploadSerializer
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get_queryset(self):
+        return ChunkedUpload.objects.filter(user=self.request.user)
+
+    def perform_create(self, serializer):
+        serializer.save(user=self.request.user)
+
+    def perform_destroy(self, instance):
+        uploads.delete_upload(instance)
+
+    def get_chunk_offset(self, request):
+        """Смещение части: ?offset=N или заголовок Content-Range: bytes N-M/total."""
+        value = request.query_params.get('offset')
+        content_range = request.headers.get('Content-Range', '')
+        if value is None and content_range.startswith('bytes '):
+            value = content_range[len('bytes '):].split('-', 1)[0]
+        try:
+            return int(value)
+        except (TypeError, ValueError):
+            return None
+
+    def conflict(self, upload, detail):
+        return Response(
+            {'detail': detail, 'offset': upload.offset, 'size': upload.size},
+            status=status.HTTP_409_CONFLICT
+        )
+
+    def update(self, request, *args, **kwargs):
+        # Тело запроса читается потоком из request.stream; request.data не трогаем,
+        # иначе DRF попытается разобрать всю часть в память
+        upload = self.get_object()
+        if upload.status != ChunkedUpload.Status.UPLOADING:
+            return self.conflict(upload, 'Загрузка уже завершена.')
+        offset = self.get_chunk_offset(request)
+        if offset is None:
+            return Response({'detail': 'Не указано смещение части (offset).'}, status=status.HTTP_400_BAD_REQUEST)
+        if offset != upload.offset:
+            return self.conflict(upload, 'Смещение не совпадает с количеством полученных байт.')
+
+        # Часть пишется в свой файл и попадает в общий временный файл только после того,
+        # как условное обновление offset выбрало этот запрос; перенос — в той же транзакции,
+        # поэтому новый offset становится виден (в т.ч. complete) уже с записанными байтами
+        chunk_path, written = uploads.write_chunk(upload, request.stream, offset)
+        if offset + written > upload.size:
+            uploads.discard_chunk(chunk_path)
+            return Response(
+                {'detail': 'Часть выходит за объявленный размер файла.', 'offset': upload.offset},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        try:
+            with transaction.atomic():
+                # Условное обновление: если параллельный запрос успел записать ту же часть, отвечаем 409
+                updated = ChunkedUpload.objects.filter(
+                    pk=upload.pk, offset=offset, status=ChunkedUpload.Status.UPLOADING
+                ).update(offset=offset + written)
+                if updated:
+                    uploads.append_chunk(upload, chunk_path, offset)
+        finally:
+            uploads.discard_chunk(chunk_path)
+        upload.refresh_from_db()
+        if not updated:
+            return self.conflict(upload, 'Часть уже получена другим запросом.')
+        return Response(self.get_serializer(upload).data)
+
+    @action(detail=True, methods=['post'])
+    def complete(self, request, pk=None):
+        upload = self.get_object()
+        if upload.status != ChunkedUpload.Status.UPLOADING:
+            return self.conflict(upload, 'Загрузка уже завершена.')
+        if upload.offset != upload.size:
+            return self.conflict(upload, 'Получены не все части файла.')
+
+        expected = (request.data.get('checksum') or upload.checksum).lower()
+        checksum = uploads.file_checksum(uploads.temp_path(upload))
+        if expected and expected != checksum:
+            # Файл поврежден — начинаем загрузку заново
+            ChunkedUpload.objects.filter(pk=upload.pk).update(offset=0)
+            return Response(
+                {'detail': 'Контрольная сумма не совпадает.', 'checksum': checksum, 'offset': 0},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        upload.checksum = checksum
+        upload.status = ChunkedUpload.Status.COMPLETE
+        upload.completed_at = timezone.now()
+        upload.save(update_fields=['checksum', 'status', 'completed_at'])
+        return Response(self.get_serializer(upload).data)
+
+    @action(detail=True, methods=['post'])
+    def attach(self, request, pk=None):
+        """Прикрепляет завершенную загрузку к своей схеме как файл или изображение галереи."""
+        upload = self.get_object()
+        if upload.status != ChunkedUpload.Status.COMPLETE:
+            return self.conflict(upload, 'Загрузка не завершена или уже использована.')
+        serializer = UploadAttachSerializer(
+            data=request.data, context={**self.get_serializer_context(), 'upload': upload}
+        )
+        serializer.is_valid(raise_exception=True)
+        scheme = serializer.validated_data['scheme']
+        kind = serializer.validated_data['kind']
+        with transaction.atomic():
+            instance = uploads.attach_to_scheme(upload, scheme, kind)
+            # Новый файл меняет детальную страницу схемы (и ее ETag)
+            EmbroideryScheme.objects.filter(pk=scheme.pk).update(updated_at=timezone.now())
+        output_class = SchemeImageSerializer if kind == 'image' else SchemeFileSerializer
+        return Response(
+            output_class(instance, context=self.get_serializer_context()).data,
+            status=status.HTTP_201_CREATED
+        )
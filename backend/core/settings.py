@@ -12,6 +12,9 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 
 from pathlib import Path
 import os
+import sys
+
+from django.core.exceptions import ImproperlyConfigured
 # from dotenv import load_dotenv
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -55,6 +58,7 @@ MIDDLEWARE = [
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
     "django.contrib.auth.middleware.AuthenticationMiddleware",
+    "api.db.ReplicaRoutingMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
 ]
@@ -82,11 +86,111 @@ WSGI_APPLICATION = "core.wsgi.application"
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
-DATABASES = {
+# DB_ENGINE=sqlite (по умолчанию) или postgres. Тесты идут на той же СУБД:
+# DB_ENGINE=postgres DB_NAME=vishivka python manage.py test api
+DB_ENGINE = os.environ.get('DB_ENGINE', 'sqlite')
+
+if DB_ENGINE == 'postgres':
+    DATABASES = {
+        "default": {
+            "ENGINE": "django.db.backends.postgresql",
+            "NAME": os.environ.get('DB_NAME', 'vishivka'),
+            "USER": os.environ.get('DB_USER', 'vishivka'),
+            "PASSWORD": os.environ.get('DB_PASSWORD', ''),
+            "HOST": os.environ.get('DB_HOST', 'localhost'),
+            "PORT": os.environ.get('DB_PORT', '5432'),
+            # Постоянные соединения с проверкой перед использованием в каждом запросе
+            "CONN_MAX_AGE": int(os.environ.get('DB_CONN_MAX_AGE', 60)),
+            "CONN_HEALTH_CHECKS": True,
+            "OPTIONS": {},
+        }
+    }
+    if os.environ.get('DB_POOL') == '1':
+        # Пул соединений psycopg 3 (pip install "psycopg[pool]"); с пулом CONN_MAX_AGE должен быть 0.
+        # В requirements.txt только psycopg2 — для него вместо пула используйте PgBouncer перед базой.
+        try:
+            import psycopg  # noqa: F401
+            import psycopg_pool  # noqa: F401
+        except ImportError:
+            raise ImproperlyConfigured(
+                'DB_POOL=1 требует psycopg 3 с пулом: pip install "psycopg[pool]" '
+                '(или уберите DB_POOL и используйте PgBouncer).'
+            )
+        DATABASES["default"]["CONN_MAX_AGE"] = 0
+        DATABASES["default"]["OPTIONS"]["pool"] = {
+            "min_size": int(os.environ.get('DB_POOL_MIN_SIZE', 2)),
+            "max_size": int(os.environ.get('DB_POOL_MAX_SIZE', 10)),
+            "timeout": 10,
+        }
+else:
+    DATABASES = {
+        "default": {
+            "ENGINE": "django.db.backends.sqlite3",
+            "NAME": os.environ.get('DB_NAME', BASE_DIR / "db.sqlite3"),
+            "OPTIONS": {
+                # Сколько секунд ждать снятия блокировки, прежде чем вернуть "database is locked"
+                "timeout": 20,
+            },
+        }
+    }
+    if os.environ.get('SQLITE_TUNED', '1') == '1':
+        # Транзакции сразу берут блокировку на запись, а не пытаются повысить ее посреди транзакции
+        DATABASES["default"]["OPTIONS"]["transaction_mode"] = "IMMEDIATE"
+
+# Реплики только для чтения: DB_REPLICAS — через запятую хосты PostgreSQL или пути к файлам SQLite
+# (для проверки локально подойдет копия db.sqlite3). Маршрутизация — api.db.PrimaryReplicaRouter.
+REPLICA_ROUTING = {
+    'REPLICAS': [],
+    'APPS': ('api', 'users'),
+    'STICKY_SECONDS': 10,  # секунд чтения с основной базы после записи
+    'COOKIE_NAME': 'db_primary',
+}
+for number, replica in enumerate(filter(None, os.environ.get('DB_REPLICAS', '').split(',')), start=1):
+    alias = f'replica_{number}'
+    DATABASES[alias] = {
+        **DATABASES["default"],
+        ("HOST" if DB_ENGINE == 'postgres' else "NAME"): replica.strip(),
+        # В тестах реплика — та же тестовая база
+        "TEST": {"MIRROR": "default"},
+    }
+    REPLICA_ROUTING['REPLICAS'].append(alias)
+
+DATABASE_ROUTERS = ['api.db.PrimaryReplicaRouter']
+
+# PRAGMA для каждого нового соединения SQLite (см. api/db.py). WAL позволяет читать
+# во время записи, synchronous=NORMAL в режиме WAL не теряет целостность при сбое.
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'busy_timeout': 20000,  # мс
+    'mmap_size': 128 * 1024 * 1024,  # байт
+    'cache_size': -16000,  # отрицательное значение — в КиБ
+    'temp_store': 'MEMORY',
+} if os.environ.get('SQLITE_TUNED', '1') == '1' else {}
+
+
+# Cache
+# По умолчанию кэш в памяти процесса; для нескольких воркеров задайте REDIS_URL
+# (встроенный django.core.cache.backends.redis.RedisCache, нужен пакет redis).
+
+CACHES = {
     "default": {
-        "ENGINE": "django.db.backends.sqlite3",
-        "NAME": BASE_DIR / "db.sqlite3",
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "vishivka",
+    }
+}
+
+if os.environ.get('REDIS_URL'):
+    CACHES["default"] = {
+        "BACKEND": "django.core.cache.backends.redis.RedisCache",
+        "LOCATION": os.environ['REDIS_URL'],
     }
+
+# Кэш ответов каталога для анонимных и авторизованных чтений (см. api/cache.py)
+CATALOG_CACHE = {
+    'ENABLED': os.environ.get('CATALOG_CACHE_ENABLED', '1') == '1',
+    'CACHE_ALIAS': 'default',
+    'TIMEOUT': 300,  # секунд
 }
 
 
@@ -183,4 +287,108 @@ DJOSER = {
             'user': 'users.serializers.UserSerializer',
             'current_user': 'users.serializers.UserSerializer',
         },
-    }
\ No newline at end of file
+    }
+
+# Счетчики просмотров и скачиваний (см. api/counters.py).
+# 'sync' — UPDATE на каждый запрос, 'buffered' — инкременты копятся и пишутся пачкой.
+SCHEME_COUNTERS = {
+    'MODE': os.environ.get('SCHEME_COUNTERS_MODE', 'sync'),
+    'BACKEND': os.environ.get('SCHEME_COUNTERS_BACKEND', 'memory'),  # 'memory' или 'cache'
+    'CACHE_ALIAS': 'default',
+    'FLUSH_INTERVAL': 10,  # секунд
+    'FLUSH_THRESHOLD': 500,  # инкрементов
+}
+
+
+# Полнотекстовый поиск по схемам (см. api/search.py).
+# 'auto' — FTS5 для SQLite и tsvector/GIN для PostgreSQL; 'simple' — icontains без индекса.
+SCHEME_SEARCH = {
+    'BACKEND': os.environ.get('SCHEME_SEARCH_BACKEND', 'auto'),
+}
+
+
+# Фасеты каталога /api/v1/schemes/facets/ (см. api/facets.py)
+SCHEME_FACETS = {
+    'TOP_TAGS': 20,
+    'MAX_TOP_TAGS': 100,
+}
+
+
+# Лайки и избранное пользователя для карточек и /schemes/relations/ (api/relations.py)
+USER_RELATIONS = {
+    'CACHE_USERS': 1000,  # пользователей в кэше процесса
+    'TIMEOUT': 30,  # секунд
+    'MAX_IDS': 100,
+}
+
+
+# Загрузка больших файлов по частям (api/uploads.py)
+CHUNKED_UPLOADS = {
+    'TEMP_DIR': 'uploads/tmp',  # относительно MEDIA_ROOT
+    'MAX_SIZE': int(os.environ.get('CHUNKED_UPLOAD_MAX_SIZE', 200 * 1024 * 1024)),  # байт
+    'EXPIRE_HOURS': 24,
+}
+
+
+# Оценки для сортировок каталога ?ordering=popular|trending (api/ranking.py),
+# пересчитываются командой update_scheme_scores
+SCHEME_RANKING = {
+    'WEIGHTS': {
+        'views_count': 1,
+        'likes_count': 5,
+        'favorites_count': 8,
+        'downloads_count': 4,
+        'comments_count': 3,
+    },
+    'HALF_LIFE_HOURS': 48,
+    'BATCH_SIZE': 5000,
+}
+
+
+# Похожие схемы для /schemes/{id}/similar/ (api/similarity.py); полный пересчет — build_similar_schemes.
+# С установленным NumPy пересчет векторный, без него — на чистом Python
+SIMILAR_SCHEMES = {
+    'K': 12,
+    'WEIGHTS': {'tags': 3, 'category': 2, 'difficulty': 1, 'size': 1, 'colors': 1},
+    'CHUNK_SIZE': 1000,  # строк матрицы сходства за раз
+    'INCREMENTAL': True,  # пересчитывать соседей при изменении схемы (фоновая задача)
+    'DEBOUNCE': 10,  # секунд; изменения схемы за это время дают одну задачу
+    'CANDIDATES': 200,  # в списки скольких похожих схем пробовать добавить измененную
+    'FEATURES_TTL': 600,  # секунд; кэш признаков каталога в процессе
+}
+
+
+# Персональная лента /users/me/feed/ (api/feed.py); пересчет — build_feed или задача 'feed.build'.
+# С установленным SciPy матрицы считаются через scipy.sparse, без него — на словарях Python
+FEED = {
+    'WEIGHTS': {'like': 1.0, 'favorite': 2.0},
+    'NEIGHBORS': 50,  # похожих схем на схему
+    'SIZE': 100,  # рекомендаций на пользователя
+    'MAX_USER_ITEMS': 500,  # схем пользователя, участвующих в пересчете
+    'CHUNK_SIZE': 1000,  # строк матрицы за раз
+    'TRACE_MEMORY': True,
+}
+
+
+# Фоновые задачи: обработка загруженных файлов и изображений (api/jobs.py).
+# 'sync' — сразу в запросе, 'thread' — пул потоков процесса, 'database' — очередь в БД + manage.py run_jobs.
+# 'sync' держит запрос до конца обработки, поэтому он только для тестов (manage.py test)
+TESTING = len(sys.argv) > 1 and sys.argv[1] == 'test'
+BACKGROUND_JOBS = {
+    'MODE': os.environ.get('BACKGROUND_JOBS_MODE', 'sync' if TESTING else 'thread'),
+    'WORKERS': int(os.environ.get('BACKGROUND_JOBS_WORKERS', 2)),  # потоков в режиме 'thread'
+    'MAX_ATTEMPTS': 3,
+    'RETRY_DELAY': 30,  # секунд до первой повторной попытки, дальше вдвое больше
+    'STALE_AFTER': 3600,  # секунд; задача RUNNING дольше этого возвращается в очередь
+    'KEEP_DONE': 7 * 24 * 3600,  # секунд хранить выполненные задачи
+    'POLL_INTERVAL': 2,  # секунд паузы воркера при пустой очереди
+}
+
+
+# Отдача файлов схем в download_file (api/delivery.py):
+# 'django' — сам Django (Range/If-Range), 'x-accel' — nginx, 'x-sendfile' — Apache, 'redirect' — ссылка на MEDIA_URL
+FILE_DELIVERY = {
+    'BACKEND': os.environ.get('FILE_DELIVERY_BACKEND', 'django'),
+    'ACCEL_PREFIX': '/protected-media/',
+    'BLOCK_SIZE': 64 * 1024,  # байт
+}
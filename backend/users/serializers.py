@@ -60,18 +60,47 @@ class UserUpdateSerializer(serializers.ModelSerializer):
 
 
 class UserProfileSerializer(serializers.ModelSerializer):
-    """Расширенный сериализатор для детального просмотра профиля."""
+    """
+    Расширенный сериализатор для детального просмотра профиля.
+
+    stats — сводка по публичным схемам (EmbroideryScheme.objects.summary()); представление
+    передает ее в context['stats'], чтобы не считать агрегат второй раз.
+    С context['include_schemes'] = False (?schemes=0) список схем не отдается:
+    его листают постранично через /users/{username}/schemes/.
+    """
     profile = ProfileSerializer(read_only=True)
+    stats = serializers.SerializerMethodField()
     schemes = serializers.SerializerMethodField()
 
     class Meta:
         model = User
-        fields = ('id', 'username', 'date_joined', 'profile', 'schemes')
+        fields = ('id', 'username', 'date_joined', 'profile', 'stats', 'schemes')
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        if not self.context.get('include_schemes', True):
+            self.fields.pop('schemes')
+
+    def get_stats(self, obj):
+        from api.models import EmbroideryScheme
+        stats = self.context.get('stats')
+        if stats is None:
+            stats = EmbroideryScheme.objects.filter(author=obj, visibility='PUB').summary()
+        return {key: stats[key] for key in ('schemes_count', 'likes_count', 'favorites_count', 'downloads_count')}
+
+    @staticmethod
+    def public_schemes(author, user):
+        """Публичные схемы автора для списка в профиле (его же читает api/async_views.py)."""
+        from api.models import EmbroideryScheme
+        # Связанные объекты и флаги пользователя — в том же запросе, а не по запросу на строку
+        return EmbroideryScheme.objects.filter(author=author, visibility='PUB').select_related(
+            'author__profile', 'category', 'license'
+        ).prefetch_related('tags').with_list_stats(user)
 
     def get_schemes(self, obj):
         """Возвращает список только ПУБЛИЧНЫХ схем пользователя."""
         from api.serializers import EmbroiderySchemeListSerializer
-        public_schemes = obj.schemes.filter(visibility='PUB')
         request = self.context.get('request')
+        public_schemes = self.public_schemes(obj, request.user if request else None)
         serializer = EmbroiderySchemeListSerializer(public_schemes, many=True, context={'request': request})
-        return serializer.data
\ No newline at end of file
+        return serializer.data
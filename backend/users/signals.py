@@ -12,5 +12,9 @@ def create_or_update_user_profile(sender, instance, created, **kwargs):
     """
     if created:
         Profile.objects.create(user=instance)
+        return
+    # При входе сохраняется только last_login — профиль при этом не меняется
+    if kwargs.get('update_fields') and set(kwargs['update_fields']) <= {'last_login'}:
+        return
     # Этот вызов теперь безопасен, так как профиль гарантированно существует
     instance.profile.save()
\ No newline at end of file
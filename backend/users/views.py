@@ -4,14 +4,45 @@ from rest_framework import viewsets, permissions, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
 
+from django.db.models import Max
+from django.http import Http404
+
+from api.cache import get_version
+from api.conditional import ConditionalGetMixin, make_etag
+from api.feed import get_feed
+from api.pagination import KeysetCursorPagination, OptInCursorPagination
+from api.ranking import get_ordering
+from api.models import EmbroideryScheme
+from api.serializers import EmbroiderySchemeListSerializer
 from .models import User
 from .serializers import UserSerializer, UserProfileSerializer, UserUpdateSerializer
 from .permissions import IsSelf  # Импортируем наши права доступа
 
 
-class UserViewSet(viewsets.ModelViewSet):
-    queryset = User.objects.all().prefetch_related('profile', 'schemes')
+class UserViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
+    # Схемы пользователя сюда не подгружаем: профиль отдает по ним агрегаты,
+    # а сами схемы листаются через /users/{username}/schemes/
+    queryset = User.objects.select_related('profile')
     lookup_field = 'username'  # Позволяет искать пользователей по имени, а не по id
+    pagination_class = OptInCursorPagination
+
+    @property
+    def cursor_ordering(self):
+        if self.action == 'schemes':
+            return get_ordering(self.request.query_params.get('ordering'))
+        return ('-date_joined', '-id')
+
+    def include_schemes(self):
+        # ?schemes=0 — профиль без встроенного списка схем, только сводка
+        return self.request.query_params.get('schemes') != '0'
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        if self.action == 'retrieve':
+            context['include_schemes'] = self.include_schemes()
+            # Сводка уже посчитана для ETag в get_etag()
+            context['stats'] = getattr(self, '_scheme_stats', None)
+        return context
 
     def get_serializer_class(self):
         # Для просмотра списка
@@ -23,7 +54,25 @@ class UserViewSet(viewsets.ModelViewSet):
         # Для детального просмотра
         return UserProfileSerializer
 
+    def get_etag(self):
+        """ETag профиля: строка пользователя с профилем и агрегат по его публичным схемам."""
+        if self.action != 'retrieve':
+            return None
+        row = User.objects.filter(username=self.kwargs.get('username')).values(
+            'pk', 'username', 'date_joined', 'profile__bio', 'profile__location', 'profile__avatar',
+            'profile__social_telegram', 'profile__social_vk'
+        ).first()
+        if row is None:
+            return None
+        schemes = EmbroideryScheme.objects.filter(author_id=row['pk'], visibility='PUB').summary(
+            last_updated=Max('updated_at')
+        )
+        self._scheme_stats = schemes
+        return make_etag(row, schemes, get_version('schemes'), self.include_schemes(), self.request.user.pk)
+
     def get_permissions(self):
+        if self.action == 'feed':
+            return [permissions.IsAuthenticated()]
         # Для обновления данных требуем, чтобы это был сам пользователь
         if self.action in ['update', 'partial_update', 'me', 'me_update']:
             return [permissions.IsAuthenticated(), IsSelf()]
@@ -50,5 +99,40 @@ class UserViewSet(viewsets.ModelViewSet):
             read_serializer = UserProfileSerializer(instance, context={'request': request})
             return Response(read_serializer.data)
 
+    @action(['get'], detail=True)
+    def schemes(self, request, username=None):
+        """Публичные схемы пользователя постранично; ?ordering= как у каталога (api/ranking.py)."""
+        author_id = User.objects.filter(username=username).values_list('pk', flat=True).first()
+        if author_id is None:
+            raise Http404
+        queryset = EmbroideryScheme.objects.filter(
+            author_id=author_id, visibility=EmbroideryScheme.Visibility.PUBLIC
+        ).select_related(
+            'author__profile', 'category', 'license'
+        ).prefetch_related('tags').with_list_stats(request.user).order_by(*self.cursor_ordering)
+        page = self.paginate_queryset(queryset)
+        context = {'request': request}
+        if page is not None:
+            return self.get_paginated_response(EmbroiderySchemeListSerializer(page, many=True, context=context).data)
+        return Response(EmbroiderySchemeListSerializer(queryset, many=True, context=context).data)
+
+    @action(['get'], detail=False, url_path='me/feed')
+    def feed(self, request):
+        """
+        Персональная лента "для вас" (api/feed.py): заранее посчитанные рекомендации,
+        а без них — популярное сейчас. Всегда курсорная пагинация, без COUNT(*).
+        """
+        schemes = EmbroideryScheme.objects.select_related(
+            'author__profile', 'category', 'license'
+        ).prefetch_related('tags').with_list_stats(request.user)
+        queryset, ordering, source = get_feed(request.user, schemes)
+        paginator = KeysetCursorPagination()
+        paginator.ordering = ordering
+        page = paginator.paginate_queryset(queryset, request)
+        serializer = EmbroiderySchemeListSerializer(page, many=True, context={'request': request})
+        response = paginator.get_paginated_response(serializer.data)
+        response.data['source'] = source
+        return response
+
     def get_current_user(self):
         return self.request.user
\ No newline at end of file
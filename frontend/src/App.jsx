@@ -17,6 +17,7 @@ import MySchemesPage from './pages/MySchemesPage';
 import RegisterPage from './pages/RegisterPage';
 import ProfilePage from './pages/ProfilePage';
 import FavoritedSchemesPage from './pages/FavoritedSchemesPage';
+import FeedPage from './pages/FeedPage';
 import UserMenu from './components/UserMenu';
 
 import ProfileEditPage from './pages/ProfileEditPage';
@@ -46,6 +47,7 @@ function Layout({ children }) {
                         {user ? (
                             <>
                                 {/* Основные действия для залогиненного пользователя */}
+                                <Link to="/feed" className="nav-link">Для вас</Link>
                                 <Link to="/favorites" className="nav-link">⭐Избранное⭐</Link>
                                 <Link to="/add-scheme" className="nav-button">Добавить схему</Link>
 
@@ -93,6 +95,7 @@ function App() {
             <Route path="/schemes/:id/edit" element={<PrivateRoute><SchemeEditForm /></PrivateRoute>} />
             <Route path="/my-schemes" element={<PrivateRoute><MySchemesPage /></PrivateRoute>} />
             <Route path="/favorites" element={<PrivateRoute><FavoritedSchemesPage /></PrivateRoute>} />
+            <Route path="/feed" element={<PrivateRoute><FeedPage /></PrivateRoute>} />
 
             <Route path="/profile/edit" element={<PrivateRoute><ProfileEditPage /></PrivateRoute>} />
         </Routes>
@@ -14,7 +14,11 @@ function SchemeDetail() {
     const [error, setError] = useState(null);
     const [comments, setComments] = useState([]);
     const [newComment, setNewComment] = useState('');
+    // Ответы загружаются по веткам: { id корневого комментария: [ответы в порядке дерева] }
+    const [replies, setReplies] = useState({});
+    const [replyTo, setReplyTo] = useState(null);
     const [isSubmitting, setIsSubmitting] = useState(false);
+    const [similarSchemes, setSimilarSchemes] = useState([]);
 
     useEffect(() => {
         const fetchSchemeAndComments = async () => {
@@ -34,6 +38,13 @@ function SchemeDetail() {
         fetchSchemeAndComments();
     }, [id]);
 
+    // Похожие схемы — из заранее посчитанной таблицы; ошибка не мешает показу страницы
+    useEffect(() => {
+        apiClient.get(`/schemes/${id}/similar/`)
+            .then(response => setSimilarSchemes(response.data))
+            .catch(() => setSimilarSchemes([]));
+    }, [id]);
+
     const handleFavoriteToggle = async () => {
         if (!user) {
             alert("Пожалуйста, войдите в систему, чтобы добавлять схемы в избранное.");
@@ -41,11 +52,13 @@ function SchemeDetail() {
             return;
         }
         try {
-            await apiClient.post(`/schemes/${id}/favorite/`);
+            // PUT/DELETE идемпотентны: повторный клик не собьет состояние, счетчики приходят в ответе
+            const method = scheme.is_favorited ? 'delete' : 'put';
+            const response = await apiClient[method](`/schemes/${id}/favorite/`);
             setScheme(prevScheme => ({
                 ...prevScheme,
-                is_favorited: !prevScheme.is_favorited,
-                favorites_count: prevScheme.is_favorited ? prevScheme.favorites_count - 1 : prevScheme.favorites_count + 1
+                is_favorited: response.data.is_favorited,
+                favorites_count: response.data.favorites_count
             }));
         } catch (err) {
             console.error("Ошибка при добавлении в избранное:", err);
@@ -68,6 +81,43 @@ function SchemeDetail() {
     };
 
 
+  const loadReplies = async (rootId) => {
+    try {
+      const response = await apiClient.get(`/schemes/${id}/comments/${rootId}/replies/`);
+      setReplies(prev => ({ ...prev, [rootId]: response.data.results }));
+    } catch (error) {
+      console.error("Ошибка при загрузке ответов:", error);
+    }
+  };
+
+  const renderComment = (comment, rootId) => (
+    <li key={comment.id} className="comment-item" style={{ marginLeft: `${comment.depth * 24}px` }}>
+        <div className="comment-author-avatar">
+            {comment.author.username.charAt(0)}
+        </div>
+        <div className="comment-content">
+            <div className="comment-header">
+                <span className="comment-author-name">{comment.author.username}</span>
+                <span className="comment-date">
+                    {new Date(comment.created_at).toLocaleString('ru-RU', { dateStyle: 'short', timeStyle: 'short' })}
+                </span>
+            </div>
+            <p className="comment-text">{comment.text}</p>
+            {user && (
+                <button type="button" className="comment-reply-button"
+                        onClick={() => setReplyTo({ id: comment.id, rootId, username: comment.author.username })}>
+                    Ответить
+                </button>
+            )}
+            {comment.depth === 0 && comment.replies_count > 0 && !replies[comment.id] && (
+                <button type="button" className="comment-reply-button" onClick={() => loadReplies(comment.id)}>
+                    Показать ответы ({comment.replies_count})
+                </button>
+            )}
+        </div>
+    </li>
+  );
+
   const handleCommentSubmit = async (e) => {
     e.preventDefault();
     if (!newComment.trim()) return;
@@ -76,8 +126,17 @@ function SchemeDetail() {
     try {
       const response = await apiClient.post(`/schemes/${id}/comments/`, {
         text: newComment,
+        parent: replyTo ? replyTo.id : null,
       });
-      setComments([...comments, response.data]);
+      if (replyTo) {
+        // Перезагружаем ветку, чтобы ответ встал на свое место в дереве
+        await loadReplies(replyTo.rootId);
+        setComments(comments.map(c => c.id === replyTo.rootId ? { ...c, replies_count: c.replies_count + 1 } : c));
+        setReplyTo(null);
+      } else {
+        setComments([...comments, response.data]);
+      }
+      setScheme({ ...scheme, comments_count: scheme.comments_count + 1 });
       setNewComment('');
     } catch (error) {
       console.error("Ошибка при добавлении комментария:", error);
@@ -94,14 +153,12 @@ function SchemeDetail() {
       return;
     }
     try {
-      await apiClient.post(`/schemes/${id}/like/`);
-      // Оптимистичное обновление
+      const method = scheme.is_liked ? 'delete' : 'put';
+      const response = await apiClient[method](`/schemes/${id}/like/`);
       setScheme(prevScheme => ({
         ...prevScheme,
-        is_liked: !prevScheme.is_liked,
-        likes_count: prevScheme.is_liked
-          ? prevScheme.likes_count - 1
-          : prevScheme.likes_count + 1
+        is_liked: response.data.is_liked,
+        likes_count: response.data.likes_count
       }));
     } catch (err) {
       console.error("Ошибка при оценке схемы:", err);
@@ -153,7 +210,7 @@ function SchemeDetail() {
       <div className="scheme-content-grid">
           <div className="scheme-main-content">
               {scheme.main_image && (
-                  <img src={scheme.main_image} alt={`Превью для ${scheme.title}`} className="scheme-detail-image" />
+                  <img src={scheme.main_image_thumbnails?.detail?.webp || scheme.main_image} alt={`Превью для ${scheme.title}`} className="scheme-detail-image" />
               )}
 
               {scheme.images && scheme.images.length > 0 && (
@@ -162,7 +219,7 @@ function SchemeDetail() {
                     <div className="gallery-grid">
                         {scheme.images.map(img => (
                             <a href={img.image} key={img.id} target="_blank" rel="noopener noreferrer">
-                                <img src={img.image} alt={img.caption || 'Дополнительное изображение'} />
+                                <img src={img.image_variants?.card?.webp || img.image} alt={img.caption || 'Дополнительное изображение'} />
                             </a>
                         ))}
                     </div>
@@ -237,14 +294,33 @@ function SchemeDetail() {
           </div>
       </div>
 
+      {similarSchemes.length > 0 && (
+          <div className="scheme-section similar-section">
+              <h3>Похожие схемы</h3>
+              <div className="gallery-grid">
+                  {similarSchemes.map(item => (
+                      <Link to={`/schemes/${item.id}`} key={item.id} title={item.title}>
+                          <img src={item.main_image_thumbnails?.card?.webp || item.main_image} alt={item.title} />
+                      </Link>
+                  ))}
+              </div>
+          </div>
+      )}
+
       <hr style={{ borderColor: 'var(--border-color)', margin: '30px 0' }}/>
 
       {/* Секция комментариев */}
       <div className="comments-section">
-            <h3>Комментарии ({comments.length})</h3>
+            <h3>Комментарии ({scheme.comments_count})</h3>
 
             {user ? (
                 <form onSubmit={handleCommentSubmit} className="comment-form">
+                    {replyTo && (
+                        <p>
+                            Ответ пользователю {replyTo.username}{' '}
+                            <button type="button" onClick={() => setReplyTo(null)}>Отмена</button>
+                        </p>
+                    )}
                     <textarea
                         value={newComment}
                         onChange={(e) => setNewComment(e.target.value)}
@@ -263,20 +339,10 @@ function SchemeDetail() {
             <ul className="comment-list">
                 {comments.length > 0 ? (
                     comments.map(comment => (
-                        <li key={comment.id} className="comment-item">
-                            <div className="comment-author-avatar">
-                                {comment.author.username.charAt(0)}
-                            </div>
-                            <div className="comment-content">
-                                <div className="comment-header">
-                                    <span className="comment-author-name">{comment.author.username}</span>
-                                    <span className="comment-date">
-                                        {new Date(comment.created_at).toLocaleString('ru-RU', { dateStyle: 'short', timeStyle: 'short' })}
-                                    </span>
-                                </div>
-                                <p className="comment-text">{comment.text}</p>
-                            </div>
-                        </li>
+                        <React.Fragment key={comment.id}>
+                            {renderComment(comment, comment.id)}
+                            {(replies[comment.id] || []).map(reply => renderComment(reply, comment.id))}
+                        </React.Fragment>
                     ))
                 ) : (
                     <p>Комментариев пока нет. Будьте первым!</p>
@@ -21,6 +21,13 @@ function FilterPanel({ onFilterChange, onResetFilters, categories, licenses, all
         { value: 'hard', label: 'Сложная' },
         { value: 'expert', label: 'Эксперт' },
     ];
+    // Значения ?ordering= на бэкенде (api/ranking.py)
+    const orderingOptions = [
+        { value: '', label: 'Сначала новые' },
+        { value: 'trending', label: 'В тренде' },
+        { value: 'popular', label: 'Популярные' },
+        { value: 'most_downloaded', label: 'Больше скачиваний' },
+    ];
 
 
     // Состояния для полей формы
@@ -29,6 +36,7 @@ function FilterPanel({ onFilterChange, onResetFilters, categories, licenses, all
     const [selectedCategory, setSelectedCategory] = useState(categoryOptions[0]);
     const [selectedLicense, setSelectedLicense] = useState(licenseOptions[0]);
     const [selectedDifficulty, setSelectedDifficulty] = useState(difficultyOptions[0]);
+    const [selectedOrdering, setSelectedOrdering] = useState(orderingOptions[0]);
 
     // Эффект для синхронизации формы с URL
     useEffect(() => {
@@ -48,6 +56,8 @@ function FilterPanel({ onFilterChange, onResetFilters, categories, licenses, all
         setSelectedTags(tagsFromUrl ? tagsFromUrl.split(',').map(tag => ({ value: tag, label: tag })) : []);
         const difficultyFromUrl = searchParams.get('difficulty');
         setSelectedDifficulty(difficultyOptions.find(o => o.value === difficultyFromUrl) || difficultyOptions[0]);
+        const orderingFromUrl = searchParams.get('ordering');
+        setSelectedOrdering(orderingOptions.find(o => o.value === orderingFromUrl) || orderingOptions[0]);
 
     }, [searchParams, categories, licenses]);
 
@@ -59,7 +69,8 @@ function FilterPanel({ onFilterChange, onResetFilters, categories, licenses, all
             category: selectedCategory.value,
             difficulty: selectedDifficulty.value,
             license: selectedLicense.value,
-            tags: selectedTags.map(tag => tag.value).join(',')
+            tags: selectedTags.map(tag => tag.value).join(','),
+            ordering: selectedOrdering.value
         });
     };
 
@@ -92,6 +103,10 @@ function FilterPanel({ onFilterChange, onResetFilters, categories, licenses, all
                 <label>Теги</label>
                 <CreatableSelect isMulti options={allTags} value={selectedTags} onChange={setSelectedTags} placeholder="Выберите теги..." formatCreateLabel={userInput => `Искать по тегу "${userInput}"`} className="react-select-container" classNamePrefix="react-select"/>
             </div>
+            <div className="filter-group">
+                <label>Сортировка</label>
+                <Select options={orderingOptions} value={selectedOrdering} onChange={setSelectedOrdering} className="react-select-container" classNamePrefix="react-select"/>
+            </div>
             {/* --- ИЗМЕНЕНИЕ 4: Добавляем кнопки --- */}
             <div className="filter-buttons">
                 <button type="button" className="button" onClick={handleFilterSubmit}>Применить</button>
@@ -142,10 +157,18 @@ function SchemeList({ schemes: propSchemes, isMySchemesPage = false, nextPageUrl
 
     useEffect(() => {
         if (propSchemes) {
-            setSchemes(propSchemes); setLoading(false); setNextPageUrl(null); setPrevPageUrl(null);
+            // Страницу и ссылки пагинации передает родитель (профиль, лента)
+            setSchemes(propSchemes); setLoading(false);
         } else {
-            const queryString = searchParams.toString();
-            fetchSchemes(`/schemes/?${queryString}`);
+            // Курсорная пагинация: без OFFSET и COUNT(*), нам нужны только ссылки вперед/назад.
+            // При поиске без явной сортировки оставляем постраничную — курсор не умеет сортировать по релевантности.
+            const params = new URLSearchParams(searchParams);
+            if (!params.get('search') || params.get('ordering')) {
+                params.set('pagination', 'cursor');
+            }
+            // Карточкам не нужны лайк/избранное — получаем общий для всех кэшируемый ответ
+            params.set('user_fields', '0');
+            fetchSchemes(`/schemes/?${params.toString()}`);
         }
     }, [propSchemes, fetchSchemes, searchParams]);
 
@@ -165,6 +188,11 @@ function SchemeList({ schemes: propSchemes, isMySchemesPage = false, nextPageUrl
         setSearchParams({});
     };
 
+    // Для переданных снаружи схем переход по страницам выполняет родитель
+    const nextLink = propSchemes ? propNext : nextPageUrl;
+    const prevLink = propSchemes ? propPrev : prevPageUrl;
+    const goToPage = propSchemes ? propOnPageChange : fetchSchemes;
+
     if (loading) return <p>Загрузка схем...</p>;
     if (error) return <p style={{ color: 'red' }}>{error}</p>;
 
@@ -190,7 +218,7 @@ function SchemeList({ schemes: propSchemes, isMySchemesPage = false, nextPageUrl
                             {schemes.map(scheme => (
                                 <Link to={`/schemes/${scheme.id}`} key={scheme.id} className="scheme-card-link">
                                     <div className="scheme-card">
-                                        <img src={scheme.main_image || 'https://via.placeholder.com/300x200?text=No+Image'} alt={`Превью для ${scheme.title}`} className="scheme-card-image"/>
+                                        <img src={scheme.main_image_thumbnails?.card?.webp || scheme.main_image || 'https://via.placeholder.com/300x200?text=No+Image'} alt={`Превью для ${scheme.title}`} className="scheme-card-image"/>
                                         <div className="scheme-card-info">
                                             <h3 className="scheme-card-title">{scheme.title}</h3>
                                             <p className="scheme-card-author">{scheme.author ? scheme.author.username : 'Неизвестен'}</p>
@@ -208,10 +236,10 @@ function SchemeList({ schemes: propSchemes, isMySchemesPage = false, nextPageUrl
                                 </Link>
                             ))}
                         </div>
-                        {(nextPageUrl || prevPageUrl) && (
+                        {goToPage && (nextLink || prevLink) && (
                              <div className="pagination-controls">
-                                <button className="button" disabled={!prevPageUrl} onClick={() => fetchSchemes(prevPageUrl)}>← Назад</button>
-                                <button className="button" disabled={!nextPageUrl} onClick={() => fetchSchemes(nextPageUrl)}>Вперед →</button>
+                                <button className="button" disabled={!prevLink} onClick={() => goToPage(prevLink)}>← Назад</button>
+                                <button className="button" disabled={!nextLink} onClick={() => goToPage(nextLink)}>Вперед →</button>
                             </div>
                         )}
                     </>
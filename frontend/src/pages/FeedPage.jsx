@@ -0,0 +1,59 @@
+// frontend/src/pages/FeedPage.jsx
+
+import React, { useState, useEffect } from 'react';
+import apiClient from '../api/apiClient';
+import SchemeList from '../components/SchemeList';
+
+function FeedPage() {
+    const [schemes, setSchemes] = useState(null);
+    const [source, setSource] = useState(null);
+    const [loading, setLoading] = useState(true);
+    const [error, setError] = useState(null);
+
+    // Лента всегда листается курсором: next/previous — готовые ссылки
+    const [nextPageUrl, setNextPageUrl] = useState(null);
+    const [prevPageUrl, setPrevPageUrl] = useState(null);
+
+    const fetchFeed = React.useCallback(async (url) => {
+        setLoading(true);
+        setError(null);
+        try {
+            const response = await apiClient.get(url);
+            setSchemes(response.data.results);
+            setSource(response.data.source);
+            setNextPageUrl(response.data.next);
+            setPrevPageUrl(response.data.previous);
+        } catch (err) {
+            console.error("Ошибка при загрузке ленты:", err);
+            setError('Не удалось загрузить ленту.');
+        } finally {
+            setLoading(false);
+        }
+    }, []);
+
+    useEffect(() => {
+        fetchFeed('/users/me/feed/');
+    }, [fetchFeed]);
+
+    if (loading) return <p>Загрузка ленты...</p>;
+    if (error) return <p style={{ color: 'red' }}>{error}</p>;
+    if (!schemes) return <p>Не удалось загрузить данные.</p>;
+
+    return (
+        <div>
+            <h2>Для вас</h2>
+            {/* Пока нет лайков и избранного, лента показывает популярное сейчас */}
+            {source === 'trending' && (
+                <p>Отмечайте понравившиеся схемы, и здесь появятся подборки для вас. А пока — популярное сейчас.</p>
+            )}
+            <SchemeList
+                schemes={schemes}
+                nextPageUrl={nextPageUrl}
+                prevPageUrl={prevPageUrl}
+                onPageChange={fetchFeed}
+            />
+        </div>
+    );
+}
+
+export default FeedPage;
@@ -14,6 +14,22 @@ function ProfilePage() {
     const [loading, setLoading] = useState(true);
     const [error, setError] = useState(null);
 
+    // Схемы автора загружаются отдельно и постранично
+    const [schemes, setSchemes] = useState([]);
+    const [nextPageUrl, setNextPageUrl] = useState(null);
+    const [prevPageUrl, setPrevPageUrl] = useState(null);
+
+    const fetchSchemes = React.useCallback(async (url) => {
+        try {
+            const response = await apiClient.get(url);
+            setSchemes(response.data.results);
+            setNextPageUrl(response.data.next);
+            setPrevPageUrl(response.data.previous);
+        } catch (err) {
+            console.error("Ошибка загрузки схем пользователя:", err);
+        }
+    }, []);
+
     useEffect(() => {
         if (!username) {
             setError("Имя пользователя не указано.");
@@ -23,9 +39,11 @@ function ProfilePage() {
         const fetchProfile = async () => {
             setLoading(true);
             try {
-                // Запрашиваем пользователя по username, как мы настроили на бэкенде
-                const response = await apiClient.get(`/users/${username}/`);
+                // Запрашиваем пользователя по username, как мы настроили на бэкенде.
+                // ?schemes=0 — только сводка по схемам, сами схемы листаем отдельно
+                const response = await apiClient.get(`/users/${username}/`, { params: { schemes: 0 } });
                 setProfile(response.data);
+                await fetchSchemes(`/users/${username}/schemes/`);
             } catch (err) {
                 console.error("Ошибка загрузки профиля:", err);
                 setError("Не удалось загрузить профиль пользователя. Возможно, он не существует.");
@@ -35,7 +53,7 @@ function ProfilePage() {
         };
 
         fetchProfile();
-    }, [username]); // Перезагружаем данные, если username в URL изменился
+    }, [username, fetchSchemes]); // Перезагружаем данные, если username в URL изменился
 
     if (loading) return <p>Загрузка профиля...</p>;
     if (error) return <p style={{ color: 'red' }}>{error}</p>;
@@ -64,6 +82,11 @@ function ProfilePage() {
                         </Link>
                     )}
                     <p><strong>На сайте с:</strong> {registrationDate}</p>
+                    <p>
+                        <strong>Схем:</strong> {profile.stats.schemes_count}
+                        {' · '}<strong>Лайков:</strong> {profile.stats.likes_count}
+                        {' · '}<strong>Скачиваний:</strong> {profile.stats.downloads_count}
+                    </p>
                     {profile.profile.bio && <p><strong>О себе:</strong> {profile.profile.bio}</p>}
                     {profile.profile.location && <p><strong>Город:</strong> {profile.profile.location}</p>}
 
@@ -83,9 +106,14 @@ function ProfilePage() {
             </div>
 
 {/*             <h3>Схемы пользователя {profile.username}:</h3> */}
-            {profile.schemes && profile.schemes.length > 0 ? (
-                // Просто передаем массив схем из профиля в наш готовый компонент!
-                <SchemeList schemes={profile.schemes} />
+            {schemes.length > 0 ? (
+                // Передаем страницу схем и ссылки пагинации в наш готовый компонент
+                <SchemeList
+                    schemes={schemes}
+                    nextPageUrl={nextPageUrl}
+                    prevPageUrl={prevPageUrl}
+                    onPageChange={fetchSchemes}
+                />
             ) : (
                 <p>Этот пользователь еще не добавил ни одной публичной схемы.</p>
             )}